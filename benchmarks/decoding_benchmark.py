@@ -0,0 +1,143 @@
+"""Measures the conversion of decoded records to dicts, as done for
+/record/detail, with the cached converters against the reflective walk of
+the message descriptors they replaced
+
+Usage:
+    python -m benchmarks.decoding_benchmark --history 5000 --places 50
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from pnrdnet_protobuf import record_pb2
+
+from pnrdnet_api import decoding
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='Benchmark of the proto to dict conversion of records')
+
+    parser.add_argument(
+        '--history',
+        type=int,
+        default=2000,
+        help='history entries of the record')
+    parser.add_argument('--places', type=int, default=20)
+    parser.add_argument('--transitions', type=int, default=10)
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        help='conversions per measurement, the best one is reported')
+    parser.add_argument('--seed', type=int, default=0)
+
+    return parser.parse_args(args)
+
+
+def _reflective_convert(proto):
+    """The descriptor walk decoding.py used before the cached converters"""
+    result = {}
+
+    for field in proto.DESCRIPTOR.fields:
+        key = field.name
+        value = getattr(proto, key)
+        if field.type == field.TYPE_MESSAGE:
+            if field.label == field.LABEL_REPEATED:
+                result[key] = [_reflective_convert(p) for p in value]
+            else:
+                result[key] = _reflective_convert(value)
+
+        elif field.type == field.TYPE_ENUM:
+            number = int(value)
+            name = field.enum_type.values_by_number.get(number).name
+            result[key] = name
+
+        else:
+            result[key] = value
+
+    return result
+
+
+def _detail(history, copy):
+    """Builds the history of a /record/detail response"""
+    return [{
+        'reader_id': entry['reader_id'],
+        'ant_id': entry['ant_id'],
+        'situation': entry['situation'],
+        'places': entry['places'],
+        'transitions': entry['transitions'],
+        'incidenceMatrix': copy(entry['incidenceMatrix']),
+        'token': copy(entry['token']),
+    } for entry in history]
+
+
+def _reflective_detail(record):
+    # The route had to copy the repeated containers to lists itself
+    return _detail(_reflective_convert(record)['history'], list)
+
+
+def _cached_detail(record):
+    return _detail(
+        decoding._convert_proto_to_dict(record)['history'], lambda x: x)
+
+
+def _make_record(opts, rng):
+    incidence = [rng.choice((-1, 0, 0, 1))
+                 for _ in range(opts.places * opts.transitions)]
+    record = record_pb2.Record(
+        record_id='record', tag_id='tag',
+        owners=[record_pb2.Record.Owner(owner_id='owner', timestamp=1)])
+    for index in range(opts.history):
+        record.history.add(
+            reader_id='reader',
+            ant_id='antenna',
+            situation='situation',
+            places=opts.places,
+            transitions=opts.transitions,
+            token=[rng.randint(0, 5) for _ in range(opts.places)],
+            incidenceMatrix=incidence,
+            timestamp=index)
+    container = record_pb2.RecordContainer(entries=[record])
+    return container.SerializeToString()
+
+
+def _measure(convert, record, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        convert(record)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts = parse_args(args)
+    rng = random.Random(opts.seed)
+    data = _make_record(opts, rng)
+
+    start = time.perf_counter()
+    container = record_pb2.RecordContainer()
+    container.ParseFromString(data)
+    parsing = time.perf_counter() - start
+    record = container.entries[0]
+
+    reflective = _measure(_reflective_detail, record, opts.repeat)
+    cached = _measure(_cached_detail, record, opts.repeat)
+
+    print('record: {} history entries of {} places x {} transitions, '
+          '{} bytes, parsed in {:.2f} ms'.format(
+              opts.history, opts.places, opts.transitions, len(data),
+              parsing * 1e3))
+    print('reflective: {:8.2f} ms   cached: {:8.2f} ms   speedup: '
+          '{:.2f}x'.format(
+              reflective * 1e3, cached * 1e3, reflective / cached))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Measures the cost of the UPDATE_RECORD firing validation
+
+Usage:
+    python -m benchmarks.firing_benchmark --places 200 --transitions 100
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from pnrdnet_protobuf import record_pb2
+
+from processor import firing
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='Benchmark of the Petri net firing validation')
+
+    parser.add_argument('--places', type=int, default=200)
+    parser.add_argument('--transitions', type=int, default=100)
+    parser.add_argument(
+        '--updates',
+        type=int,
+        default=200,
+        help='number of marking updates validated per measurement')
+    parser.add_argument(
+        '--density',
+        type=float,
+        default=0.02,
+        help='fraction of non-zero entries in the incidence matrix')
+    parser.add_argument('--seed', type=int, default=0)
+
+    return parser.parse_args(args)
+
+
+def _make_net(places, transitions, density, rng):
+    incidence = [0] * (places * transitions)
+    for transition in range(transitions):
+        # Every transition consumes from one place and produces in another
+        source, target = rng.sample(range(places), 2)
+        incidence[source * transitions + transition] = -1
+        incidence[target * transitions + transition] = 1
+    for index in range(len(incidence)):
+        if rng.random() < density:
+            incidence[index] = rng.choice((-1, 1))
+    return incidence
+
+
+def _fire(places, transitions, incidence, token, counts):
+    token = list(token)
+    for transition, count in counts.items():
+        for place in range(places):
+            token[place] += \
+                count * incidence[place * transitions + transition]
+    return token
+
+
+def _make_updates(opts, incidence, rng, fired):
+    updates = []
+    for _ in range(opts.updates):
+        previous = [rng.randint(fired, fired + 5)
+                    for _ in range(opts.places)]
+        counts = {rng.randrange(opts.transitions): 1 for _ in range(fired)}
+        token = _fire(opts.places, opts.transitions, incidence, previous,
+                      counts)
+        history = record_pb2.Record.History(
+            places=opts.places,
+            transitions=opts.transitions,
+            incidenceMatrix=incidence,
+            token=previous)
+        updates.append((history, token))
+    return updates
+
+
+def _measure_inline(updates):
+    start = time.perf_counter()
+    for history, token in updates:
+        firing.is_valid_firing(
+            places=history.places,
+            transitions=history.transitions,
+            incidence_matrix=history.incidenceMatrix,
+            previous_token=history.token,
+            token=token)
+    return (time.perf_counter() - start) / len(updates)
+
+
+def _measure_batch(updates):
+    start = time.perf_counter()
+    firing.validate_firings([
+        (history.places, history.transitions, history.incidenceMatrix,
+         history.token, token)
+        for history, token in updates])
+    return (time.perf_counter() - start) / len(updates)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts = parse_args(args)
+    rng = random.Random(opts.seed)
+
+    incidence = _make_net(
+        opts.places, opts.transitions, opts.density, rng)
+    single = _make_updates(opts, incidence, rng, fired=1)
+    multiple = _make_updates(opts, incidence, rng, fired=3)
+
+    print('net: {} places x {} transitions, {} updates'.format(
+        opts.places, opts.transitions, opts.updates))
+    for name, updates in (('single transition', single),
+                          ('multiple transitions', multiple)):
+        print('{:<22} inline: {:8.1f} us/tx   batch: {:8.1f} us/tx'.format(
+            name,
+            _measure_inline(updates) * 1e6,
+            _measure_batch(updates) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""Measures PnrdNetHandler throughput without a validator
+
+Transactions are built and signed with the API transaction builders, then
+applied to an in-memory stand-in of the Sawtooth Context. Signing happens
+before the measurements, so only apply() is timed. Every combination of the
+swept parameters is measured and the results are printed as JSON.
+
+Usage:
+    python -m benchmarks.processor_benchmark --net 10x10 50x50 \
+        --history 10 100 --owners 1 10 --output results.json
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import time
+
+from sawtooth_sdk.protobuf import processor_pb2
+from sawtooth_sdk.protobuf import state_context_pb2
+from sawtooth_sdk.protobuf import transaction_pb2
+from sawtooth_signing import create_context
+from sawtooth_signing import CryptoFactory
+
+from pnrdnet_api.dispatcher import transaction_creation
+
+from processor.handler import PnrdNetHandler
+
+
+class FakeContext(object):
+    """In-memory stand-in of sawtooth_sdk.processor.context.Context"""
+
+    def __init__(self, state, latency=0):
+        """
+        Args:
+            state (dict): State data keyed by address, shared between
+                transactions
+            latency (float): Seconds slept on every get_state/set_state call
+        """
+        self._state = state
+        self._latency = latency
+        self.written_bytes = 0
+
+    def get_state(self, addresses, timeout=None):
+        if self._latency:
+            time.sleep(self._latency)
+        return [
+            state_context_pb2.TpStateEntry(
+                address=address, data=self._state[address])
+            for address in addresses if self._state.get(address)]
+
+    def set_state(self, entries, timeout=None):
+        if self._latency:
+            time.sleep(self._latency)
+        self._state.update(entries)
+        self.written_bytes += sum(len(data) for data in entries.values())
+        return list(entries)
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='Benchmark of the transaction processor handler')
+
+    parser.add_argument(
+        '--net',
+        nargs='+',
+        default=['10x10', '50x50'],
+        help='net sizes to sweep, as PLACESxTRANSITIONS')
+    parser.add_argument(
+        '--history',
+        nargs='+',
+        type=int,
+        default=[10, 50],
+        help='record updates to sweep, per record')
+    parser.add_argument(
+        '--owners',
+        nargs='+',
+        type=int,
+        default=[1, 10],
+        help='owner counts to sweep, every owner creates one record')
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0,
+        help='milliseconds injected in every state call')
+    parser.add_argument(
+        '--validate-firing',
+        action='store_true',
+        help='create the records with the firing validation opted in')
+    parser.add_argument(
+        '--output',
+        help='file to write the JSON results to, stdout by default')
+
+    return parser.parse_args(args)
+
+
+def _make_net(places, transitions):
+    """Every transition moves one token from a place to the next one"""
+    incidence = [0] * (places * transitions)
+    for transition in range(transitions):
+        source = transition % places
+        target = (transition + 1) % places
+        incidence[source * transitions + transition] -= 1
+        incidence[target * transitions + transition] += 1
+    return incidence
+
+
+def _to_request(batch):
+    transaction = batch.transactions[0]
+    header = transaction_pb2.TransactionHeader()
+    header.ParseFromString(transaction.header)
+    return processor_pb2.TpProcessRequest(
+        header=header,
+        payload=transaction.payload,
+        signature=transaction.header_signature)
+
+
+def _make_transactions(places, transitions, history, owners,
+                       validate_firing=False):
+    """Builds the signed transactions of a run, grouped by action in the
+    order they are applied
+    """
+    context = create_context('secp256k1')
+    factory = CryptoFactory(context)
+    batch_signer = factory.new_signer(context.new_random_private_key())
+    signers = [factory.new_signer(context.new_random_private_key())
+               for _ in range(owners)]
+    incidence = _make_net(places, transitions)
+    timestamp = int(time.time())
+    net = {
+        'places': places,
+        'transitions': transitions,
+        'incidenceMatrix': incidence,
+    }
+
+    tokens = {}
+    create_owner = []
+    create_record = []
+    for index, signer in enumerate(signers):
+        record_id = 'record-{}'.format(index)
+        tokens[record_id] = [history + 1] * places
+        create_owner.append(_to_request(
+            transaction_creation.make_create_owner_transaction(
+                transaction_signer=signer,
+                batch_signer=batch_signer,
+                name='owner-{}'.format(index),
+                timestamp=timestamp)))
+        create_record.append(_to_request(
+            transaction_creation.make_create_record_transaction(
+                transaction_signer=signer,
+                batch_signer=batch_signer,
+                reader_id='reader',
+                ant_id='antenna',
+                situation='benchmark',
+                token=tokens[record_id],
+                record_id=record_id,
+                tag_id='tag-{}'.format(index),
+                timestamp=timestamp,
+                validate_firing=validate_firing,
+                **net)))
+
+    update_record = []
+    for depth in range(history):
+        for index, signer in enumerate(signers):
+            record_id = 'record-{}'.format(index)
+            transition = depth % transitions
+            token = list(tokens[record_id])
+            token[transition % places] -= 1
+            token[(transition + 1) % places] += 1
+            tokens[record_id] = token
+            update_record.append(_to_request(
+                transaction_creation.make_update_record_transaction(
+                    transaction_signer=signer,
+                    batch_signer=batch_signer,
+                    reader_id='reader',
+                    ant_id='antenna',
+                    situation='benchmark',
+                    token=token,
+                    record_id=record_id,
+                    timestamp=timestamp,
+                    **net)))
+
+    transfer_record = []
+    for index, signer in enumerate(signers):
+        receiving_owner = signers[(index + 1) % owners]
+        transfer_record.append(_to_request(
+            transaction_creation.make_transfer_record_transaction(
+                transaction_signer=signer,
+                batch_signer=batch_signer,
+                receiving_owner=receiving_owner.get_public_key().as_hex(),
+                record_id='record-{}'.format(index),
+                timestamp=timestamp)))
+
+    return [('CREATE_OWNER', create_owner),
+            ('CREATE_RECORD', create_record),
+            ('UPDATE_RECORD', update_record),
+            ('TRANSFER_RECORD', transfer_record)]
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * len(ordered))))
+    return ordered[index]
+
+
+def _measure(handler, state, requests, latency):
+    latencies = []
+    written_bytes = 0
+    for request in requests:
+        context = FakeContext(state, latency)
+        start = time.perf_counter()
+        handler.apply(request, context)
+        latencies.append(time.perf_counter() - start)
+        written_bytes += context.written_bytes
+
+    total = sum(latencies)
+    return {
+        'transactions': len(requests),
+        'tx_per_sec': len(requests) / total if total else None,
+        'p50_ms': _percentile(latencies, 50) * 1e3,
+        'p99_ms': _percentile(latencies, 99) * 1e3,
+        'bytes_written': written_bytes,
+    }
+
+
+def run(places, transitions, history, owners, latency=0,
+        validate_firing=False):
+    """Applies a full run of transactions to an empty state
+
+    Returns:
+        dict: The parameters of the run and the measurements of every
+            action
+    """
+    handler = PnrdNetHandler()
+    state = {}
+    actions = {}
+    for action, requests in _make_transactions(
+            places, transitions, history, owners, validate_firing):
+        actions[action] = _measure(handler, state, requests, latency)
+
+    return {
+        'places': places,
+        'transitions': transitions,
+        'history': history,
+        'owners': owners,
+        'latency_ms': latency * 1e3,
+        'validate_firing': validate_firing,
+        'state_bytes': sum(len(data) for data in state.values()),
+        'actions': actions,
+    }
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts = parse_args(args)
+
+    nets = [tuple(int(size) for size in net.lower().split('x'))
+            for net in opts.net]
+    results = []
+    for (places, transitions), history, owners in itertools.product(
+            nets, opts.history, opts.owners):
+        results.append(run(
+            places=places,
+            transitions=transitions,
+            history=history,
+            owners=owners,
+            latency=opts.latency / 1e3,
+            validate_firing=opts.validate_firing))
+
+    output = json.dumps({'results': results}, indent=2)
+    if opts.output:
+        with open(opts.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Measures the batches built and signed per second on the request thread
+against a SigningPool, as /record/bulk does with SIGNING_PROCESSES set
+
+Usage:
+    python -m benchmarks.signing_benchmark --operations 2000 \
+        --processes 1 2 4 --net 20x10
+"""
+
+import argparse
+import sys
+import time
+
+from sawtooth_signing import create_context
+from sawtooth_signing import CryptoFactory
+from sawtooth_signing import secp256k1
+
+from pnrdnet_api.dispatcher import transaction_creation
+from pnrdnet_api.dispatcher.signers import CachedSigner
+from pnrdnet_api.dispatcher.signing_pool import SigningPool
+from pnrdnet_api.dispatcher.signing_pool import SigningQueue
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='Benchmark of the signing of update_record batches')
+
+    parser.add_argument('--operations', type=int, default=1000)
+    parser.add_argument(
+        '--processes',
+        type=int,
+        nargs='+',
+        default=[1, 2, 4],
+        help='worker processes of each measured pool')
+    parser.add_argument(
+        '--net',
+        default='20x10',
+        help='places x transitions of the incidence matrix')
+
+    return parser.parse_args(args)
+
+
+def _operation(places, transitions, index):
+    return {
+        'action': 'update_record',
+        'record_id': 'record',
+        'reader_id': 'reader',
+        'ant_id': 'antenna',
+        'situation': 'situation',
+        'places': places,
+        'transitions': transitions,
+        'incidenceMatrix': [(i + index) % 3 - 1
+                            for i in range(places * transitions)],
+        'token': [index % 5] * places,
+        'model_hash': None,
+    }
+
+
+def _measure_inline(private_key, operations):
+    context = create_context('secp256k1')
+    crypto_factory = CryptoFactory(context)
+    signer = CachedSigner(crypto_factory.new_signer(
+        context.new_random_private_key()))
+    transaction_signer = CachedSigner(crypto_factory.new_signer(
+        secp256k1.Secp256k1PrivateKey.from_hex(private_key)))
+    start = time.perf_counter()
+    for operation in operations:
+        transaction_creation.make_operation_transaction(
+            transaction_signer=transaction_signer,
+            batch_signer=signer,
+            operation=operation,
+            timestamp=1)
+    return time.perf_counter() - start
+
+
+def _measure_pool(private_key, operations, processes):
+    context = create_context('secp256k1')
+    pool = SigningPool(
+        context.new_random_private_key().as_hex(), processes=processes)
+    try:
+        queue = SigningQueue(pool)
+        start = time.perf_counter()
+        signed = 0
+        for operation in operations:
+            queue.add((
+                transaction_creation.make_operation_transaction,
+                private_key,
+                {'operation': operation, 'timestamp': 1}))
+            while queue.full() or queue.ready():
+                signed += len(queue.pop().result())
+        queue.flush()
+        while queue:
+            signed += len(queue.pop().result())
+        return time.perf_counter() - start
+    finally:
+        pool.close()
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts = parse_args(args)
+    places, transitions = (int(size) for size in opts.net.split('x'))
+    operations = [_operation(places, transitions, index)
+                  for index in range(opts.operations)]
+    private_key = create_context('secp256k1') \
+        .new_random_private_key().as_hex()
+
+    inline = _measure_inline(private_key, operations)
+    print('inline:          {:8.0f} batches/s'.format(
+        opts.operations / inline))
+    for processes in opts.processes:
+        elapsed = _measure_pool(private_key, operations, processes)
+        print('{:2} processes:    {:8.0f} batches/s   speedup: {:.2f}x'.format(
+            processes, opts.operations / elapsed, inline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
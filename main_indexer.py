@@ -0,0 +1,74 @@
+import argparse
+import sys
+
+from sawtooth_sdk.processor.log import init_console_logging
+
+from pnrdnet_api.dispatcher.connection import ValidatorConnection
+from pnrdnet_indexer.database import IndexDatabase
+from pnrdnet_indexer.indexer import Indexer
+from pnrdnet_indexer.indexer import RESUBSCRIBE_INTERVAL
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument(
+        '-C', '--connect',
+        default='tcp://localhost:4004',
+        help='Endpoint for the validator connection')
+
+    parser.add_argument(
+        '--database',
+        default='pnrdnet_index.db',
+        help='SQLite database of the index, read by the API through its\n'
+             'INDEX_DATABASE setting')
+
+    parser.add_argument(
+        '--backfill',
+        action='store_true',
+        help='Rebuild the index from the current state before following\n'
+             'new blocks')
+
+    parser.add_argument(
+        '--interval',
+        type=float,
+        default=RESUBSCRIBE_INTERVAL,
+        help='Seconds between two checks of the event subscription')
+
+    parser.add_argument(
+        '-v', '--verbose',
+        action='count',
+        default=0,
+        help='Increase output sent to stderr')
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts = parse_args(args)
+
+    connection = None
+    try:
+        init_console_logging(verbose_level=opts.verbose)
+
+        connection = ValidatorConnection(opts.connect)
+        connection.open()
+        indexer = Indexer(
+            connection, IndexDatabase(opts.database), interval=opts.interval)
+        if opts.backfill:
+            indexer.backfill()
+        indexer.run()
+    except KeyboardInterrupt:
+        pass
+    except Exception as err:  # pylint: disable=broad-except
+        print("Error: {}".format(err))
+    finally:
+        if connection is not None:
+            connection.close()
+
+
+if __name__ == '__main__':
+    main()
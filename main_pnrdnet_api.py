@@ -21,10 +21,13 @@ import sys
 import logging
 import argparse
 from flask import Flask
+from pnrdnet_api.routes.batch import batch_routes
 from pnrdnet_api.routes.core import core_routes
+from pnrdnet_api.routes.model import model_routes
 from pnrdnet_api.routes.owner import owner_routes
 from pnrdnet_api.routes.record import record_routes
 from pnrdnet_api.config import CoreConfig
+from pnrdnet_api.dispatcher.Dispatcher import init_dispatcher
 from pnrdnet_api.utils.responses import response_with
 import pnrdnet_api.utils.responses as resp
 from dotenv import load_dotenv
@@ -46,6 +49,12 @@ def parse_args(args):
         '-C', '--connect',
         help='specify URL to connect to a running validator',
         default='tcp://localhost:4004')
+    parser.add_argument(
+        '--transport',
+        choices=['rest', 'zmq'],
+        help='talk to the REST API or directly to the validator given by '
+             '--connect',
+        default='rest')
     parser.add_argument(
         '-t', '--timeout',
         help='set time (in seconds) to wait for a validator response',
@@ -71,16 +80,21 @@ def parse_args(args):
     return parser.parse_args(args)
 
 
-def create_app(config):
+def create_app(config, validator_url=None):
     """
     """
     app = Flask(__name__)
     app.config.from_object(config)
+    if validator_url:
+        app.config['VALIDATOR_URL'] = validator_url
+    init_dispatcher(app)
 
     # BLUEPRINTS
     app.register_blueprint(core_routes, url_prefix="/core")
     app.register_blueprint(owner_routes, url_prefix="/owner")
     app.register_blueprint(record_routes, url_prefix="/record")
+    app.register_blueprint(model_routes, url_prefix="/model")
+    app.register_blueprint(batch_routes, url_prefix="/batch")
     # START GLOBAL HTTP CONFIGURATIONS
 
     @app.after_request
@@ -112,7 +126,13 @@ def create_app(config):
 
 app_config = CoreConfig
 
-app = create_app(app_config)
-
 if __name__ == "__main__":
+    opts = parse_args(sys.argv[1:])
+    # The dispatcher is created once, with its transport, so its signing
+    # workers are forked before any of its threads start
+    app = create_app(
+        app_config,
+        validator_url=opts.connect if opts.transport == 'zmq' else None)
     app.run(port=5000, host="0.0.0.0", use_reloader=False)
+else:
+    app = create_app(app_config)
@@ -0,0 +1,70 @@
+"""ASGI version of the PNRD NET API
+
+Serves the same routes and responses as main_pnrdnet_api.py with Quart and
+the AsyncDispatcher, so a single process keeps many submissions in flight
+while they wait on the REST API.
+
+Run with an ASGI server, for instance:
+    hypercorn main_pnrdnet_asgi:app --bind localhost:8000
+"""
+
+import sys
+import logging
+from quart import Quart
+from pnrdnet_api.asgi_routes.batch import batch_routes
+from pnrdnet_api.asgi_routes.core import core_routes
+from pnrdnet_api.asgi_routes.model import model_routes
+from pnrdnet_api.asgi_routes.owner import owner_routes
+from pnrdnet_api.asgi_routes.record import record_routes
+from pnrdnet_api.config import CoreConfig
+from pnrdnet_api.dispatcher.AsyncDispatcher import init_async_dispatcher
+from pnrdnet_api.utils.async_responses import response_with
+import pnrdnet_api.utils.responses as resp
+from dotenv import load_dotenv
+
+
+load_dotenv()
+LOGGER = logging.getLogger(__name__)
+
+
+def create_app(config):
+    """
+    """
+    app = Quart(__name__)
+    app.config.from_object(config)
+    init_async_dispatcher(app)
+
+    # BLUEPRINTS
+    app.register_blueprint(core_routes, url_prefix="/core")
+    app.register_blueprint(owner_routes, url_prefix="/owner")
+    app.register_blueprint(record_routes, url_prefix="/record")
+    app.register_blueprint(model_routes, url_prefix="/model")
+    app.register_blueprint(batch_routes, url_prefix="/batch")
+
+    @app.errorhandler(400)
+    async def bad_request(e):
+        logging.error(e)
+        return response_with((resp.BAD_REQUEST_400))
+
+    @app.errorhandler(500)
+    async def server_error(e):
+        logging.error(e)
+        return response_with(resp.SERVER_ERROR_500)
+
+    @app.errorhandler(404)
+    async def not_found(e):
+        logging.error(e)
+        return response_with(resp.SERVER_ERROR_404)
+
+    logging.basicConfig(
+        stream=sys.stdout,
+        format="%(asctime)s|%(levelname)s|%(filename)s:%(lineno)s|%(message)s",
+        level=logging.DEBUG,
+    )
+    return app
+
+
+app = create_app(CoreConfig)
+
+if __name__ == "__main__":
+    app.run(port=5000, host="0.0.0.0", use_reloader=False)
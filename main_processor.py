@@ -2,10 +2,11 @@ import os
 import argparse
 import sys
 
-from sawtooth_sdk.processor.core import TransactionProcessor
 from sawtooth_sdk.processor.log import init_console_logging
 
-from processor.handler import PnrdNetHandler
+from processor.workers import BoundedTransactionProcessor
+from processor.workers import WorkerSupervisor
+from processor.workers import create_handler
 
 
 TOP_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
@@ -23,6 +24,27 @@ def parse_args(args):
         default='tcp://localhost:4004',
         help='Endpoint for the validator connection')
 
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=1,
+        help='Number of transaction processor processes to run')
+
+    parser.add_argument(
+        '--max-queue',
+        type=int,
+        default=None,
+        help='Transactions each processor accepts in flight from the\n'
+             'validator (validator default when unset)')
+
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=None,
+        help='Serve per-action latency and state I/O metrics in the\n'
+             'Prometheus text format on this local port (one port per\n'
+             'worker, counting up from it)')
+
     parser.add_argument(
         '-v', '--verbose',
         action='count',
@@ -36,12 +58,26 @@ def main(args=None):
     if args is None:
         args = sys.argv[1:]
     opts = parse_args(args)
+
+    if opts.workers > 1:
+        init_console_logging(verbose_level=opts.verbose)
+        WorkerSupervisor(
+            workers=opts.workers,
+            worker_kwargs={
+                'url': opts.connect,
+                'max_queue': opts.max_queue,
+                'metrics_port': opts.metrics_port,
+                'verbose': opts.verbose,
+            }).run()
+        return
+
     processor = None
     try:
         init_console_logging(verbose_level=opts.verbose)
 
-        processor = TransactionProcessor(url=opts.connect)
-        handler = PnrdNetHandler()
+        processor = BoundedTransactionProcessor(
+            url=opts.connect, max_queue=opts.max_queue)
+        handler = create_handler(metrics_port=opts.metrics_port)
         processor.add_handler(handler)
         print("Startou!")
         processor.start()
@@ -14,43 +14,128 @@
 # -----------------------------------------------------------------------------
 
 import enum
+import functools
 import hashlib
 
 
 FAMILY_NAME = 'pnrd_net'
-FAMILY_VERSION = '0.1'
+FAMILY_VERSION = '0.2'
+# Transactions of 0.1 only declare owner and record addresses, their
+# records keep the history inline
+LEGACY_FAMILY_VERSION = '0.1'
 NAMESPACE = hashlib.sha512(FAMILY_NAME.encode('utf-8')).hexdigest()[:6]
 OWNER_PREFIX = '00'
 RECORD_PREFIX = '01'
+HISTORY_PREFIX = '02'
+MODEL_PREFIX = '03'
+TAG_PREFIX = '04'
+
+# Number of public keys and record ids whose digests are remembered
+ADDRESS_CACHE_SIZE = 4096
 
 
 @enum.unique
 class AddressSpace(enum.IntEnum):
     OWNER = 0
     RECORD = 1
+    HISTORY = 2
+    MODEL = 3
+    TAG = 4
 
     OTHER_FAMILY = 100
 
 
+@functools.lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def _digest(identifier):
+    """SHA-512 of a public key, record id or tag id. The same ids are hashed
+    over and over while building and applying transactions, so recent
+    digests are kept in a bounded LRU memo.
+    """
+    return hashlib.sha512(identifier.encode('utf-8')).hexdigest()
+
+
 def get_owner_address(public_key):
-    return NAMESPACE + OWNER_PREFIX + hashlib.sha512(
-        public_key.encode('utf-8')).hexdigest()[:62]
+    return NAMESPACE + OWNER_PREFIX + _digest(public_key)[:62]
 
 
 def get_record_address(record_id):
-    return NAMESPACE + RECORD_PREFIX + hashlib.sha512(
-        record_id.encode('utf-8')).hexdigest()[:62]
+    return NAMESPACE + RECORD_PREFIX + _digest(record_id)[:62]
+
+
+def get_history_prefix(record_id):
+    """Returns the address prefix shared by every history page of a record.
+    It can be used as a transaction input/output or as a state query filter.
+    """
+    return NAMESPACE + HISTORY_PREFIX + _digest(record_id)[:54]
+
+
+def get_history_page_address(record_id, page):
+    return get_history_prefix(record_id) + '{:08x}'.format(page)
+
+
+def get_model_address(model_hash):
+    """Net models are content-addressed, their hash is already a SHA-512"""
+    return NAMESPACE + MODEL_PREFIX + model_hash[:62]
+
+
+def get_tag_address(tag_id):
+    """Address of the entry mapping a tag id to its record"""
+    return NAMESPACE + TAG_PREFIX + _digest(tag_id)[:62]
+
+
+def get_owner_addresses(public_keys):
+    """Returns the owner address of each public key, in order
+
+    Args:
+        public_keys (list of str): Public keys of the owners
+
+    Returns:
+        list of str: The owner addresses
+    """
+    return [get_owner_address(public_key) for public_key in public_keys]
+
+
+def get_record_addresses(record_ids):
+    """Returns the record address of each record id, in order
+
+    Args:
+        record_ids (list of str): Ids of the records
+
+    Returns:
+        list of str: The record addresses
+    """
+    return [get_record_address(record_id) for record_id in record_ids]
+
+
+_ADDRESS_TYPES = {
+    OWNER_PREFIX: AddressSpace.OWNER,
+    RECORD_PREFIX: AddressSpace.RECORD,
+    HISTORY_PREFIX: AddressSpace.HISTORY,
+    MODEL_PREFIX: AddressSpace.MODEL,
+    TAG_PREFIX: AddressSpace.TAG,
+}
 
 
 def get_address_type(address):
     if address[:len(NAMESPACE)] != NAMESPACE:
         return AddressSpace.OTHER_FAMILY
 
-    infix = address[6:8]
+    return _ADDRESS_TYPES.get(address[6:8], AddressSpace.OTHER_FAMILY)
+
+
+def get_address_types(addresses):
+    """Classifies many addresses at once, such as the ones of a namespace
+    scan
 
-    if infix == '00':
-        return AddressSpace.OWNER
-    if infix == '01':
-        return AddressSpace.RECORD
+    Args:
+        addresses (list of str): State addresses
 
-    return AddressSpace.OTHER_FAMILY
+    Returns:
+        list of AddressSpace: The type of each address, in order
+    """
+    namespace_length = len(NAMESPACE)
+    return [
+        _ADDRESS_TYPES.get(address[6:8], AddressSpace.OTHER_FAMILY)
+        if address[:namespace_length] == NAMESPACE
+        else AddressSpace.OTHER_FAMILY
+        for address in addresses]
@@ -0,0 +1,57 @@
+from quart import Blueprint, request
+from pnrdnet_api.dispatcher.AsyncDispatcher import get_async_dispatcher
+from pnrdnet_api.utils.async_responses import response_with
+from pnrdnet_api.utils import payloads
+from pnrdnet_api.utils import responses as resp
+
+
+core_routes = Blueprint("core_routes", __name__)
+
+
+@core_routes.route("/login", methods=["POST"])
+async def authenticate():
+    try:
+        token = payloads.auth_token(await request.get_json())
+        return response_with(
+            resp.SUCCESS_201,
+            value={'authorization': token})
+    except Exception as e:
+        return response_with(resp.INVALID_INPUT_422)
+
+
+@core_routes.route("/network", methods=["GET"])
+async def get_owner_details():
+    try:
+        page = payloads.network_page(request.args)
+        dispatch = get_async_dispatcher()
+        if page is None:
+            net_data, net_address = await dispatch.get_network_data()
+            return response_with(
+                resp.SUCCESS_201,
+                value=payloads.state_value(net_data, net_address)
+            )
+
+        start, limit = page
+        net_data, net_address, next_start = await dispatch.get_network_page(
+            start=start, limit=limit)
+        return response_with(
+            resp.SUCCESS_201,
+            value=payloads.state_value(net_data, net_address),
+            pagination=payloads.network_pagination(start, limit, next_start)
+        )
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
+
+
+@core_routes.route("/cache", methods=["GET"])
+async def get_cache_stats():
+    try:
+        dispatch = get_async_dispatcher()
+        return response_with(
+            resp.SUCCESS_200,
+            value={'data': dispatch.get_cache_stats()}
+        )
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
@@ -0,0 +1,46 @@
+from quart import Blueprint, request
+from pnrdnet_api.dispatcher.AsyncDispatcher import get_async_dispatcher
+from pnrdnet_api.utils.functions import validate_fields
+from pnrdnet_api.utils.async_responses import response_with
+from pnrdnet_api.utils import payloads
+from pnrdnet_api.utils import responses as resp
+
+
+model_routes = Blueprint("model_routes", __name__)
+
+
+@model_routes.route("/create", methods=["POST"])
+async def create_model():
+    try:
+        args = payloads.model_args(await request.get_json())
+        dispatch = get_async_dispatcher()
+
+        result, status = await dispatch.send_create_model_transaction(**args)
+
+        return response_with(
+            resp.SUCCESS_201,
+            value=payloads.model_created_value(args, status)
+        )
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
+
+
+@model_routes.route("/detail", methods=["POST"])
+async def get_model_details():
+    try:
+        data = await request.get_json()
+        required_fields = ['model_hash']
+        validate_fields(required_fields, data)
+        dispatch = get_async_dispatcher()
+
+        model_data, model_address = await dispatch.get_model_data(
+            model_hash=data.get('model_hash'))
+
+        return response_with(
+            resp.SUCCESS_201,
+            value=payloads.state_value(model_data, model_address)
+        )
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
@@ -0,0 +1,52 @@
+from quart import Blueprint, request
+from pnrdnet_api.dispatcher.AsyncDispatcher import get_async_dispatcher
+from pnrdnet_api.utils.functions import get_time, validate_fields
+from pnrdnet_api.utils.async_responses import response_with
+from pnrdnet_api.utils import payloads
+from pnrdnet_api.utils import responses as resp
+
+
+owner_routes = Blueprint("owner_routes", __name__)
+
+
+@owner_routes.route("/create", methods=["POST"])
+async def create_owner():
+    try:
+        data = await request.get_json()
+        required_fields = ['name']
+        validate_fields(required_fields, data)
+        dispatch = get_async_dispatcher()
+        public_key, private_key = dispatch.get_new_key_pair()
+
+        result, status = await dispatch.send_create_owner_transaction(
+            private_key=private_key,
+            name=data.get('name'),
+            timestamp=get_time())
+
+        return response_with(
+            resp.SUCCESS_201,
+            value=payloads.new_owner_value(public_key, private_key, status)
+        )
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
+
+
+@owner_routes.route("/detail", methods=["POST"])
+async def get_owner_details():
+    try:
+        data = await request.get_json()
+        required_fields = ['public_key']
+        validate_fields(required_fields, data)
+        dispatch = get_async_dispatcher()
+
+        owner_data, owner_address = await dispatch.get_owner_data(
+            public_key=data.get('public_key'))
+
+        return response_with(
+            resp.SUCCESS_201,
+            value=payloads.state_value(owner_data, owner_address)
+        )
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
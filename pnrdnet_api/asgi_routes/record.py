@@ -0,0 +1,200 @@
+from quart import Blueprint, current_app, request
+from pnrdnet_api.dispatcher.AsyncDispatcher import get_async_dispatcher
+from pnrdnet_api.utils.functions import validate_fields
+from pnrdnet_api.utils.async_responses import response_with
+from pnrdnet_api.utils.async_responses import stream_with
+from pnrdnet_api.utils import payloads
+from pnrdnet_api.utils import responses as resp
+
+
+record_routes = Blueprint("record_routes", __name__)
+
+
+def _record_response(record_data, record_address):
+    value, pagination = payloads.record_value(record_data, record_address)
+    return response_with(resp.SUCCESS_201, value=value, pagination=pagination)
+
+
+def _search_response(results, limit, offset):
+    value, pagination = payloads.search_value(results, limit, offset)
+    return response_with(resp.SUCCESS_200, value=value, pagination=pagination)
+
+
+@record_routes.route("/create", methods=["POST"])
+async def create_record():
+    try:
+        data = await request.get_json()
+        args = payloads.record_args(data, 'create_record')
+        wait = payloads.get_wait(data, current_app.config)
+        dispatch = get_async_dispatcher()
+
+        result, status = await dispatch.send_create_record_transaction(
+            wait=wait, **args)
+        return response_with(
+            *payloads.submitted('record', result, status, wait))
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
+
+
+@record_routes.route("/detail", methods=["POST"])
+async def get_record_details():
+    try:
+        data = await request.get_json()
+        required_fields = ['record_id']
+        validate_fields(required_fields, data)
+        dispatch = get_async_dispatcher()
+
+        record_data, record_address = await dispatch.get_record_data(
+            record_id=data.get('record_id'),
+            window=payloads.history_window(data))
+        return _record_response(record_data, record_address)
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
+
+
+@record_routes.route("/by-tag", methods=["POST"])
+async def get_record_by_tag():
+    try:
+        data = await request.get_json()
+        required_fields = ['tag_id']
+        validate_fields(required_fields, data)
+        dispatch = get_async_dispatcher()
+
+        result = await dispatch.get_record_by_tag(
+            tag_id=data.get('tag_id'), window=payloads.history_window(data))
+        if result is None:
+            return response_with(resp.SERVER_ERROR_404)
+        record_data, record_address = result
+        return _record_response(record_data, record_address)
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
+
+
+@record_routes.route("/transfer", methods=["POST"])
+async def transfer_record():
+    try:
+        data = await request.get_json()
+        args = payloads.record_args(data, 'transfer_record')
+        wait = payloads.get_wait(data, current_app.config)
+        dispatch = get_async_dispatcher()
+
+        result, status = await dispatch.send_transfer_record_transaction(
+            wait=wait, **args)
+        return response_with(
+            *payloads.submitted('transfer', result, status, wait))
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
+
+
+@record_routes.route("/update", methods=["POST"])
+async def update_record():
+    try:
+        data = await request.get_json()
+        args = payloads.record_args(data, 'update_record')
+        wait = payloads.get_wait(data, current_app.config)
+        dispatch = get_async_dispatcher()
+
+        result, status = await dispatch.send_update_record_transaction(
+            wait=wait, **args)
+        return response_with(
+            *payloads.submitted('update', result, status, wait))
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
+
+
+@record_routes.route("/batch", methods=["POST"])
+async def batch_records():
+    try:
+        data = await request.get_json()
+        args = payloads.batch_args(data)
+        wait = payloads.get_wait(data, current_app.config)
+        dispatch = get_async_dispatcher()
+
+        result, status = await dispatch.send_batch_transaction(
+            wait=wait, **args)
+        return response_with(
+            *payloads.submitted('batch', result, status, wait))
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
+
+
+async def _iter_lines(body):
+    """Splits a streamed request body into lines as it arrives"""
+    buffer = b''
+    async for chunk in body:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+async def _bulk_items(lines):
+    """Yields the operations of a /bulk request as its lines are read, or
+    the error of the lines that are not valid operations
+    """
+    async for line in lines:
+        item = payloads.bulk_item(line)
+        if item is not None:
+            yield item
+
+
+@record_routes.route("/bulk", methods=["POST"])
+async def bulk_records():
+    """Takes one operation per line, as for /batch plus the private_key,
+    and streams back one result per operation, in the same order
+    """
+    try:
+        wait = request.args.get('wait', 0, type=float)
+        dispatch = get_async_dispatcher()
+
+        results = dispatch.send_bulk_transactions(
+            _bulk_items(_iter_lines(request.body)), wait=wait)
+
+        async def lines():
+            index = 0
+            async for result in results:
+                yield payloads.bulk_result(index, result)
+                index += 1
+
+        return stream_with(resp.SUCCESS_200, lines())
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
+
+
+@record_routes.route("/search", methods=["GET"])
+async def search_records():
+    try:
+        limit, offset = payloads.search_page(request.args)
+        dispatch = get_async_dispatcher()
+
+        results = await dispatch.search_records(
+            limit=limit + 1, offset=offset,
+            **payloads.record_filters(request.args))
+        return _search_response(results, limit, offset)
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
+
+
+@record_routes.route("/search/history", methods=["GET"])
+async def search_history():
+    try:
+        limit, offset = payloads.search_page(request.args)
+        dispatch = get_async_dispatcher()
+
+        results = await dispatch.search_history(
+            limit=limit + 1, offset=offset,
+            **payloads.history_filters(request.args))
+        return _search_response(results, limit, offset)
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
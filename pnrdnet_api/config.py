@@ -10,6 +10,47 @@ APP_SECRET_KEY = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ1234567890'
 class Config(object):
     DEBUG = False
     TESTING = False
+    SAWTOOTH_REST_API_URL = DEFAULT_URL_SAWTOOH_REST_API
+    # Keep-alive connections to the REST API and their timeouts (seconds)
+    REST_API_POOL_SIZE = 10
+    REST_API_CONNECT_TIMEOUT = 5
+    REST_API_READ_TIMEOUT = 30
+    # Connections of the ASGI application, which has many more requests in
+    # flight than the threaded one
+    ASYNC_POOL_SIZE = 100
+    # Hex private key of the batch signer, random per process when unset
+    BATCH_PRIVATE_KEY = None
+    # Batches of concurrent requests are collected for this many seconds
+    # and sent in one BatchList of up to SUBMIT_MAX_BATCHES, None disables
+    SUBMIT_BATCH_WINDOW = 0.01
+    SUBMIT_MAX_BATCHES = 100
+    # Whether record submissions wait for their batch by default, requests
+    # can override it with a "wait" field. Not waiting answers 202 with the
+    # batch id, whose status is then polled in bulk every
+    # BATCH_STATUS_INTERVAL seconds and served by /batch/<id>
+    SUBMIT_WAIT = True
+    BATCH_STATUS_INTERVAL = 0.5
+    # ZMQ endpoint of the validator, e.g. tcp://localhost:4004. When set the
+    # API submits batches and reads state through it instead of the REST API
+    VALIDATOR_URL = None
+    # State entries fetched per request when walking an address prefix, at
+    # most 1000
+    STATE_PAGE_SIZE = 1000
+    # Decoded owners and records kept in memory, 0 disables the cache. They
+    # are invalidated by the state-delta events of the validator at
+    # STATE_EVENTS_URL (VALIDATOR_URL when unset) and served for up to
+    # STATE_CACHE_TTL seconds, or STATE_CACHE_FALLBACK_TTL seconds while
+    # no events are received
+    STATE_CACHE_SIZE = 10000
+    STATE_CACHE_TTL = 300
+    STATE_CACHE_FALLBACK_TTL = 2
+    STATE_EVENTS_URL = None
+    # SQLite database kept by main_indexer.py, answers /record/search
+    INDEX_DATABASE = None
+    # Worker processes building and signing batches, so signing scales
+    # with the CPUs instead of being serialized by the GIL. 0 signs on the
+    # request threads
+    SIGNING_PROCESSES = 0
 
 
 class CoreConfig(Config):
@@ -13,45 +13,399 @@
 # limitations under the License.
 # ------------------------------------------------------------------------------
 
+import base64
+
 from pnrdnet_addressing.addresser import AddressSpace
 from pnrdnet_addressing.addresser import get_address_type
+from pnrdnet_encoding import incidence
+from pnrdnet_protobuf.model_pb2 import NetModelContainer
 from pnrdnet_protobuf.owner_pb2 import OwnerContainer
+from pnrdnet_protobuf.record_pb2 import HistoryPageContainer
+from pnrdnet_protobuf.record_pb2 import Record
 from pnrdnet_protobuf.record_pb2 import RecordContainer
+from pnrdnet_protobuf.record_pb2 import RecordTagContainer
 
 
 CONTAINERS = {
     AddressSpace.OWNER: OwnerContainer,
-    AddressSpace.RECORD: RecordContainer
+    AddressSpace.RECORD: RecordContainer,
+    AddressSpace.HISTORY: HistoryPageContainer,
+    AddressSpace.MODEL: NetModelContainer,
+    AddressSpace.TAG: RecordTagContainer
 }
 
 
+_HISTORY_DESCRIPTOR = Record.History.DESCRIPTOR
+_RECORD_WITHOUT_HISTORY = frozenset(['history'])
+
+
 def _parse_proto(proto_class, data):
     deserialized = proto_class()
     deserialized.ParseFromString(data)
     return deserialized
 
 
-def _convert_proto_to_dict(proto):
-    result = {}
+# Converter of each message descriptor, built on first use
+_CONVERTERS = {}
 
-    for field in proto.DESCRIPTOR.fields:
-        key = field.name
-        value = getattr(proto, key)
-        if field.type == field.TYPE_MESSAGE:
-            if field.label == field.LABEL_REPEATED:
-                result[key] = [_convert_proto_to_dict(p) for p in value]
-            else:
-                result[key] = _convert_proto_to_dict(value)
 
+# How a converter copies a field: as is, as a list, through the
+# sub-converter of the field, or through it item by item
+_VALUE, _LIST, _ONE, _EACH = range(4)
+
+
+def _build_converter(descriptor, exclude=frozenset()):
+    """Builds a function converting messages of one type to dicts.
+
+    The fields are looked up once here as a list of (name, kind,
+    sub_converter) instead of walking the descriptor on every call.
+    Repeated scalars, packed or not, are copied to a list with one slice,
+    nested messages use the converter of their own type and enums are
+    mapped to their names. Fields named in exclude are left out.
+    """
+    fields = []
+    for field in descriptor.fields:
+        if field.name in exclude:
+            continue
+        sub_converter = None
+        if field.type == field.TYPE_MESSAGE:
+            sub_converter = _get_converter(field.message_type)
         elif field.type == field.TYPE_ENUM:
-            number = int(value)
-            name = field.enum_type.values_by_number.get(number).name
-            result[key] = name
+            sub_converter = {
+                enum_value.number: enum_value.name
+                for enum_value in field.enum_type.values}.__getitem__
+
+        repeated = field.label == field.LABEL_REPEATED
+        if sub_converter is not None:
+            kind = _EACH if repeated else _ONE
+        else:
+            kind = _LIST if repeated else _VALUE
+        fields.append((field.name, kind, sub_converter))
+
+    def convert(proto):
+        result = {}
+        for name, kind, sub_converter in fields:
+            value = getattr(proto, name)
+            if kind == _LIST:
+                value = value[:]
+            elif kind == _ONE:
+                value = sub_converter(value)
+            elif kind == _EACH:
+                value = [sub_converter(item) for item in value]
+            result[name] = value
+        return result
+
+    return convert
+
+
+def _get_converter(descriptor, exclude=frozenset()):
+    converter = _CONVERTERS.get((descriptor, exclude))
+    if converter is None:
+        converter = _build_converter(descriptor, exclude)
+        _CONVERTERS[(descriptor, exclude)] = converter
+    return converter
+
+
+def _convert_proto_to_dict(proto, exclude=frozenset()):
+    """Converts a message to a dict with the cached converter of its type
+
+    Args:
+        proto (google.protobuf.message.Message): The message
+        exclude (frozenset of str): Fields left out of the dict
+
+    Returns:
+        dict: The fields of the message, with lists for repeated fields and
+            names for enums
+    """
+    return _get_converter(proto.DESCRIPTOR, exclude)(proto)
+
+
+def expand_incidence(history):
+    """Fills the incidenceMatrix of a decoded history entry whose matrix is
+    stored in sparse form, so callers always see the dense matrix
+
+    Args:
+        history (dict): A decoded Record.History or NetModel
+    """
+    if history.get('incidenceRowPtr'):
+        history['incidenceMatrix'] = incidence.to_dense(
+            history['places'],
+            history['transitions'],
+            history['incidenceRowPtr'],
+            history['incidenceColIdx'],
+            history['incidenceValues'])
+    return history
+
 
+def _apply_token_delta(marking, history):
+    marking = list(marking)
+    for index, value in zip(history['token_delta_idx'],
+                            history['token_delta_val']):
+        marking[index] = value
+    return marking
+
+
+def iter_markings(history):
+    """Yields decoded history entries with their full token marking,
+    rebuilding delta-encoded markings from the previous entry as the
+    entries are consumed. The entries may be shared by the state cache, so
+    rebuilt ones are yielded as copies.
+
+    Args:
+        history (list of dict): Decoded Record.History entries, oldest first
+    """
+    marking = []
+    for entry in history:
+        if entry.get('token_is_delta'):
+            entry = dict(entry, token=_apply_token_delta(marking, entry))
+        marking = entry['token']
+        yield entry
+
+
+def get_marking(history, index):
+    """Rebuilds the full token marking of a single history entry. Only the
+    entries back to the previous keyframe are visited.
+
+    Args:
+        history (list of dict): Decoded Record.History entries, oldest first
+        index (int): Position of the entry in history
+
+    Returns:
+        list of int: The marking of the entry
+    """
+    start = index
+    while start > 0 and history[start].get('token_is_delta'):
+        start -= 1
+
+    marking = list(history[start]['token'])
+    for entry in history[start + 1:index + 1]:
+        marking = _apply_token_delta(marking, entry)
+    return marking
+
+
+def decode_history(history, start, stop):
+    """Converts a slice of history entries to dicts, with the full token
+    marking of each one. The entries before start are only read to rebuild
+    the marking of the first one, back to its keyframe.
+
+    Args:
+        history (sequence of record_pb2.Record.History): Entries, oldest
+            first
+        start (int): Index of the first entry converted
+        stop (int): Index after the last entry converted
+
+    Returns:
+        list of dict: The decoded entries. Their token holds the full
+            marking and token_is_delta is cleared.
+    """
+    keyframe = start
+    while 0 < keyframe < len(history) and history[keyframe].token_is_delta:
+        keyframe -= 1
+
+    marking = []
+    if keyframe < start:
+        marking = history[keyframe].token[:]
+        for entry in history[keyframe + 1:start]:
+            marking = _apply_token_delta(marking, {
+                'token_delta_idx': entry.token_delta_idx,
+                'token_delta_val': entry.token_delta_val})
+
+    convert = _get_converter(_HISTORY_DESCRIPTOR)
+    decoded = []
+    for entry in history[start:stop]:
+        entry = convert(entry)
+        if entry['token_is_delta']:
+            entry['token'] = _apply_token_delta(marking, entry)
+            entry['token_is_delta'] = False
+        marking = entry['token']
+        decoded.append(entry)
+    return decoded
+
+
+def _is_time_ordered(history):
+    return all(
+        history[index].timestamp <= history[index + 1].timestamp
+        for index in range(len(history) - 1))
+
+
+def _bisect_timestamp(history, timestamp, low=0):
+    """Index of the first entry at or after timestamp, in entries ordered
+    by timestamp
+    """
+    high = len(history)
+    while low < high:
+        middle = (low + high) // 2
+        if history[middle].timestamp < timestamp:
+            low = middle + 1
         else:
-            result[key] = value
+            high = middle
+    return low
+
+
+class HistoryWindow(object):
+    """The history entries of a record returned by a read.
+
+    Entries are first restricted to the timestamps in [since, until), then
+    either the newest last of them, or limit of them from offset, oldest
+    first, are kept. Only the kept entries are converted to dicts.
+    """
+
+    def __init__(self,
+                 offset=0,
+                 limit=None,
+                 last=None,
+                 since=None,
+                 until=None):
+        """
+        Args:
+            offset (int): Entries of the window skipped
+            limit (int): Entries kept at most, all of them if None
+            last (int): Keeps the newest entries instead of paging
+            since (int): Unix UTC timestamp of the oldest entries
+            until (int): Unix UTC timestamp after the newest entries
+        """
+        if offset < 0:
+            raise ValueError('offset must not be negative')
+        if limit is not None and limit <= 0:
+            raise ValueError('limit must be positive')
+        if last is not None:
+            if last <= 0:
+                raise ValueError('last must be positive')
+            if offset or limit is not None:
+                raise ValueError('last excludes offset and limit')
+        self.offset = offset
+        self.limit = limit
+        self.last = last
+        self.since = since
+        self.until = until
+
+    def _bounds(self, low, high):
+        if self.last is not None:
+            return max(low, high - self.last), high
+        start = min(low + self.offset, high)
+        if self.limit is None:
+            return start, high
+        return start, min(start + self.limit, high)
+
+    def get_pages(self, record):
+        """Lists the history pages holding the window of a record with
+        paged history
+
+        Args:
+            record (record_pb2.Record): The record
+
+        Returns:
+            range: The pages to read, oldest first. None when the window
+                has a timestamp bound and every page is needed.
+        """
+        if self.since is not None or self.until is not None:
+            return None
+
+        start, stop = self._bounds(0, record.history_count)
+        if start >= stop:
+            return range(0)
+        if record.token_keyframe_interval:
+            # The marking of the first entry is rebuilt from its keyframe
+            start -= start % record.token_keyframe_interval
+        size = record.history_page_size
+        return range(start // size, (stop - 1) // size + 1)
+
+    def decode(self, history, first=0, count=None):
+        """Converts the entries of the window to dicts
+
+        Args:
+            history (sequence of record_pb2.Record.History): Entries read
+                for the window, oldest first. Every entry of the record
+                when the window has a timestamp bound.
+            first (int): Index of history[0] in the record history
+            count (int): Number of entries of the record history, the
+                end of history when None
+
+        Returns:
+            tuple: The decoded entries, and the pagination of the window
+                with total, offset, limit and next
+        """
+        if count is None:
+            count = first + len(history)
+        low, high = 0, count
+        if self.since is not None or self.until is not None:
+            if not _is_time_ordered(history):
+                # Records written before the processor required increasing
+                # timestamps can be out of order, bisecting them would
+                # drop entries
+                return self._decode_unordered(history)
+            if self.since is not None:
+                low = _bisect_timestamp(history, self.since)
+            if self.until is not None:
+                high = _bisect_timestamp(history, self.until, low)
+
+        start, stop = self._bounds(low, high)
+        return decode_history(history, start - first, stop - first), \
+            self._pagination(low, start, stop, high)
+
+    def _decode_unordered(self, history):
+        """Decodes the whole history and filters it by timestamp"""
+        entries = [
+            entry for entry in decode_history(history, 0, len(history))
+            if (self.since is None or entry['timestamp'] >= self.since)
+            and (self.until is None or entry['timestamp'] < self.until)]
+        start, stop = self._bounds(0, len(entries))
+        return entries[start:stop], \
+            self._pagination(0, start, stop, len(entries))
+
+    def _pagination(self, low, start, stop, high):
+        return {
+            'total': high - low,
+            'offset': start - low,
+            'limit': self.last if self.last is not None else self.limit,
+            'next': stop - low if stop < high else None,
+        }
 
-    return result
+
+def decode_record(record, window, history=None, first=0):
+    """Converts a record to a dict with only the history entries of a
+    window
+
+    Args:
+        record (record_pb2.Record): The record
+        window (HistoryWindow): The history entries to convert
+        history (sequence of record_pb2.Record.History): Entries read for
+            the window, see HistoryWindow.decode. The inline history of the
+            record when None.
+        first (int): Index of history[0] in the record history
+
+    Returns:
+        dict: The record, with the pagination of its history in
+            history_pagination
+    """
+    count = None
+    if history is None:
+        history = record.history
+    elif record.history_page_size:
+        count = record.history_count
+
+    decoded = _convert_proto_to_dict(record, _RECORD_WITHOUT_HISTORY)
+    decoded['history'], decoded['history_pagination'] = window.decode(
+        history, first, count)
+    return decoded
+
+
+def parse_state_entries(address, entries):
+    """Parses the container entries of state entries without converting
+    them to dicts
+
+    Args:
+        address (str): Address whose type all the entries share
+        entries (list of dict): State entries, as for decode_state_entries
+
+    Returns:
+        list of google.protobuf.message.Message: The container entries
+    """
+    container = CONTAINERS[get_address_type(address)]
+    return [
+        resource
+        for entry in entries
+        for resource in _parse_proto(container, _entry_data(entry)).entries]
 
 
 def deserialize_data(address, data):
@@ -73,4 +427,98 @@ def deserialize_data(address, data):
         raise TypeError('Unknown data type: {}'.format(data_type))
 
     entries = _parse_proto(container, data).entries
-    return data_type, [_convert_proto_to_dict(pb) for pb in entries]
+    convert = _get_converter(container.DESCRIPTOR.fields_by_name[
+        'entries'].message_type)
+    return data_type, [convert(pb) for pb in entries]
+
+
+def _entry_data(entry):
+    """Returns the bytes of a state entry, base64 encoded by the REST API
+    and raw when read from the validator directly
+    """
+    data = entry["data"]
+    if isinstance(data, str):
+        return base64.b64decode(data)
+    return data
+
+
+def decode_state_entries(address, entries):
+    """Decodes the entries of a REST API state response
+
+    Args:
+        address (str): Address whose type all the entries share
+        entries (list of dict): The "data" of the response, or entries
+            read from the validator with raw bytes as data
+
+    Returns:
+        list of list of dict: The decoded container entries of each state
+            entry
+    """
+    return [
+        deserialize_data(address, _entry_data(entry))[1]
+        for entry in entries]
+
+
+def summarize_network(entries):
+    """Lists the owners and records among the entries of a namespace scan.
+    History pages and models are skipped before being decoded.
+
+    Args:
+        entries (iterable of dict): The "data" of a REST API state
+            response, or entries yielded by Dispatcher.iter_state. They are
+            consumed one at a time.
+
+    Returns:
+        list of dict: The type and name or record_id of each entry
+    """
+    summary = []
+    for entry in entries:
+        data_type = get_address_type(entry["address"])
+        if data_type not in (AddressSpace.RECORD, AddressSpace.OWNER):
+            continue
+        data_type, resources = deserialize_data(
+            entry["address"], _entry_data(entry))
+        if data_type is AddressSpace.RECORD:
+            summary.append(
+                {"type": 'RECORD', "record_id": resources[0]['record_id']})
+        elif data_type is AddressSpace.OWNER:
+            summary.append({"type": 'OWNER', "name": resources[0]['name']})
+    return summary
+
+
+def parse_history_pages(record_id, entries):
+    """Joins the history pages of a record without converting them to
+    dicts
+
+    Args:
+        record_id (str): The id of the record
+        entries (list of dict): State entries under the history prefix, or
+            of some of its page addresses
+
+    Returns:
+        list of record_pb2.Record.History: The history entries, oldest
+            first
+    """
+    pages = [
+        page for entry in entries
+        for page in _parse_proto(
+            HistoryPageContainer, _entry_data(entry)).entries
+        if page.record_id == record_id]
+    pages.sort(key=lambda page: page.page)
+    return [history for page in pages for history in page.entries]
+
+
+def assemble_history(record_id, entries):
+    """Joins the history pages of a record, read from its history prefix
+
+    Args:
+        record_id (str): The id of the record
+        entries (list of dict): State entries under the history prefix
+
+    Returns:
+        list of dict: The decoded history entries, oldest first
+    """
+    convert = _get_converter(_HISTORY_DESCRIPTOR)
+    return [convert(history)
+            for history in parse_history_pages(record_id, entries)]
+
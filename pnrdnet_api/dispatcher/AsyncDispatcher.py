@@ -0,0 +1,699 @@
+"""Asyncio variant of Dispatcher, used by the ASGI application
+
+REST API calls are made with aiohttp over a pooled keep-alive connector, so
+a single event loop can keep thousands of submissions and reads in flight.
+Key parsing and signing are CPU bound and run in an executor instead of the
+event loop.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import json
+import math
+import os
+
+import aiohttp
+from quart import current_app
+from sawtooth_sdk.protobuf import batch_pb2
+from sawtooth_signing import create_context
+from sawtooth_signing import CryptoFactory
+from sawtooth_signing import secp256k1
+
+from pnrdnet_addressing.addresser import NAMESPACE
+from pnrdnet_addressing.addresser import get_history_page_address
+from pnrdnet_addressing.addresser import get_history_prefix
+from pnrdnet_addressing.addresser import get_model_address
+from pnrdnet_addressing.addresser import get_owner_address
+from pnrdnet_addressing.addresser import get_record_address
+from pnrdnet_addressing.addresser import get_tag_address
+from pnrdnet_api.config import DEFAULT_URL_SAWTOOH_REST_API
+from pnrdnet_api.decoding import assemble_history
+from pnrdnet_api.decoding import decode_record
+from pnrdnet_api.decoding import decode_state_entries
+from pnrdnet_api.decoding import expand_incidence
+from pnrdnet_api.decoding import parse_history_pages
+from pnrdnet_api.decoding import parse_state_entries
+from pnrdnet_api.decoding import summarize_network
+from pnrdnet_api.utils.errors import ApiBadRequest
+from pnrdnet_indexer.database import IndexDatabase
+
+from .bulk import AsyncBulkReader
+from .bulk import BulkBatches
+from .bulk import bulk_results
+from .bulk import earliest
+from .bulk import END
+from .signers import CachedSigner
+from .signers import SignerCache
+from .signers import SIGNER_CACHE_SIZE
+from .signers import SIGNER_CACHE_TTL
+from .signing_pool import SigningPool
+from .signing_pool import SigningQueue
+from .transaction_creation import make_batch_transaction
+from .transaction_creation import make_create_model_transaction
+from .transaction_creation import make_create_owner_transaction
+from .transaction_creation import make_create_record_transaction
+from .transaction_creation import make_transfer_record_transaction
+from .transaction_creation import make_operation_transaction
+from .transaction_creation import make_update_record_transaction
+from .Dispatcher import DEFAULT_NETWORK_LIMIT
+from .Dispatcher import MODEL_CACHE_SIZE
+from .Dispatcher import NETWORK_PREFIXES
+from .Dispatcher import STATE_PAGE_SIZE
+
+
+DEFAULT_POOL_SIZE = 100
+DEFAULT_TIMEOUT = (5, 30)
+
+
+class AsyncDispatcher(object):
+    def __init__(self,
+                 sawtooth_rest_api_url=DEFAULT_URL_SAWTOOH_REST_API,
+                 pool_size=DEFAULT_POOL_SIZE,
+                 timeout=DEFAULT_TIMEOUT,
+                 batch_private_key=None,
+                 signer_cache_size=SIGNER_CACHE_SIZE,
+                 signer_ttl=SIGNER_CACHE_TTL,
+                 executor=None,
+                 state_page_size=STATE_PAGE_SIZE,
+                 index_database=None,
+                 signing_processes=None):
+        """Same settings as Dispatcher. open() must be awaited from the
+        event loop before the first request.
+
+        Args:
+            executor (concurrent.futures.Executor): Runs the key parsing
+                and signing, a thread pool with one thread per CPU when
+                None
+            signing_processes (int): Worker processes building and signing
+                the batches instead of the executor, see SigningPool
+        """
+        self.sawtooth_rest_api_url = sawtooth_rest_api_url
+        self._state_page_size = state_page_size
+        self._pool_size = pool_size
+        self._timeout = timeout
+        self._context = create_context('secp256k1')
+        self._crypto_factory = CryptoFactory(self._context)
+        if batch_private_key:
+            batch_private_key = secp256k1.Secp256k1PrivateKey.from_hex(
+                batch_private_key)
+        else:
+            batch_private_key = self._context.new_random_private_key()
+        self._batch_signer = CachedSigner(
+            self._crypto_factory.new_signer(batch_private_key))
+        self._signers = SignerCache(
+            self._crypto_factory, size=signer_cache_size, ttl=signer_ttl)
+        self._signing_pool = None
+        if signing_processes:
+            self._signing_pool = SigningPool(
+                batch_private_key.as_hex(),
+                processes=signing_processes,
+                signer_cache_size=signer_cache_size,
+                signer_ttl=signer_ttl)
+        self._executor = executor or concurrent.futures.ThreadPoolExecutor(
+            max_workers=os.cpu_count())
+        self._session = None
+        # Only touched from the event loop, no lock needed
+        self._models = collections.OrderedDict()
+        self._index = None
+        if index_database:
+            self._index = IndexDatabase(index_database)
+
+    async def open(self):
+        """Creates the pooled HTTP session, must run on the event loop"""
+        connect_timeout, read_timeout = self._timeout
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self._pool_size),
+            timeout=aiohttp.ClientTimeout(
+                sock_connect=connect_timeout, sock_read=read_timeout),
+            headers={'Content-Type': 'application/octet-stream'})
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self._executor.shutdown(wait=False)
+        if self._signing_pool is not None:
+            self._signing_pool.close()
+
+    def get_new_key_pair(self):
+        private_key = self._context.new_random_private_key()
+        public_key = self._context.get_public_key(private_key)
+        return public_key.as_hex(), private_key.as_hex()
+
+    async def _send_request(self,
+                            suffix,
+                            data=None,
+                            name=None,
+                            http_verb='POST',
+                            headers=None):
+        url = f"{self.sawtooth_rest_api_url}/{suffix}"
+        try:
+            if data is not None and http_verb == 'POST':
+                request = self._session.post(url, data=data, headers=headers)
+            else:
+                request = self._session.get(url)
+
+            async with request as result:
+                if result.status == 404:
+                    raise ApiBadRequest("No such key: {}".format(name))
+
+                if result.status >= 400:
+                    raise ApiBadRequest("Error {}: {}".format(
+                        result.status, result.reason))
+
+                return await result.text()
+
+        except aiohttp.ClientConnectionError as err:
+            raise ApiBadRequest(
+                'Failed to connect to REST API: {}'.format(err)) from err
+
+        except asyncio.TimeoutError as err:
+            raise ApiBadRequest('REST API request timed out') from err
+
+    async def _get_json(self, suffix, name=None):
+        return json.loads(await self._send_request(suffix, name=name))
+
+    async def _get_status(self, batch_id, wait):
+        result = await self._get_json(
+            f'batch_statuses?id={batch_id}&wait={wait}')
+        return result['data'][0]['status']
+
+    async def _get_statuses(self, batch_ids, wait):
+        """Gets the status of several batches in one request, held by the
+        REST API until they are final or wait seconds have passed
+        """
+        result = await self._send_request(
+            f'batch_statuses?wait={math.ceil(wait)}',
+            data=json.dumps(batch_ids),
+            headers={'Content-Type': 'application/json'})
+        return json.loads(result)['data']
+
+    async def iter_state(self, address, page_size=None, start=None):
+        """Yields the state entries under an address prefix as they are
+        fetched, see Dispatcher.iter_state
+        """
+        page_size = page_size or self._state_page_size
+        while True:
+            suffix = f"state?address={address}&limit={page_size}"
+            if start is not None:
+                suffix += f"&start={start}"
+            result = await self._get_json(suffix)
+            for entry in result["data"]:
+                yield entry
+            start = result.get("paging", {}).get("next_position")
+            if start is None:
+                return
+
+    async def _get_state_entries(self, address):
+        return [entry async for entry in self.iter_state(address)]
+
+    async def _iter_network_entries(self, start=None, page_size=None):
+        for prefix in NETWORK_PREFIXES:
+            if start is not None and start[:len(prefix)] > prefix:
+                continue
+            prefix_start = start if start and start.startswith(prefix) \
+                else None
+            async for entry in self.iter_state(
+                    prefix, page_size=page_size, start=prefix_start):
+                yield entry
+
+    async def _get_record_history(self, record):
+        if not record['history_page_size']:
+            return record['history']
+
+        return assemble_history(
+            record['record_id'],
+            await self._get_state_entries(
+                get_history_prefix(record['record_id'])))
+
+    async def _read_history_window(self, record, window):
+        """See Dispatcher._read_history_window"""
+        if not record.history_page_size:
+            return None, 0
+
+        pages = window.get_pages(record)
+        if pages is None:
+            return parse_history_pages(
+                record.record_id,
+                await self._get_state_entries(
+                    get_history_prefix(record.record_id))), 0
+
+        history = []
+        for page in pages:
+            history.extend(parse_history_pages(
+                record.record_id,
+                await self._get_state_entries(
+                    get_history_page_address(record.record_id, page))))
+        return history, pages.start * record.history_page_size
+
+    async def _get_model(self, model_hash):
+        """Returns a decoded net model, from the cache when possible"""
+        if model_hash in self._models:
+            self._models.move_to_end(model_hash)
+            return self._models[model_hash]
+
+        model_address = get_model_address(model_hash)
+        result = await self._get_json(f"state?address={model_address}")
+        for resources in decode_state_entries(model_address, result["data"]):
+            for net_model in resources:
+                if net_model['model_hash'] == model_hash:
+                    self._models[model_hash] = expand_incidence(net_model)
+                    if len(self._models) > MODEL_CACHE_SIZE:
+                        self._models.popitem(last=False)
+                    return net_model
+        return None
+
+    async def _resolve_model(self, history):
+        if history.get('model_hash'):
+            net_model = await self._get_model(history['model_hash'])
+            if net_model is not None:
+                history['places'] = net_model['places']
+                history['transitions'] = net_model['transitions']
+                history['incidenceMatrix'] = net_model['incidenceMatrix']
+        return history
+
+    async def get_owner_data(self, public_key):
+        owner_address = get_owner_address(public_key)
+        result = await self._get_json(f"state?address={owner_address}")
+        return (decode_state_entries(owner_address, result["data"]),
+                owner_address)
+
+    async def get_record_data(self, record_id, window=None):
+        """Reads and decodes a record with its history, see
+        Dispatcher.get_record_data
+        """
+        record_address = get_record_address(record_id)
+        result = await self._get_json(f"state?address={record_address}")
+        if window is not None:
+            deserialized_data = []
+            for entry in result["data"]:
+                resources = []
+                for record in parse_state_entries(record_address, [entry]):
+                    window_history, first = await self._read_history_window(
+                        record, window)
+                    decoded = decode_record(
+                        record, window, window_history, first)
+                    decoded['history'] = [
+                        await self._resolve_model(expand_incidence(history))
+                        for history in decoded['history']]
+                    resources.append(decoded)
+                deserialized_data.append(resources)
+            return (deserialized_data, record_address)
+
+        deserialized_data = decode_state_entries(
+            record_address, result["data"])
+        for resources in deserialized_data:
+            for record in resources:
+                record['history'] = [
+                    await self._resolve_model(expand_incidence(history))
+                    for history in await self._get_record_history(record)]
+        return (deserialized_data, record_address)
+
+    async def get_record_by_tag(self, tag_id, window=None):
+        """Resolves a tag id to its record through the tag index, see
+        Dispatcher.get_record_by_tag
+        """
+        tag_address = get_tag_address(tag_id)
+        result = await self._get_json(f"state?address={tag_address}")
+        for resources in decode_state_entries(tag_address, result["data"]):
+            for record_tag in resources:
+                if record_tag['tag_id'] == tag_id:
+                    return await self.get_record_data(
+                        record_tag['record_id'], window)
+        return None
+
+    async def get_model_data(self, model_hash):
+        return (await self._get_model(model_hash),
+                get_model_address(model_hash))
+
+    async def get_network_data(self):
+        entries = [entry async for entry in self._iter_network_entries()]
+        return (summarize_network(entries), NAMESPACE)
+
+    async def get_network_page(self, start=None, limit=DEFAULT_NETWORK_LIMIT):
+        """See Dispatcher.get_network_page"""
+        entries = self._iter_network_entries(
+            start=start, page_size=min(limit + 1, self._state_page_size))
+        page = []
+        try:
+            async for entry in entries:
+                page.append(entry)
+                if len(page) > limit:
+                    break
+        finally:
+            await entries.aclose()
+        next_start = page.pop()['address'] if len(page) > limit else None
+        return (summarize_network(page), NAMESPACE, next_start)
+
+    async def _search(self, search, filters):
+        if self._index is None:
+            raise ApiBadRequest('Search needs the INDEX_DATABASE setting')
+        # SQLite is blocking, the queries run on the executor threads
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor,
+            functools.partial(getattr(self._index, search), **filters))
+
+    async def search_records(self, **filters):
+        """See Dispatcher.search_records"""
+        return await self._search('search_records', filters)
+
+    async def search_history(self, **filters):
+        """See Dispatcher.search_history"""
+        return await self._search('search_history', filters)
+
+    def get_cache_stats(self):
+        """See Dispatcher.get_cache_stats. The state is read uncached here,
+        so it is always None.
+        """
+        return None
+
+    async def get_batch_status(self, batch_id, wait=0):
+        """Gets the status of a batch, letting the REST API hold the request
+        for up to wait seconds until it is final
+
+        Returns:
+            dict: The REST API status entry of the batch
+        """
+        suffix = f'batch_statuses?id={batch_id}'
+        if wait and wait > 0:
+            suffix += f'&wait={math.ceil(wait)}'
+        return (await self._get_json(suffix))['data'][0]
+
+    def _make_batch(self, make_transaction, private_key, **kwargs):
+        return make_transaction(
+            transaction_signer=self._signers.get(private_key),
+            batch_signer=self._batch_signer,
+            **kwargs)
+
+    async def _sign(self, make_transaction, private_key, **kwargs):
+        """Builds and signs a batch in the signing pool, or the executor
+        when there is none
+        """
+        if self._signing_pool is not None:
+            return await asyncio.wrap_future(self._signing_pool.submit(
+                make_transaction, private_key, **kwargs))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(
+                self._make_batch, make_transaction, private_key, **kwargs))
+
+    async def send_create_owner_transaction(self,
+                                            private_key,
+                                            name,
+                                            timestamp):
+        batch = await self._sign(
+            make_create_owner_transaction,
+            private_key,
+            name=name,
+            timestamp=timestamp)
+        return await self.post_batch(
+            batch=batch, transaction_name="create_owner", wait=1)
+
+    async def send_create_record_transaction(self,
+                                             private_key,
+                                             reader_id,
+                                             ant_id,
+                                             situation,
+                                             places,
+                                             transitions,
+                                             incidenceMatrix,
+                                             token,
+                                             record_id,
+                                             tag_id,
+                                             timestamp,
+                                             model_hash=None,
+                                             token_keyframe_interval=0,
+                                             validate_firing=False,
+                                             wait=1):
+        batch = await self._sign(
+            make_create_record_transaction,
+            private_key,
+            reader_id=reader_id,
+            ant_id=ant_id,
+            situation=situation,
+            places=places,
+            transitions=transitions,
+            incidenceMatrix=incidenceMatrix,
+            token=token,
+            record_id=record_id,
+            tag_id=tag_id,
+            timestamp=timestamp,
+            model_hash=model_hash,
+            token_keyframe_interval=token_keyframe_interval,
+            validate_firing=validate_firing)
+        return await self.post_batch(
+            batch=batch, transaction_name="create_record", wait=wait)
+
+    async def send_transfer_record_transaction(self,
+                                               private_key,
+                                               receiving_owner,
+                                               record_id,
+                                               timestamp,
+                                               wait=1):
+        batch = await self._sign(
+            make_transfer_record_transaction,
+            private_key,
+            receiving_owner=receiving_owner,
+            record_id=record_id,
+            timestamp=timestamp)
+        return await self.post_batch(
+            batch=batch, transaction_name="transfer_record", wait=wait)
+
+    async def send_update_record_transaction(self,
+                                             private_key,
+                                             reader_id,
+                                             ant_id,
+                                             situation,
+                                             places,
+                                             transitions,
+                                             incidenceMatrix,
+                                             token,
+                                             record_id,
+                                             timestamp,
+                                             model_hash=None,
+                                             wait=1):
+        batch = await self._sign(
+            make_update_record_transaction,
+            private_key,
+            reader_id=reader_id,
+            ant_id=ant_id,
+            situation=situation,
+            places=places,
+            transitions=transitions,
+            incidenceMatrix=incidenceMatrix,
+            token=token,
+            record_id=record_id,
+            timestamp=timestamp,
+            model_hash=model_hash)
+        return await self.post_batch(
+            batch=batch, transaction_name="update_record", wait=wait)
+
+    async def send_create_model_transaction(self,
+                                            private_key,
+                                            places,
+                                            transitions,
+                                            incidenceMatrix,
+                                            timestamp):
+        batch = await self._sign(
+            make_create_model_transaction,
+            private_key,
+            places=places,
+            transitions=transitions,
+            incidenceMatrix=incidenceMatrix,
+            timestamp=timestamp)
+        return await self.post_batch(
+            batch=batch, transaction_name="create_model", wait=1)
+
+    async def send_batch_transaction(self,
+                                     private_key,
+                                     operations,
+                                     timestamp,
+                                     wait=1):
+        batch = await self._sign(
+            make_batch_transaction,
+            private_key,
+            operations=operations,
+            timestamp=timestamp)
+        return await self.post_batch(
+            batch=batch, transaction_name="batch", wait=wait)
+
+    async def send_bulk_transactions(self, items, wait=0):
+        """Signs a stream of operations, one batch each, and sends the
+        batches in BatchLists as the operations are read, see
+        Dispatcher.send_bulk_transactions
+
+        Args:
+            items (async iterable): The operations
+            wait (float): Seconds to wait after each BatchList for its
+                batches to be final, 0 to report them PENDING
+        """
+        pending = BulkBatches()
+        reader = AsyncBulkReader(items)
+        try:
+            async for signed in self._sign_bulk(reader, pending.time_left):
+                if signed is None:
+                    send = pending.time_left() == 0
+                else:
+                    batch, error = signed
+                    send = pending.add(batch=batch, error=error)
+                if send:
+                    for result in await self._send_bulk(
+                            pending.take(), wait):
+                        yield result
+            for result in await self._send_bulk(pending.take(), wait):
+                yield result
+        finally:
+            reader.close()
+
+    async def _sign_bulk(self, reader, time_left):
+        """See Dispatcher._sign_bulk"""
+        signing = None
+        if self._signing_pool is not None:
+            signing = SigningQueue(self._signing_pool)
+
+        while True:
+            try:
+                item = await reader.get(earliest(
+                    time_left(),
+                    signing.time_left() if signing is not None else None))
+            except asyncio.TimeoutError:
+                if signing is not None:
+                    signing.flush()
+                    while signing:
+                        for signed in await asyncio.wrap_future(
+                                signing.pop()):
+                            yield signed
+                yield None
+                continue
+            if item is END:
+                break
+
+            if signing is None:
+                yield await self._sign_bulk_item(item)
+                continue
+            if isinstance(item, Exception):
+                signing.add(item)
+            else:
+                private_key, operation, timestamp = item
+                signing.add((
+                    make_operation_transaction,
+                    private_key,
+                    {'operation': operation, 'timestamp': timestamp}))
+            while signing.full() or signing.ready():
+                for signed in await asyncio.wrap_future(signing.pop()):
+                    yield signed
+
+        if signing is not None:
+            signing.flush()
+            while signing:
+                for signed in await asyncio.wrap_future(signing.pop()):
+                    yield signed
+
+    async def _sign_bulk_item(self, item):
+        if isinstance(item, Exception):
+            return None, item
+        private_key, operation, timestamp = item
+        try:
+            return await self._sign(
+                make_operation_transaction,
+                private_key,
+                operation=operation,
+                timestamp=timestamp), None
+        except Exception as err:  # pylint: disable=broad-except
+            return None, err
+
+    async def _send_bulk(self, pending, wait):
+        batches = [batch for batch, _ in pending if batch is not None]
+        rejected = {}
+        statuses = {}
+        if batches:
+            rejected = await self._send_bulk_batch_list(batches)
+            sent = [batch.header_signature for batch in batches
+                    if batch.header_signature not in rejected]
+            if wait and wait > 0 and sent:
+                statuses = {
+                    status['id']: status['status']
+                    for status in await self._get_statuses(sent, wait)}
+        return list(bulk_results(pending, rejected, statuses))
+
+    async def _send_bulk_batch_list(self, batches):
+        """See Dispatcher._send_bulk_batch_list"""
+        batch_list = batch_pb2.BatchList(batches=batches)
+        try:
+            await self._send_request(
+                suffix="batches",
+                data=batch_list.SerializeToString(),
+                name='bulk')
+            return {}
+        except Exception as err:  # pylint: disable=broad-except
+            if len(batches) == 1:
+                return {batches[0].header_signature: str(err)}
+
+        rejected = {}
+        for batch in batches:
+            rejected.update(await self._send_bulk_batch_list([batch]))
+        return rejected
+
+    async def post_batch(self, batch, transaction_name, wait=None):
+        """Submits a batch, see Dispatcher.post_batch. Waiting for the
+        status only suspends the calling coroutine.
+        """
+        batch_list = batch_pb2.BatchList(batches=[batch])
+        batch_id = batch.header_signature
+        response = await self._send_request(
+            suffix="batches",
+            data=batch_list.SerializeToString(),
+            name=transaction_name)
+        if not wait or wait <= 0:
+            return (batch_id, 'PENDING')
+
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+        wait_time = 0
+        while wait_time < wait:
+            status = await self._get_status(batch_id, wait - int(wait_time))
+            wait_time = loop.time() - start_time
+            if status != 'PENDING':
+                return (response, status)
+
+        return (response, "")
+
+
+def init_async_dispatcher(app):
+    """Creates the AsyncDispatcher shared by every request of an ASGI
+    application, opened and closed with the application. Takes the same
+    settings as init_dispatcher.
+
+    Args:
+        app (quart.Quart): The application
+    """
+    dispatcher = AsyncDispatcher(
+        sawtooth_rest_api_url=app.config.get(
+            'SAWTOOTH_REST_API_URL', DEFAULT_URL_SAWTOOH_REST_API),
+        pool_size=app.config.get('ASYNC_POOL_SIZE', DEFAULT_POOL_SIZE),
+        timeout=(
+            app.config.get('REST_API_CONNECT_TIMEOUT', DEFAULT_TIMEOUT[0]),
+            app.config.get('REST_API_READ_TIMEOUT', DEFAULT_TIMEOUT[1])),
+        batch_private_key=app.config.get('BATCH_PRIVATE_KEY') or
+        os.environ.get('PNRDNET_BATCH_PRIVATE_KEY'),
+        state_page_size=app.config.get('STATE_PAGE_SIZE', STATE_PAGE_SIZE),
+        index_database=app.config.get('INDEX_DATABASE') or
+        os.environ.get('PNRDNET_INDEX_DATABASE'),
+        signing_processes=app.config.get('SIGNING_PROCESSES'))
+    app.extensions['pnrdnet_dispatcher'] = dispatcher
+
+    @app.before_serving
+    async def open_dispatcher():
+        await dispatcher.open()
+
+    @app.after_serving
+    async def close_dispatcher():
+        await dispatcher.close()
+
+
+def get_async_dispatcher():
+    """Returns the AsyncDispatcher of the current application"""
+    return current_app.extensions['pnrdnet_dispatcher']
@@ -1,36 +1,258 @@
+import base64
+import collections
+import concurrent.futures
+import functools
+import itertools
+import json
+import math
+import os
+import queue
+import threading
 import time
 from typing import Tuple
-import requests
-import yaml
-import base64
+
 import cbor
+import requests
+import requests.adapters
+from flask import current_app
+from sawtooth_sdk.protobuf import batch_pb2
 from sawtooth_sdk.protobuf import client_batch_submit_pb2
+from sawtooth_sdk.protobuf import client_list_control_pb2
+from sawtooth_sdk.protobuf import client_state_pb2
+from sawtooth_sdk.protobuf import transaction_pb2
 from sawtooth_sdk.protobuf import validator_pb2
-from sawtooth_sdk.protobuf import batch_pb2
-
 from sawtooth_signing import create_context
 from sawtooth_signing import CryptoFactory
 from sawtooth_signing import secp256k1
 
 from pnrdnet_addressing.addresser import NAMESPACE, AddressSpace, get_owner_address, get_record_address
-from pnrdnet_api.decoding import deserialize_data
+from pnrdnet_addressing.addresser import get_history_page_address
+from pnrdnet_addressing.addresser import get_history_prefix
+from pnrdnet_addressing.addresser import get_model_address
+from pnrdnet_addressing.addresser import get_tag_address
+from pnrdnet_addressing.addresser import OWNER_PREFIX
+from pnrdnet_addressing.addresser import RECORD_PREFIX
+from pnrdnet_api.config import DEFAULT_URL_SAWTOOH_REST_API
+from pnrdnet_api.decoding import assemble_history
+from pnrdnet_api.decoding import decode_record
+from pnrdnet_api.decoding import decode_state_entries
+from pnrdnet_api.decoding import expand_incidence
+from pnrdnet_api.decoding import parse_history_pages
+from pnrdnet_api.decoding import parse_state_entries
+from pnrdnet_api.decoding import summarize_network
+from pnrdnet_api.utils.errors import ApiBadRequest, ApiInternalError
+from pnrdnet_indexer.database import IndexDatabase
 from pnrdnet_protobuf.owner_pb2 import _OWNER
 
+from .bulk import BulkBatches
+from .bulk import BulkReader
+from .bulk import bulk_results
+from .bulk import earliest
+from .bulk import END
+from .connection import ValidatorConnection
+from .signers import CachedSigner
+from .signers import SIGNER_CACHE_SIZE
+from .signers import SIGNER_CACHE_TTL
+from .signers import SignerCache
+from .signing_pool import SigningPool
+from .signing_pool import SigningQueue
+from .state_cache import StateCache
+from .state_cache import StateDeltaSubscriber
+from .state_cache import STATE_CACHE_FALLBACK_TTL
+from .state_cache import STATE_CACHE_SIZE
+from .state_cache import STATE_CACHE_TTL
+from .submitter import BatchSubmitter
+from .submitter import DEFAULT_MAX_BATCHES
+from .tracker import BatchStatusTracker
+from .tracker import DEFAULT_INTERVAL
+from .tracker import FINAL_STATUSES
+from .transaction_creation import make_batch_transaction
+from .transaction_creation import make_create_model_transaction
 from .transaction_creation import make_create_owner_transaction
 from .transaction_creation import make_create_record_transaction
+from .transaction_creation import make_operation_transaction
 from .transaction_creation import make_transfer_record_transaction
 from .transaction_creation import make_update_record_transaction
-from pnrdnet_api.utils.errors import ApiBadRequest, ApiInternalError
-from pnrdnet_api.config import DEFAULT_URL_SAWTOOH_REST_API
+
+
+MODEL_CACHE_SIZE = 256
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = (5, 30)
+# Entries per state request, the most the REST API and validator return
+STATE_PAGE_SIZE = 1000
+DEFAULT_NETWORK_LIMIT = 100
+# Owners and records, the namespace entries listed by get_network_data
+NETWORK_PREFIXES = (NAMESPACE + OWNER_PREFIX, NAMESPACE + RECORD_PREFIX)
+# Address length of a single state entry, shorter ones are prefixes
+ADDRESS_LENGTH = 70
+# Seconds a status request held by the validator is waited for past the
+# hold itself
+STATUS_WAIT_MARGIN = 5
+
+
+class BatchListRejected(ApiBadRequest):
+    """The REST API or the validator refused a BatchList as a whole, none
+    of its batches were taken
+    """
 
 
 class Dispatcher(object):
-    def __init__(self, sawtooth_rest_api_url=DEFAULT_URL_SAWTOOH_REST_API):
+    def __init__(self,
+                 sawtooth_rest_api_url=DEFAULT_URL_SAWTOOH_REST_API,
+                 pool_size=DEFAULT_POOL_SIZE,
+                 timeout=DEFAULT_TIMEOUT,
+                 batch_private_key=None,
+                 signer_cache_size=SIGNER_CACHE_SIZE,
+                 signer_ttl=SIGNER_CACHE_TTL,
+                 batch_window=None,
+                 max_batches=DEFAULT_MAX_BATCHES,
+                 status_interval=DEFAULT_INTERVAL,
+                 validator_url=None,
+                 state_page_size=STATE_PAGE_SIZE,
+                 state_cache_size=STATE_CACHE_SIZE,
+                 state_cache_ttl=STATE_CACHE_TTL,
+                 state_cache_fallback_ttl=STATE_CACHE_FALLBACK_TTL,
+                 events_url=None,
+                 index_database=None,
+                 signing_processes=None):
+        """A Dispatcher is meant to live as long as the application and be
+        shared by its request threads, see init_dispatcher.
+
+        Args:
+            sawtooth_rest_api_url (str): Base URL of the Sawtooth REST API
+            pool_size (int): Keep-alive connections kept to the REST API
+            timeout (tuple): Connect and read timeouts of the REST API
+                requests, in seconds
+            batch_private_key (str): Hex private key of the batch signer,
+                a random one when None
+            signer_cache_size (int): Transaction signers kept, see
+                SignerCache
+            signer_ttl (float): Seconds a transaction signer is kept
+            batch_window (float): Seconds batches of concurrent requests
+                are collected for to be sent in one BatchList, None to send
+                every batch on its own
+            max_batches (int): Batches sent in one BatchList at most
+            status_interval (float): Seconds between the bulk status
+                requests of the batches submitted without waiting
+            validator_url (str): ZMQ endpoint of the validator, e.g.
+                tcp://localhost:4004. When set, batches, batch statuses and
+                state are exchanged with the validator directly instead of
+                through the REST API.
+            state_page_size (int): State entries fetched per request when
+                iterating an address prefix
+            state_cache_size (int): Decoded owners and records kept in
+                memory, 0 to read them from the ledger every time
+            state_cache_ttl (float): Seconds a cached owner or record is
+                served while state-delta events invalidate the cache
+            state_cache_fallback_ttl (float): Seconds it is served when
+                there are no events
+            events_url (str): ZMQ endpoint of the validator to receive the
+                state-delta events from, validator_url when None. Without
+                either the cache relies on the fallback TTL alone.
+            index_database (str): Path of the SQLite database kept by
+                main_indexer.py, needed by the search methods
+            signing_processes (int): Worker processes building and signing
+                the batches, see SigningPool. None or 0 signs them on the
+                request threads.
+        """
         self.sawtooth_rest_api_url = sawtooth_rest_api_url
+        self._state_page_size = state_page_size
         self._context = create_context('secp256k1')
         self._crypto_factory = CryptoFactory(self._context)
-        self._batch_signer = self._crypto_factory.new_signer(
-            self._context.new_random_private_key())
+        if batch_private_key:
+            batch_private_key = secp256k1.Secp256k1PrivateKey.from_hex(
+                batch_private_key)
+        else:
+            batch_private_key = self._context.new_random_private_key()
+        self._batch_signer = CachedSigner(
+            self._crypto_factory.new_signer(batch_private_key))
+        self._signers = SignerCache(
+            self._crypto_factory, size=signer_cache_size, ttl=signer_ttl)
+
+        # Created first, its workers are forked before any thread starts
+        self._signing_pool = None
+        if signing_processes:
+            self._signing_pool = SigningPool(
+                batch_private_key.as_hex(),
+                processes=signing_processes,
+                signer_cache_size=signer_cache_size,
+                signer_ttl=signer_ttl)
+
+        # One session for every thread, urllib3 pools its connections and
+        # reuses them across requests instead of a handshake per request
+        self._timeout = timeout
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._session.headers.update({
+            'Content-Type': 'application/octet-stream',
+            'Connection': 'keep-alive'
+        })
+
+        self._connection = None
+        if validator_url:
+            self._connection = ValidatorConnection(
+                validator_url, timeout=timeout[1])
+            self.open_validator_connection()
+
+        self._index = None
+        if index_database:
+            self._index = IndexDatabase(index_database)
+
+        self._state_cache = None
+        self._events_connection = None
+        self._events = None
+        if state_cache_size:
+            self._state_cache = StateCache(
+                size=state_cache_size,
+                ttl=state_cache_ttl,
+                fallback_ttl=state_cache_fallback_ttl)
+            if events_url and events_url != validator_url:
+                self._events_connection = ValidatorConnection(events_url)
+                self._events_connection.open()
+            events_connection = self._events_connection or self._connection
+            if events_connection is not None:
+                self._events = StateDeltaSubscriber(
+                    events_connection, self._state_cache)
+
+        self._tracker = BatchStatusTracker(
+            get_statuses=self.get_batch_statuses, interval=status_interval)
+
+        self._max_batches = max_batches
+        self._submitter = None
+        # A batch may wait for the window and for the BatchList sent ahead
+        # of its own, each send bound by the connect and read timeouts
+        self._submit_timeout = (batch_window or 0) + 2 * sum(timeout)
+        if batch_window:
+            self._submitter = BatchSubmitter(
+                send_batch_list=self._send_batch_list,
+                window=batch_window,
+                max_batches=max_batches,
+                is_rejection=lambda err: isinstance(err, BatchListRejected))
+
+        # Models are immutable and content-addressed, cached entries never
+        # go stale
+        self._models = collections.OrderedDict()
+        self._models_lock = threading.Lock()
+
+    def close(self):
+        """Sends the batches waiting to be submitted and closes the pooled
+        connections to the REST API and the validator
+        """
+        if self._submitter is not None:
+            self._submitter.close()
+        self._tracker.close()
+        self._session.close()
+        if self._events is not None:
+            self._events.close()
+        if self._events_connection is not None:
+            self._events_connection.close()
+        if self._connection is not None:
+            self.close_validator_connection()
+        if self._signing_pool is not None:
+            self._signing_pool.close()
 
     def open_validator_connection(self):
         self._connection.open()
@@ -47,28 +269,33 @@ class Dispatcher(object):
         try:
             result = self._send_request(
                 f'batch_statuses?id={batch_id}&wait={wait}')
-            return yaml.safe_load(result)['data'][0]['status']
+            return json.loads(result)['data'][0]['status']
         except BaseException as err:
             raise ApiBadRequest(err) from err
 
     def _send_request(self, suffix, data=None, name=None, http_verb='POST'):
         url = f"{self.sawtooth_rest_api_url}/{suffix}"
-        headers = {
-            'Content-Type': 'application/octet-stream'
-        }
         try:
             if data is not None and http_verb == 'POST':
-                result = requests.post(url, headers=headers, data=data)
+                result = self._session.post(
+                    url, data=data, timeout=self._timeout)
             else:
-                result = requests.get(url, headers=headers)
+                result = self._session.get(url, timeout=self._timeout)
 
             if result.status_code == 404:
                 raise ApiBadRequest("No such key: {}".format(name))
 
+            if result.status_code == 400 and suffix == 'batches':
+                raise BatchListRejected("Error {}: {}".format(
+                    result.status_code, result.reason))
+
             if not result.ok:
                 raise ApiBadRequest("Error {}: {}".format(
                     result.status_code, result.reason))
 
+        except ApiBadRequest:
+            raise
+
         except requests.ConnectionError as err:
             raise ApiBadRequest(
                 'Failed to connect to REST API: {}'.format(err)) from err
@@ -78,83 +305,451 @@ class Dispatcher(object):
 
         return result.text
 
-    def _get_blockchain_data_net(self, address, result):
-        encoded_entries = yaml.safe_load(result)["data"]
-        deserialize_data_batch = []
-        for n in encoded_entries:
-            decode_data = base64.b64decode(n["data"])
-            data_type, resources = deserialize_data(n["address"], decode_data)
-            if data_type is AddressSpace.RECORD:
-                deserialize_data_batch.append(
-                    {"type": 'RECORD', "record_id": resources[0]['record_id']})
-            elif data_type is AddressSpace.OWNER:
-                deserialize_data_batch.append(
-                    {"type": 'OWNER', "name": resources[0]['name']})
-        return deserialize_data_batch
-
-    def _get_blockchain_data(self, address, result):
-        encoded_entries = yaml.safe_load(result)["data"]
-        decode_data = [
-            base64.b64decode(entry["data"])
-            for entry in encoded_entries
-        ]
+    def _get_state_page(self, address, start=None, limit=None):
+        """Fetches one page of the state entries under an address prefix
+
+        Args:
+            address (str): The address prefix
+            start (str): Address the page starts at, None for the first page
+            limit (int): Entries in the page at most
+
+        Returns:
+            tuple: The entries and the address the next page starts at,
+                None for the last page
+        """
+        if self._connection is not None:
+            return self._get_validator_state_page(address, start, limit)
+
+        suffix = f"state?address={address}"
+        if start is not None:
+            suffix += f"&start={start}"
+        if limit is not None:
+            suffix += f"&limit={limit}"
+        result = json.loads(self._send_request(suffix))
+        return (result["data"],
+                result.get("paging", {}).get("next_position"))
+
+    def iter_state(self, address, page_size=None, start=None):
+        """Yields the state entries under an address prefix, following the
+        paging of the REST API or validator. Only one page is held in
+        memory, and pages are fetched as the entries are consumed.
+
+        Args:
+            address (str): The address prefix
+            page_size (int): Entries fetched per request, the configured
+                state page size when None
+            start (str): Address to start at, None to start at the first
+                entry
+
+        Yields:
+            dict: The state entries, with the address and the data
+        """
+        page_size = page_size or self._state_page_size
+        while True:
+            entries, start = self._get_state_page(address, start, page_size)
+            yield from entries
+            if start is None:
+                return
+
+    def _send_validator_request(self, message_type, request, response_class,
+                                timeout=None):
+        """Sends a request to the validator and parses its response, waiting
+        timeout seconds for it or the connection timeout when None
+        """
+        try:
+            message = self._connection.send(
+                message_type, request.SerializeToString(), timeout=timeout)
+        except Exception as err:
+            raise ApiBadRequest(
+                'Failed to reach the validator: {}'.format(err)) from err
+        response = response_class()
+        response.ParseFromString(message.content)
+        return response
+
+    def _get_validator_entry(self, address):
+        """Reads a single state entry from the validator"""
+        response = self._send_validator_request(
+            validator_pb2.Message.CLIENT_STATE_GET_REQUEST,
+            client_state_pb2.ClientStateGetRequest(address=address),
+            client_state_pb2.ClientStateGetResponse)
+        if response.status == response.NO_RESOURCE:
+            return []
+        if response.status != response.OK:
+            raise ApiBadRequest('Error reading state: {}'.format(
+                response.Status.Name(response.status)))
+        return [{'address': address, 'data': response.value}]
+
+    def _get_validator_state_page(self, address, start=None, limit=None):
+        """Reads a page of the entries under an address prefix from the
+        validator, see _get_state_page. Entries have the raw bytes as data.
+        """
+        response = self._send_validator_request(
+            validator_pb2.Message.CLIENT_STATE_LIST_REQUEST,
+            client_state_pb2.ClientStateListRequest(
+                address=address,
+                paging=client_list_control_pb2.ClientPagingControls(
+                    start=start or '',
+                    limit=limit or self._state_page_size)),
+            client_state_pb2.ClientStateListResponse)
+        if response.status == response.NO_RESOURCE:
+            return [], None
+        if response.status != response.OK:
+            raise ApiBadRequest('Error reading state: {}'.format(
+                response.Status.Name(response.status)))
+        entries = [
+            {'address': entry.address, 'data': entry.data}
+            for entry in response.entries]
+        return entries, response.paging.next or None
+
+    def _read_state(self, address):
+        """Returns the state entries of an address or address prefix, from
+        the validator when connected to it and the REST API otherwise
+        """
+        if self._connection is not None and len(address) == ADDRESS_LENGTH:
+            return self._get_validator_entry(address)
+        return list(self.iter_state(address))
+
+    def _iter_network_entries(self, start=None, page_size=None):
+        """Yields the owner and record entries of the namespace, in address
+        order. History pages and models are not fetched at all.
+        """
+        for prefix in NETWORK_PREFIXES:
+            if start is not None and start[:len(prefix)] > prefix:
+                continue
+            prefix_start = start if start and start.startswith(prefix) \
+                else None
+            yield from self.iter_state(
+                prefix, page_size=page_size, start=prefix_start)
+
+    def _get_record_history(self, record):
+        """Returns the history of a decoded record, reading it back from
+        its history pages when the record uses paged history
+        """
+        if not record['history_page_size']:
+            return record['history']
+
+        return assemble_history(
+            record['record_id'],
+            self._read_state(get_history_prefix(record['record_id'])))
+
+    def _get_model(self, model_hash):
+        """Returns a decoded net model, from the cache when possible"""
+        with self._models_lock:
+            if model_hash in self._models:
+                self._models.move_to_end(model_hash)
+                return self._models[model_hash]
+
+        model_address = get_model_address(model_hash)
+        entries = self._read_state(model_address)
+        for resources in decode_state_entries(model_address, entries):
+            for net_model in resources:
+                if net_model['model_hash'] == model_hash:
+                    with self._models_lock:
+                        self._models[model_hash] = expand_incidence(net_model)
+                        if len(self._models) > MODEL_CACHE_SIZE:
+                            self._models.popitem(last=False)
+                    return net_model
+        return None
+
+    def _resolve_model(self, history):
+        """Fills the net of a decoded history entry that references a
+        registered model
+        """
+        if history.get('model_hash'):
+            net_model = self._get_model(history['model_hash'])
+            if net_model is not None:
+                history['places'] = net_model['places']
+                history['transitions'] = net_model['transitions']
+                history['incidenceMatrix'] = net_model['incidenceMatrix']
+        return history
+
+    def _transaction_signer(self, private_key):
+        return self._signers.get(private_key)
+
+    def _make_batch(self, make_transaction, private_key, **kwargs):
+        """Builds and signs a batch, in the signing pool when there is one
+
+        Args:
+            make_transaction (callable): A make_* function of
+                transaction_creation
+            private_key (str): Hex private key of the transaction signer
+            kwargs: The arguments of make_transaction but the signers
+        """
+        if self._signing_pool is not None:
+            return self._signing_pool.sign(
+                make_transaction, private_key, **kwargs)
+        return make_transaction(
+            transaction_signer=self._transaction_signer(private_key),
+            batch_signer=self._batch_signer,
+            **kwargs)
+
+    def _sign_bulk(self, reader, time_left):
+        """Yields the batch, or the error, of each bulk operation in order,
+        signing them in chunks when there is a signing pool. Yields None
+        when no operation came in the time_left() seconds the caller can
+        wait, once the operations read so far are signed.
+
+        Args:
+            reader (BulkReader): The operations
+            time_left (callable): Returns the seconds the caller can wait
+                for the next batch, None for no limit
+        """
+        signing = None
+        if self._signing_pool is not None:
+            signing = SigningQueue(self._signing_pool)
+
+        while True:
+            try:
+                item = reader.get(earliest(
+                    time_left(),
+                    signing.time_left() if signing is not None else None))
+            except queue.Empty:
+                if signing is not None:
+                    signing.flush()
+                    while signing:
+                        yield from signing.pop().result()
+                yield None
+                continue
+            if item is END:
+                break
+
+            if signing is None:
+                yield self._sign_bulk_item(item)
+                continue
+            if isinstance(item, Exception):
+                signing.add(item)
+            else:
+                private_key, operation, timestamp = item
+                signing.add((
+                    make_operation_transaction,
+                    private_key,
+                    {'operation': operation, 'timestamp': timestamp}))
+            while signing.full() or signing.ready():
+                yield from signing.pop().result()
+
+        if signing is not None:
+            signing.flush()
+            while signing:
+                yield from signing.pop().result()
+
+    def _sign_bulk_item(self, item):
+        if isinstance(item, Exception):
+            return None, item
+        private_key, operation, timestamp = item
+        try:
+            return self._make_batch(
+                make_operation_transaction,
+                private_key,
+                operation=operation,
+                timestamp=timestamp), None
+        except Exception as err:  # pylint: disable=broad-except
+            return None, err
+
+    def _read_cached(self, address, load):
+        """Returns the decoded state of an address from the state cache,
+        calling load with the address on a miss
+        """
+        if self._state_cache is None:
+            return load(address)
+        return self._state_cache.get_or_load(
+            address, functools.partial(load, address))
+
+    def _load_owner(self, owner_address):
+        return decode_state_entries(
+            owner_address, self._read_state(owner_address))
+
+    def _load_record(self, record_address):
+        deserialized_data = decode_state_entries(
+            record_address, self._read_state(record_address))
+        for resources in deserialized_data:
+            for record in resources:
+                record['history'] = [
+                    self._resolve_model(expand_incidence(history))
+                    for history in self._get_record_history(record)]
+        return deserialized_data
+
+    def _read_history_window(self, record, window):
+        """Reads the history entries of a record needed for a window,
+        returns them with the index of the first one
+        """
+        if not record.history_page_size:
+            return None, 0
+
+        pages = window.get_pages(record)
+        if pages is None:
+            return parse_history_pages(
+                record.record_id,
+                self._read_state(get_history_prefix(record.record_id))), 0
+
+        history = []
+        for page in pages:
+            history.extend(parse_history_pages(
+                record.record_id,
+                self._read_state(
+                    get_history_page_address(record.record_id, page))))
+        return history, pages.start * record.history_page_size
+
+    def _load_record_window(self, record_address, window):
         deserialized_data = []
-        for entry in decode_data:
-            data_type, resources = deserialize_data(address, entry)
+        for entry in self._read_state(record_address):
+            resources = []
+            for record in parse_state_entries(record_address, [entry]):
+                window_history, first = self._read_history_window(
+                    record, window)
+                decoded = decode_record(
+                    record, window, window_history, first)
+                decoded['history'] = [
+                    self._resolve_model(expand_incidence(history))
+                    for history in decoded['history']]
+                resources.append(decoded)
             deserialized_data.append(resources)
         return deserialized_data
 
-    def _transaction_signer(self, private_key):
-        return self._crypto_factory.new_signer(
-            secp256k1.Secp256k1PrivateKey.from_hex(private_key))
-
     def get_owner_data(self, public_key):
         owner_address = get_owner_address(public_key)
-        result = self._send_request(
-            f"state?address={owner_address}")
 
         try:
-            deserialized_data = self._get_blockchain_data(
-                owner_address, result)
+            deserialized_data = self._read_cached(
+                owner_address, self._load_owner)
             return (deserialized_data, owner_address)
         except BaseException as e:
             print(e)
             return None
 
-    def get_record_data(self, record_id):
+    def get_record_data(self, record_id, window=None):
+        """Reads and decodes a record with its history
+
+        Args:
+            record_id (str): The id of the record
+            window (HistoryWindow): History entries to return, every entry
+                if None. Windowed reads bypass the state cache and only
+                read the history pages holding the window.
+
+        Returns:
+            tuple: The decoded record state and its address, None when the
+                read failed
+        """
         record_address = get_record_address(record_id)
-        result = self._send_request(
-            f"state?address={record_address}")
         try:
-            deserialized_data = self._get_blockchain_data(
-                record_address, result)
+            if window is not None:
+                deserialized_data = self._load_record_window(
+                    record_address, window)
+            else:
+                deserialized_data = self._read_cached(
+                    record_address, self._load_record)
             return (deserialized_data, record_address)
         except BaseException as e:
             print(e)
             return None
 
+    def _load_record_tag(self, tag_address):
+        return decode_state_entries(
+            tag_address, self._read_state(tag_address))
+
+    def get_record_by_tag(self, tag_id, window=None):
+        """Resolves a tag id to its record through the tag index, with a
+        read of the tag address and a read of the record address
+
+        Args:
+            tag_id (str): The tag id
+            window (HistoryWindow): History entries to return, see
+                get_record_data
+
+        Returns:
+            tuple: The decoded record state and its address, None when no
+                record is indexed under the tag
+        """
+        tag_address = get_tag_address(tag_id)
+        try:
+            deserialized_data = self._read_cached(
+                tag_address, self._load_record_tag)
+        except BaseException as e:
+            print(e)
+            return None
+
+        for resources in deserialized_data:
+            for record_tag in resources:
+                if record_tag['tag_id'] == tag_id:
+                    return self.get_record_data(
+                        record_tag['record_id'], window)
+        return None
+
+    def _get_index(self):
+        if self._index is None:
+            raise ApiBadRequest('Search needs the INDEX_DATABASE setting')
+        return self._index
+
+    def search_records(self, **filters):
+        """Searches the records in the index, see
+        IndexDatabase.search_records
+        """
+        return self._get_index().search_records(**filters)
+
+    def search_history(self, **filters):
+        """Searches the history entries in the index, see
+        IndexDatabase.search_history
+        """
+        return self._get_index().search_history(**filters)
+
+    def get_cache_stats(self):
+        """Returns the hit and miss counts of the state cache, see
+        StateCache.stats. None when the cache is disabled.
+        """
+        if self._state_cache is None:
+            return None
+        return self._state_cache.stats()
+
+    def get_model_data(self, model_hash):
+        try:
+            return (self._get_model(model_hash),
+                    get_model_address(model_hash))
+        except BaseException as e:
+            print(e)
+            return None
+
     def get_network_data(self):
         namespace_address = NAMESPACE
 
-        result = self._send_request(
-            f"state?address={namespace_address}")
         try:
-
-            deserialized_data = self._get_blockchain_data_net(
-                namespace_address, result)
+            deserialized_data = summarize_network(
+                self._iter_network_entries())
             return (deserialized_data, namespace_address)
         except BaseException as e:
             print(e)
             return None
 
+    def get_network_page(self, start=None, limit=DEFAULT_NETWORK_LIMIT):
+        """Lists a page of the owners and records of the network
+
+        Args:
+            start (str): Address the page starts at, the "next" of the
+                previous page. None for the first page.
+            limit (int): Owners and records in the page at most
+
+        Returns:
+            tuple: The summary of the page, the namespace and the address
+                the next page starts at, None for the last page
+        """
+        entries = self._iter_network_entries(
+            start=start, page_size=min(limit + 1, self._state_page_size))
+        try:
+            page = list(itertools.islice(entries, limit + 1))
+            next_start = page.pop()['address'] if len(page) > limit \
+                else None
+            return (summarize_network(page), NAMESPACE, next_start)
+        except BaseException as e:
+            print(e)
+            return None
+        finally:
+            entries.close()
+
     def send_create_owner_transaction(self,
                                       private_key,
                                       name,
                                       timestamp):
-        transaction_signer = self._transaction_signer(private_key)
-        batch = make_create_owner_transaction(
-            transaction_signer=transaction_signer,
-            batch_signer=self._batch_signer,
+        batch = self._make_batch(
+            make_create_owner_transaction,
+            private_key,
             name=name,
             timestamp=timestamp)
 
@@ -174,12 +769,15 @@ class Dispatcher(object):
                                        token,
                                        record_id,
                                        tag_id,
-                                       timestamp):
+                                       timestamp,
+                                       model_hash=None,
+                                       token_keyframe_interval=0,
+                                       validate_firing=False,
+                                       wait=1):
 
-        transaction_signer = self._transaction_signer(private_key)
-        batch = make_create_record_transaction(
-            transaction_signer=transaction_signer,
-            batch_signer=self._batch_signer,
+        batch = self._make_batch(
+            make_create_record_transaction,
+            private_key,
             reader_id=reader_id,
             ant_id=ant_id,
             situation=situation,
@@ -189,27 +787,29 @@ class Dispatcher(object):
             token=token,
             record_id=record_id,
             tag_id=tag_id,
-            timestamp=timestamp)
+            timestamp=timestamp,
+            model_hash=model_hash,
+            token_keyframe_interval=token_keyframe_interval,
+            validate_firing=validate_firing)
         response, status = self.post_batch(
-            batch=batch, transaction_name="create_record", wait=1)
+            batch=batch, transaction_name="create_record", wait=wait)
         return response, status
 
     def send_transfer_record_transaction(self,
                                          private_key,
                                          receiving_owner,
                                          record_id,
-                                         timestamp):
-        transaction_signer = self._transaction_signer(private_key)
-
-        batch = make_transfer_record_transaction(
-            transaction_signer=transaction_signer,
-            batch_signer=self._batch_signer,
+                                         timestamp,
+                                         wait=1):
+        batch = self._make_batch(
+            make_transfer_record_transaction,
+            private_key,
             receiving_owner=receiving_owner,
             record_id=record_id,
             timestamp=timestamp)
 
         response, status = self.post_batch(
-            batch=batch, transaction_name="transfer_record", wait=1)
+            batch=batch, transaction_name="transfer_record", wait=wait)
         return response, status
 
     def send_update_record_transaction(self,
@@ -222,12 +822,12 @@ class Dispatcher(object):
                                        incidenceMatrix,
                                        token,
                                        record_id,
-                                       timestamp):
-        transaction_signer = self._transaction_signer(private_key)
-
-        batch = make_update_record_transaction(
-            transaction_signer=transaction_signer,
-            batch_signer=self._batch_signer,
+                                       timestamp,
+                                       model_hash=None,
+                                       wait=1):
+        batch = self._make_batch(
+            make_update_record_transaction,
+            private_key,
             reader_id=reader_id,
             ant_id=ant_id,
             situation=situation,
@@ -236,20 +836,195 @@ class Dispatcher(object):
             incidenceMatrix=incidenceMatrix,
             token=token,
             record_id=record_id,
+            timestamp=timestamp,
+            model_hash=model_hash)
+
+        response, status = self.post_batch(
+            batch=batch, transaction_name="update_record", wait=wait)
+        return response, status
+
+    def send_create_model_transaction(self,
+                                      private_key,
+                                      places,
+                                      transitions,
+                                      incidenceMatrix,
+                                      timestamp):
+        batch = self._make_batch(
+            make_create_model_transaction,
+            private_key,
+            places=places,
+            transitions=transitions,
+            incidenceMatrix=incidenceMatrix,
             timestamp=timestamp)
 
         response, status = self.post_batch(
-            batch=batch, transaction_name="update_record", wait=1)
+            batch=batch, transaction_name="create_model", wait=1)
         return response, status
 
-    def post_batch(self, batch,  transaction_name, wait=None) -> tuple[str, str]:
+    def send_batch_transaction(self,
+                               private_key,
+                               operations,
+                               timestamp,
+                               wait=1):
+        """Sends several operations of the same owner as one transaction
+
+        Args:
+            private_key (str): Private key of the owner signing the operations
+            operations (list of dict): See make_batch_transaction
+            timestamp (int): Unix UTC timestamp of the operations
+            wait (int): See post_batch
+        """
+        batch = self._make_batch(
+            make_batch_transaction,
+            private_key,
+            operations=operations,
+            timestamp=timestamp)
+
+        response, status = self.post_batch(
+            batch=batch, transaction_name="batch", wait=wait)
+        return response, status
+
+    def send_bulk_transactions(self, items, wait=0):
+        """Signs a stream of operations, one batch each, and sends the
+        batches in BatchLists as the operations are read
+
+        Args:
+            items (iterable): The private key, operation and timestamp of
+                each operation, see make_batch_transaction. An exception
+                instead reports an operation rejected while reading it.
+                It is read in a thread, see BulkReader.
+            wait (float): Seconds to wait after each BatchList for its
+                batches to be final, 0 to report them PENDING
+
+        Yields:
+            dict: The result of each operation, in order, see bulk_results
+        """
+        pending = BulkBatches(max_batches=self._max_batches)
+        reader = BulkReader(items)
+        try:
+            for signed in self._sign_bulk(reader, pending.time_left):
+                if signed is None:
+                    send = pending.time_left() == 0
+                else:
+                    batch, error = signed
+                    send = pending.add(batch=batch, error=error)
+                if send:
+                    yield from self._send_bulk(pending.take(), wait)
+            yield from self._send_bulk(pending.take(), wait)
+        finally:
+            reader.close()
+
+    def _send_bulk(self, pending, wait):
+        batches = [batch for batch, _ in pending if batch is not None]
+        rejected = {}
+        statuses = {}
+        if batches:
+            rejected = self._send_bulk_batch_list(batches)
+            sent = [batch for batch in batches
+                    if batch.header_signature not in rejected]
+            for batch in sent:
+                self._tracker.track(batch.header_signature)
+            if wait and wait > 0:
+                deadline = time.monotonic() + wait
+                for batch in sent:
+                    status = self._tracker.wait(
+                        batch.header_signature,
+                        max(deadline - time.monotonic(), 0))
+                    if status is not None:
+                        statuses[batch.header_signature] = status['status']
+                        if status['status'] in FINAL_STATUSES:
+                            self._invalidate_outputs(batch)
+        return bulk_results(pending, rejected, statuses)
+
+    def _send_bulk_batch_list(self, batches):
+        """Sends batches in one BatchList, or one by one if it is rejected
+        as a whole
+
+        Returns:
+            dict: Error of each batch that was not taken
+        """
+        batch_list = batch_pb2.BatchList(batches=batches)
+        try:
+            self._send_batch_list(batch_list.SerializeToString(), name='bulk')
+            return {}
+        except Exception as err:  # pylint: disable=broad-except
+            if len(batches) == 1:
+                return {batches[0].header_signature: str(err)}
+
+        rejected = {}
+        for batch in batches:
+            rejected.update(self._send_bulk_batch_list([batch]))
+        return rejected
+
+    def _send_batch_list(self, data, name=None):
+        if self._connection is None:
+            return self._send_request(
+                suffix="batches", data=data, name=name, http_verb="POST")
+
+        # A serialized BatchList is a valid ClientBatchSubmitRequest, both
+        # carry the batches as their first field
+        try:
+            message = self._connection.send(
+                validator_pb2.Message.CLIENT_BATCH_SUBMIT_REQUEST, data)
+        except Exception as err:
+            raise ApiBadRequest(
+                'Failed to reach the validator: {}'.format(err)) from err
+        response = client_batch_submit_pb2.ClientBatchSubmitResponse()
+        response.ParseFromString(message.content)
+        if response.status == response.INVALID_BATCH:
+            raise BatchListRejected('Error submitting {}: {}'.format(
+                name or 'batches', response.Status.Name(response.status)))
+        if response.status != response.OK:
+            raise ApiBadRequest('Error submitting {}: {}'.format(
+                name or 'batches', response.Status.Name(response.status)))
+        return response.Status.Name(response.status)
+
+    def _submit_batch(self, batch, transaction_name):
+        """Sends a batch, together with the ones of concurrent requests when
+        micro-batching is enabled
+        """
+        if self._submitter is not None:
+            future = self._submitter.submit(batch)
+            try:
+                return future.result(timeout=self._submit_timeout)
+            except concurrent.futures.TimeoutError as err:
+                future.cancel()
+                raise ApiBadRequest(
+                    'Timed out submitting {}'.format(transaction_name)
+                ) from err
+
         batch_list = batch_pb2.BatchList(batches=[batch])
+        return self._send_batch_list(
+            batch_list.SerializeToString(), name=transaction_name)
+
+    def post_batch(self, batch,  transaction_name, wait=None) -> tuple[str, str]:
+        """Submits a batch
+
+        Args:
+            batch (batch_pb2.Batch): The batch
+            transaction_name (str): Name of the transaction for errors
+            wait (int): Seconds to wait for the batch to leave PENDING. When
+                0 or None the batch is handed to the status tracker and the
+                call returns at once.
+
+        Returns:
+            tuple: The REST API response and the batch status, or the
+                batch id and PENDING when not waiting
+        """
         batch_id = batch.header_signature
+        if wait and wait > 0 and self._connection is not None:
+            # The validator holds the status request until the batch is
+            # final or the wait ends, no polling needed
+            response = self._submit_batch(batch, transaction_name)
+            status = self._get_validator_statuses(
+                [batch_id], wait=wait)[0]['status']
+            self._invalidate_outputs(batch)
+            return (response, '' if status == 'PENDING' else status)
+
         if wait and wait > 0:
             wait_time = 0
             start_time = time.time()
-            response = self._send_request(
-                suffix="batches", data=batch_list.SerializeToString(), name=transaction_name)
+            response = self._submit_batch(batch, transaction_name)
             while wait_time < wait:
                 status = self._get_status(
                     batch_id,
@@ -257,13 +1032,110 @@ class Dispatcher(object):
                 )
                 wait_time = time.time() - start_time
                 if status != 'PENDING':
+                    self._invalidate_outputs(batch)
                     return (response, status)
 
             return (response, "")
 
-        rest = self._send_request(
-            suffix="batches", data=batch_list.SerializeToString(), name=transaction_name,  http_verb="POST")
-        return (rest, "")
+        self._submit_batch(batch, transaction_name)
+        self._tracker.track(batch_id)
+        return (batch_id, 'PENDING')
+
+    def _invalidate_outputs(self, batch):
+        """Drops the cached state a batch writes to, so the request that
+        waited for it reads its own changes even if the state-delta event
+        has not arrived yet
+        """
+        if self._state_cache is None:
+            return
+        addresses = []
+        for transaction in batch.transactions:
+            header = transaction_pb2.TransactionHeader()
+            header.ParseFromString(transaction.header)
+            addresses.extend(header.outputs)
+        self._state_cache.invalidate(addresses)
+
+    def get_batch_statuses(self, batch_ids):
+        """Gets the status of several batches in one request
+
+        Args:
+            batch_ids (list of str): The batch ids
+
+        Returns:
+            list of dict: The REST API status entries
+        """
+        if self._connection is not None:
+            return self._get_validator_statuses(batch_ids)
+
+        url = f"{self.sawtooth_rest_api_url}/batch_statuses"
+        try:
+            result = self._session.post(
+                url,
+                json=batch_ids,
+                headers={'Content-Type': 'application/json'},
+                timeout=self._timeout)
+            if not result.ok:
+                raise ApiBadRequest("Error {}: {}".format(
+                    result.status_code, result.reason))
+        except requests.ConnectionError as err:
+            raise ApiBadRequest(
+                'Failed to connect to REST API: {}'.format(err)) from err
+        return result.json()['data']
+
+    def _get_validator_statuses(self, batch_ids, wait=0):
+        """Gets the status of several batches from the validator, in the
+        same form as the REST API status entries
+
+        Args:
+            batch_ids (list of str): The batch ids
+            wait (float): Seconds the validator holds the request until the
+                batches are final, rounded up to whole seconds. 0 to answer
+                at once.
+        """
+        hold = math.ceil(wait)
+        response = self._send_validator_request(
+            validator_pb2.Message.CLIENT_BATCH_STATUS_REQUEST,
+            client_batch_submit_pb2.ClientBatchStatusRequest(
+                batch_ids=batch_ids, wait=bool(hold), timeout=hold),
+            client_batch_submit_pb2.ClientBatchStatusResponse,
+            timeout=hold + STATUS_WAIT_MARGIN if hold else None)
+        if response.status != response.OK:
+            raise ApiBadRequest('Error getting batch statuses: {}'.format(
+                response.Status.Name(response.status)))
+        return [{
+            'id': status.batch_id,
+            'status': client_batch_submit_pb2.ClientBatchStatus.Status.Name(
+                status.status),
+            'invalid_transactions': [{
+                'id': transaction.transaction_id,
+                'message': transaction.message}
+                for transaction in status.invalid_transactions]}
+            for status in response.batch_statuses]
+
+    def get_batch_status(self, batch_id, wait=0):
+        """Gets the status of a batch from the status tracker, optionally
+        waiting for it to be final. Batches the tracker does not follow,
+        such as the ones submitted by other API processes, are looked up
+        and followed from then on.
+
+        Args:
+            batch_id (str): The batch id
+            wait (float): Seconds to wait for a final status at most
+
+        Returns:
+            dict: The REST API status entry of the batch
+        """
+        status = self._tracker.get(batch_id)
+        if status is None:
+            status = self.get_batch_statuses([batch_id])[0]
+            if status['status'] in FINAL_STATUSES:
+                self._tracker.add_status(status)
+                return status
+            self._tracker.track(batch_id)
+
+        if wait and wait > 0:
+            status = self._tracker.wait(batch_id, wait) or status
+        return status
 
     def _send_and_wait_for_commit(self, batch):
         # Send transaction to validator
@@ -292,3 +1164,50 @@ class Dispatcher(object):
             raise ApiInternalError('Transaction submitted but timed out')
         elif status == client_batch_submit_pb2.ClientBatchStatus.UNKNOWN:
             raise ApiInternalError('Something went wrong. Try again later')
+
+
+def init_dispatcher(app):
+    """Creates the Dispatcher shared by every request of the application
+
+    Args:
+        app (flask.Flask): The application, configured with the
+            SAWTOOTH_REST_API_URL, REST_API_POOL_SIZE,
+            REST_API_CONNECT_TIMEOUT, REST_API_READ_TIMEOUT,
+            BATCH_PRIVATE_KEY, SUBMIT_BATCH_WINDOW, SUBMIT_MAX_BATCHES and
+            BATCH_STATUS_INTERVAL, VALIDATOR_URL, STATE_PAGE_SIZE,
+            STATE_CACHE_SIZE, STATE_CACHE_TTL, STATE_CACHE_FALLBACK_TTL and
+            STATE_EVENTS_URL, INDEX_DATABASE and SIGNING_PROCESSES settings
+    """
+    app.extensions['pnrdnet_dispatcher'] = Dispatcher(
+        sawtooth_rest_api_url=app.config.get(
+            'SAWTOOTH_REST_API_URL', DEFAULT_URL_SAWTOOH_REST_API),
+        pool_size=app.config.get('REST_API_POOL_SIZE', DEFAULT_POOL_SIZE),
+        timeout=(
+            app.config.get('REST_API_CONNECT_TIMEOUT', DEFAULT_TIMEOUT[0]),
+            app.config.get('REST_API_READ_TIMEOUT', DEFAULT_TIMEOUT[1])),
+        batch_private_key=app.config.get('BATCH_PRIVATE_KEY') or
+        os.environ.get('PNRDNET_BATCH_PRIVATE_KEY'),
+        batch_window=app.config.get('SUBMIT_BATCH_WINDOW'),
+        max_batches=app.config.get(
+            'SUBMIT_MAX_BATCHES', DEFAULT_MAX_BATCHES),
+        status_interval=app.config.get(
+            'BATCH_STATUS_INTERVAL', DEFAULT_INTERVAL),
+        validator_url=app.config.get('VALIDATOR_URL') or
+        os.environ.get('PNRDNET_VALIDATOR_URL'),
+        state_page_size=app.config.get('STATE_PAGE_SIZE', STATE_PAGE_SIZE),
+        state_cache_size=app.config.get(
+            'STATE_CACHE_SIZE', STATE_CACHE_SIZE),
+        state_cache_ttl=app.config.get('STATE_CACHE_TTL', STATE_CACHE_TTL),
+        state_cache_fallback_ttl=app.config.get(
+            'STATE_CACHE_FALLBACK_TTL', STATE_CACHE_FALLBACK_TTL),
+        events_url=app.config.get('STATE_EVENTS_URL') or
+        os.environ.get('PNRDNET_STATE_EVENTS_URL'),
+        index_database=app.config.get('INDEX_DATABASE') or
+        os.environ.get('PNRDNET_INDEX_DATABASE'),
+        signing_processes=app.config.get('SIGNING_PROCESSES'))
+
+
+def get_dispatcher():
+    """Returns the Dispatcher of the current application"""
+    return current_app.extensions['pnrdnet_dispatcher']
+
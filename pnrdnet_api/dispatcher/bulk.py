@@ -0,0 +1,236 @@
+"""Grouping of the operations of a bulk request into BatchLists
+
+/record/bulk reads a stream of operations. Each operation is signed into
+its own Batch as soon as it is read, so an invalid operation only fails
+its own Batch, and the batches are sent in BatchLists as they fill up.
+BulkBatches decides when the pending batches make a BatchList: when there
+are enough of them, when they are large enough, or when the first one has
+waited long enough. At most one BatchList is held in memory, however long
+the stream is.
+
+The stream is read through BulkReader, or AsyncBulkReader, which wait for
+the next operation with a timeout. A stream that stops sending operations
+without ending still gets its pending batches sent once they have waited
+BULK_MAX_DELAY, instead of when the next line comes.
+"""
+
+import asyncio
+import queue
+import threading
+import time
+
+
+# Batches sent in one BatchList at most
+BULK_MAX_BATCHES = 100
+# Serialized size a BatchList is sent at, well below the 10 MB the REST API
+# accepts by default
+BULK_MAX_BYTES = 4 * 1024 * 1024
+# Seconds the first pending batch waits for more, so a slow stream still
+# gets its results
+BULK_MAX_DELAY = 0.5
+# Operations BulkReader reads ahead of their signing
+BULK_READ_AHEAD = 1000
+
+# Returned by the readers at the end of the stream
+END = object()
+
+
+class BulkBatches(object):
+    def __init__(self,
+                 max_batches=BULK_MAX_BATCHES,
+                 max_bytes=BULK_MAX_BYTES,
+                 max_delay=BULK_MAX_DELAY):
+        """
+        Args:
+            max_batches (int): Batches that make a BatchList
+            max_bytes (int): Serialized bytes that make a BatchList
+            max_delay (float): Seconds after which the pending batches make
+                a BatchList, see time_left
+        """
+        self._max_batches = max_batches
+        self._max_bytes = max_bytes
+        self._max_delay = max_delay
+        self._pending = []
+        self._batches = 0
+        self._bytes = 0
+        self._started = None
+
+    def add(self, batch=None, error=None):
+        """Adds the batch of an operation, or the error that rejected it.
+        Errors keep their place among the results without being sent.
+
+        Args:
+            batch (batch_pb2.Batch): The signed batch
+            error (Exception): Why the operation has no batch
+
+        Returns:
+            bool: Whether the pending batches should be sent
+        """
+        if self._started is None:
+            self._started = time.monotonic()
+        self._pending.append((batch, error))
+        if batch is not None:
+            self._batches += 1
+            self._bytes += batch.ByteSize()
+        return self._batches >= self._max_batches or \
+            self._bytes >= self._max_bytes or \
+            self.time_left() == 0
+
+    def time_left(self):
+        """Seconds until the pending batches should be sent, even if no
+        other operation is added
+
+        Returns:
+            float: The seconds, None when nothing is pending
+        """
+        if self._started is None:
+            return None
+        return max(self._started + self._max_delay - time.monotonic(), 0)
+
+    def take(self):
+        """Returns the pending operations, in the order they were added,
+        and starts a new BatchList
+
+        Returns:
+            list of tuple: The batch and the error of each operation
+        """
+        pending = self._pending
+        self._pending = []
+        self._batches = 0
+        self._bytes = 0
+        self._started = None
+        return pending
+
+
+def earliest(*timeouts):
+    """Returns the shortest of timeouts in seconds, None meaning no
+    timeout
+    """
+    timeouts = [timeout for timeout in timeouts if timeout is not None]
+    return min(timeouts) if timeouts else None
+
+
+class BulkReader(object):
+    """Reads the operations of a bulk request in a thread, so they can be
+    waited for with a timeout
+    """
+
+    def __init__(self, items, read_ahead=BULK_READ_AHEAD):
+        """
+        Args:
+            items (iterable): The operations, read as the stream arrives
+            read_ahead (int): Operations read at most before they are taken
+        """
+        self._queue = queue.Queue(maxsize=read_ahead)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(
+            target=self._read,
+            args=(items,),
+            name='pnrdnet-bulk-reader',
+            daemon=True)
+        self._thread.start()
+
+    def _read(self, items):
+        try:
+            for item in items:
+                if not self._put((item, None)):
+                    return
+            self._put((END, None))
+        except Exception as err:  # pylint: disable=broad-except
+            self._put((END, err))
+
+    def _put(self, entry):
+        while not self._closed.is_set():
+            try:
+                self._queue.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(self, timeout=None):
+        """Takes the next operation
+
+        Args:
+            timeout (float): Seconds to wait for it, None to wait until it
+                comes
+
+        Returns:
+            The operation, or END at the end of the stream
+
+        Raises:
+            queue.Empty: No operation came in time
+            Exception: The stream failed, with its error
+        """
+        item, error = self._queue.get(timeout=timeout)
+        if error is not None:
+            raise error
+        return item
+
+    def close(self):
+        """Stops reading, such as when the response was abandoned"""
+        self._closed.set()
+
+
+class AsyncBulkReader(object):
+    """Waits for the operations of a bulk request with a timeout, without
+    cancelling the read of the next one when it expires
+    """
+
+    def __init__(self, items):
+        """
+        Args:
+            items (async iterable): The operations
+        """
+        self._items = items.__aiter__()
+        self._next = None
+
+    async def get(self, timeout=None):
+        """Takes the next operation, see BulkReader.get
+
+        Raises:
+            asyncio.TimeoutError: No operation came in time
+        """
+        if self._next is None:
+            self._next = asyncio.ensure_future(self._items.__anext__())
+        done, _ = await asyncio.wait({self._next}, timeout=timeout)
+        if not done:
+            raise asyncio.TimeoutError()
+
+        future, self._next = self._next, None
+        try:
+            return future.result()
+        except StopAsyncIteration:
+            return END
+
+    def close(self):
+        if self._next is not None:
+            self._next.cancel()
+            self._next = None
+
+
+def bulk_results(pending, rejected, statuses):
+    """Reports the outcome of each operation of a sent BatchList
+
+    Args:
+        pending (list of tuple): The batch and the error of each operation,
+            see BulkBatches.take
+        rejected (dict): Error of each batch id the validator did not take
+        statuses (dict): Status of each batch id, PENDING when missing
+
+    Yields:
+        dict: The batch_id and status of each operation, and the error when
+            its status is INVALID_INPUT or REJECTED
+    """
+    for batch, error in pending:
+        if batch is None:
+            yield {'batch_id': None, 'status': 'INVALID_INPUT',
+                   'error': error}
+            continue
+        batch_id = batch.header_signature
+        if batch_id in rejected:
+            yield {'batch_id': batch_id, 'status': 'REJECTED',
+                   'error': rejected[batch_id]}
+        else:
+            yield {'batch_id': batch_id,
+                   'status': statuses.get(batch_id, 'PENDING')}
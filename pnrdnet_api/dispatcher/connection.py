@@ -0,0 +1,216 @@
+"""Direct ZMQ connection to the validator client endpoint
+
+The validator serves the same requests as the REST API (batch submission,
+batch status, state reads) as protobuf messages on its ZMQ ROUTER endpoint,
+the one given to the API with --connect. ValidatorConnection keeps a single
+DEALER socket to it and multiplexes the requests of every thread over it:
+each message carries a correlation id and its response resolves the future
+waiting on that id.
+
+ZMQ sockets are not thread-safe, so the socket is only used by a background
+I/O thread. Callers queue their messages and wake the thread through an
+inproc pipe.
+"""
+
+import concurrent.futures
+import itertools
+import logging
+import queue
+import threading
+import uuid
+
+import zmq
+
+from sawtooth_sdk.protobuf import validator_pb2
+
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 30
+
+
+class ValidatorConnection(object):
+    def __init__(self, url, timeout=DEFAULT_TIMEOUT):
+        """
+        Args:
+            url (str): ZMQ endpoint of the validator, e.g.
+                tcp://localhost:4004
+            timeout (float): Seconds send() waits for a response
+        """
+        self._url = url
+        self._timeout = timeout
+        self._context = zmq.Context.instance()
+        self._pipe_address = 'inproc://pnrdnet-connection-{}'.format(
+            uuid.uuid4().hex)
+        self._outgoing = queue.Queue()
+        self._futures = {}
+        self._handlers = {}
+        self._futures_lock = threading.Lock()
+        self._correlation_ids = itertools.count()
+        self._correlation_prefix = uuid.uuid4().hex[:8]
+        self._wake = None
+        self._wake_lock = threading.Lock()
+        self._thread = None
+
+    def open(self):
+        """Connects to the validator and starts the I/O thread"""
+        if self._thread is not None:
+            return
+
+        pipe = self._context.socket(zmq.PAIR)
+        pipe.bind(self._pipe_address)
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(pipe,),
+            name='pnrdnet-validator-connection',
+            daemon=True)
+        self._wake = self._context.socket(zmq.PAIR)
+        self._wake.connect(self._pipe_address)
+        self._thread.start()
+
+    def close(self):
+        """Stops the I/O thread, failing the requests still waiting"""
+        if self._thread is None:
+            return
+
+        self._outgoing.put(None)
+        self._notify()
+        self._thread.join()
+        self._wake.close(linger=0)
+        self._thread = None
+
+    def add_handler(self, message_type, handler):
+        """Registers a function called with the messages of a type the
+        validator sends on its own, such as CLIENT_EVENTS. It runs on the
+        I/O thread and must return quickly.
+
+        Args:
+            message_type (int): validator_pb2.Message type
+            handler (callable): Takes the validator_pb2.Message
+        """
+        self._handlers[message_type] = handler
+
+    def send_async(self, message_type, content):
+        """Queues a request to the validator
+
+        Args:
+            message_type (int): validator_pb2.Message type of the request
+            content (bytes): Serialized request
+
+        Returns:
+            concurrent.futures.Future: Resolves to the validator_pb2.Message
+                answering the request
+        """
+        correlation_id = '{}-{}'.format(
+            self._correlation_prefix, next(self._correlation_ids))
+        message = validator_pb2.Message(
+            correlation_id=correlation_id,
+            message_type=message_type,
+            content=content)
+        future = concurrent.futures.Future()
+        future.correlation_id = correlation_id
+        with self._futures_lock:
+            self._futures[correlation_id] = future
+        self._outgoing.put(message)
+        self._notify()
+        return future
+
+    def send(self, message_type, content, timeout=None):
+        """Sends a request to the validator and waits for its response
+
+        Args:
+            message_type (int): validator_pb2.Message type of the request
+            content (bytes): Serialized request
+            timeout (float): Seconds to wait, the connection timeout when
+                None
+
+        Returns:
+            validator_pb2.Message: The response
+        """
+        future = self.send_async(message_type, content)
+        try:
+            return future.result(
+                timeout if timeout is not None else self._timeout)
+        except concurrent.futures.TimeoutError:
+            with self._futures_lock:
+                self._futures.pop(future.correlation_id, None)
+            raise
+
+    def _notify(self):
+        with self._wake_lock:
+            self._wake.send(b'')
+
+    def _run(self, pipe):
+        socket = self._context.socket(zmq.DEALER)
+        socket.identity = uuid.uuid4().hex.encode()
+        socket.connect(self._url)
+
+        poller = zmq.Poller()
+        poller.register(socket, zmq.POLLIN)
+        poller.register(pipe, zmq.POLLIN)
+
+        try:
+            while True:
+                events = dict(poller.poll())
+
+                if pipe in events:
+                    while pipe.poll(0):
+                        pipe.recv()
+                    if not self._send_outgoing(socket):
+                        return
+
+                if socket in events:
+                    while socket.poll(0):
+                        self._receive(socket, socket.recv_multipart()[-1])
+        finally:
+            socket.close(linger=0)
+            pipe.close(linger=0)
+            self._fail_pending()
+
+    def _send_outgoing(self, socket):
+        """Sends the queued messages, returns False when closing"""
+        while True:
+            try:
+                message = self._outgoing.get_nowait()
+            except queue.Empty:
+                return True
+            if message is None:
+                return False
+            socket.send_multipart([message.SerializeToString()])
+
+    def _receive(self, socket, data):
+        message = validator_pb2.Message()
+        message.ParseFromString(data)
+
+        if message.message_type == validator_pb2.Message.PING_REQUEST:
+            socket.send_multipart([validator_pb2.Message(
+                correlation_id=message.correlation_id,
+                message_type=validator_pb2.Message.PING_RESPONSE,
+                content=b'').SerializeToString()])
+            return
+
+        handler = self._handlers.get(message.message_type)
+        if handler is not None:
+            try:
+                handler(message)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception('Failed to handle validator message of '
+                                 'type %s', message.message_type)
+            return
+
+        with self._futures_lock:
+            future = self._futures.pop(message.correlation_id, None)
+        if future is None:
+            LOGGER.debug('Unexpected validator message of type %s',
+                         message.message_type)
+            return
+        future.set_result(message)
+
+    def _fail_pending(self):
+        with self._futures_lock:
+            futures = list(self._futures.values())
+            self._futures.clear()
+        for future in futures:
+            if not future.done():
+                future.set_exception(
+                    ConnectionError('Validator connection closed'))
@@ -0,0 +1,103 @@
+"""Cache of the transaction signers of repeat submitters
+
+Parsing a private key and deriving its public key are the most expensive
+steps of building a transaction after the signature itself. SignerCache
+keeps recently used signers, along with their public key hex and owner
+address, for a bounded time. Private keys are only used to compute a keyed
+hash that identifies the entry; they are never stored as dict keys.
+"""
+
+import collections
+import hashlib
+import os
+import threading
+import time
+
+from sawtooth_signing import secp256k1
+
+from pnrdnet_addressing.addresser import get_owner_address
+
+
+SIGNER_CACHE_SIZE = 1024
+SIGNER_CACHE_TTL = 600
+
+
+class CachedSigner(object):
+    """Wraps a sawtooth_signing.Signer, deriving its public key once"""
+
+    def __init__(self, signer):
+        self._signer = signer
+        self._public_key = signer.get_public_key()
+        self.public_key_hex = self._public_key.as_hex()
+        self.owner_address = get_owner_address(self.public_key_hex)
+
+    def sign(self, message):
+        return self._signer.sign(message)
+
+    def get_public_key(self):
+        return self._public_key
+
+    def __repr__(self):
+        return '<CachedSigner {}>'.format(self.public_key_hex)
+
+
+class SignerCache(object):
+    """Thread-safe LRU cache of CachedSigners with a time to live"""
+
+    def __init__(self,
+                 crypto_factory,
+                 size=SIGNER_CACHE_SIZE,
+                 ttl=SIGNER_CACHE_TTL):
+        """
+        Args:
+            crypto_factory (sawtooth_signing.CryptoFactory): Creates the
+                signers
+            size (int): Maximum number of signers kept
+            ttl (float): Seconds a signer is kept after being created
+        """
+        self._crypto_factory = crypto_factory
+        self._size = size
+        self._ttl = ttl
+        # Per-process secret, so the cache keys cannot be matched against
+        # hashes of known keys
+        self._salt = os.urandom(32)
+        self._signers = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cache_key(self, private_key):
+        return hashlib.blake2b(
+            private_key.encode('utf-8'), key=self._salt).digest()
+
+    def get(self, private_key):
+        """Returns the signer of a private key, creating it on a miss
+
+        Args:
+            private_key (str): Hex private key
+
+        Returns:
+            CachedSigner: The signer
+        """
+        cache_key = self._cache_key(private_key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._signers.get(cache_key)
+            if entry is not None:
+                signer, expires = entry
+                if expires > now:
+                    self._signers.move_to_end(cache_key)
+                    return signer
+                del self._signers[cache_key]
+
+        signer = CachedSigner(self._crypto_factory.new_signer(
+            secp256k1.Secp256k1PrivateKey.from_hex(private_key)))
+
+        with self._lock:
+            self._signers[cache_key] = (signer, now + self._ttl)
+            self._signers.move_to_end(cache_key)
+            while len(self._signers) > self._size:
+                self._signers.popitem(last=False)
+        return signer
+
+    def clear(self):
+        with self._lock:
+            self._signers.clear()
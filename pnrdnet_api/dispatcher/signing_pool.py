@@ -0,0 +1,313 @@
+"""Building and signing of batches in worker processes
+
+Building a transaction (encoding its payload, hashing it, and signing the
+transaction and batch headers) is pure Python and secp256k1 work that holds
+the GIL, so the request threads of one API process sign one batch at a
+time. SigningPool runs the make_* functions of transaction_creation in a
+pool of worker processes instead. Each worker keeps its own SignerCache and
+batch signer, so repeat submitters do not pay for key parsing again, and
+sends back the serialized Batch.
+
+Work is sent in chunks of jobs, a job being a make_* function, the private
+key of the transaction signer and the keyword arguments of the function.
+SigningQueue keeps a few chunks in flight and hands back their batches in
+the order the jobs were added, which is what the bulk endpoint needs.
+
+Workers are forked, so the pool should be created before its owner starts
+any thread. A worker that dies, such as when it is killed or runs out of
+memory, breaks the executor: the chunks it had fail, and the pool is
+forked again on the next submission.
+"""
+
+import collections
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+from sawtooth_sdk.protobuf import batch_pb2
+from sawtooth_signing import create_context
+from sawtooth_signing import CryptoFactory
+from sawtooth_signing import secp256k1
+
+from .signers import CachedSigner
+from .signers import SignerCache
+from .signers import SIGNER_CACHE_SIZE
+from .signers import SIGNER_CACHE_TTL
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Jobs sent to a worker at once
+SIGNING_CHUNK_SIZE = 32
+# Seconds the first job of a chunk waits for the chunk to fill, see
+# SigningQueue.time_left
+SIGNING_MAX_DELAY = 0.05
+
+# Signers of the worker process, set by _init_worker
+_batch_signer = None
+_signers = None
+
+
+def _init_worker(batch_private_key, signer_cache_size, signer_ttl):
+    global _batch_signer, _signers  # pylint: disable=global-statement
+    context = create_context('secp256k1')
+    crypto_factory = CryptoFactory(context)
+    _batch_signer = CachedSigner(crypto_factory.new_signer(
+        secp256k1.Secp256k1PrivateKey.from_hex(batch_private_key)))
+    _signers = SignerCache(
+        crypto_factory, size=signer_cache_size, ttl=signer_ttl)
+
+
+def _sign_chunk(jobs):
+    """Runs in a worker, builds and signs the batch of each job
+
+    Returns:
+        list of tuple: The serialized batch, or the error, of each job
+    """
+    results = []
+    for make_transaction, private_key, kwargs in jobs:
+        try:
+            batch = make_transaction(
+                transaction_signer=_signers.get(private_key),
+                batch_signer=_batch_signer,
+                **kwargs)
+            results.append((batch.SerializeToString(), None))
+        except Exception as err:  # pylint: disable=broad-except
+            results.append((None, err))
+    return results
+
+
+def _parse_batch(data):
+    batch = batch_pb2.Batch()
+    batch.ParseFromString(data)
+    return batch
+
+
+class SigningPool(object):
+    def __init__(self,
+                 batch_private_key,
+                 processes=None,
+                 signer_cache_size=SIGNER_CACHE_SIZE,
+                 signer_ttl=SIGNER_CACHE_TTL):
+        """Starts the worker processes. They are forked at once, so the
+        pool should be created before the threads of its owner.
+
+        Args:
+            batch_private_key (str): Hex private key of the batch signer
+            processes (int): Worker processes, one per CPU when None
+            signer_cache_size (int): Transaction signers kept per worker,
+                see SignerCache
+            signer_ttl (float): Seconds a transaction signer is kept
+        """
+        self.processes = processes or os.cpu_count()
+        self._initargs = (batch_private_key, signer_cache_size, signer_ttl)
+        self._lock = threading.Lock()
+        self._executor = self._start()
+
+    def _start(self):
+        if threading.active_count() > 1:
+            LOGGER.warning('Forking %s signing workers while %s threads '
+                           'run', self.processes, threading.active_count())
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_worker,
+            initargs=self._initargs)
+        # The first submission forks every worker
+        executor.submit(_sign_chunk, []).result()
+        return executor
+
+    def _restart(self, broken):
+        """Replaces a broken executor, unless another thread already did
+
+        Returns:
+            concurrent.futures.ProcessPoolExecutor: The working executor
+        """
+        with self._lock:
+            if self._executor is broken:
+                LOGGER.error('A signing worker died, restarting the pool '
+                             'of %s workers', self.processes)
+                broken.shutdown(wait=False)
+                self._executor = self._start()
+            return self._executor
+
+    def close(self):
+        with self._lock:
+            self._executor.shutdown(wait=True)
+
+    def submit_chunk(self, jobs):
+        """Signs a chunk of jobs in a worker
+
+        Args:
+            jobs (list of tuple): The make_* function, private key and
+                keyword arguments of each batch
+
+        Returns:
+            concurrent.futures.Future: Resolves to the serialized batch,
+                or the error, of each job. Fails with BrokenProcessPool
+                when a worker died while the chunk was in flight.
+        """
+        executor = self._executor
+        try:
+            return executor.submit(_sign_chunk, jobs)
+        except BrokenProcessPool:
+            return self._restart(executor).submit(_sign_chunk, jobs)
+
+    def submit(self, make_transaction, private_key, **kwargs):
+        """Signs one batch in a worker
+
+        Args:
+            make_transaction (callable): A make_* function of
+                transaction_creation
+            private_key (str): Hex private key of the transaction signer
+            kwargs: The arguments of make_transaction but the signers
+
+        Returns:
+            concurrent.futures.Future: Resolves to the batch_pb2.Batch
+        """
+        future = concurrent.futures.Future()
+
+        def done(chunk):
+            try:
+                data, error = chunk.result()[0]
+                if error is not None:
+                    raise error
+                future.set_result(_parse_batch(data))
+            except Exception as err:  # pylint: disable=broad-except
+                future.set_exception(err)
+
+        self.submit_chunk([(make_transaction, private_key, kwargs)]) \
+            .add_done_callback(done)
+        return future
+
+    def sign(self, make_transaction, private_key, **kwargs):
+        """Signs one batch in a worker and waits for it, see submit"""
+        return self.submit(make_transaction, private_key, **kwargs).result()
+
+
+class SigningQueue(object):
+    """Signs a stream of jobs in chunks on a SigningPool and returns their
+    batches in order, with a bounded number of chunks in flight.
+
+    Errors added in place of jobs, such as the ones of operations that did
+    not validate, are returned at their position without being sent.
+    """
+
+    def __init__(self,
+                 pool,
+                 chunk_size=SIGNING_CHUNK_SIZE,
+                 max_delay=SIGNING_MAX_DELAY,
+                 max_chunks=None):
+        """
+        Args:
+            pool (SigningPool): The workers
+            chunk_size (int): Jobs sent to a worker at once
+            max_delay (float): Seconds after which a chunk is sent even if
+                not full
+            max_chunks (int): Chunks in flight at most, two per worker when
+                None
+        """
+        self._pool = pool
+        self._chunk_size = chunk_size
+        self._max_delay = max_delay
+        self._max_chunks = max_chunks or 2 * pool.processes
+        self._entries = []
+        self._jobs = []
+        self._started = None
+        self._in_flight = collections.deque()
+
+    def add(self, job):
+        """Adds a job, or an error to return at its place
+
+        Args:
+            job (tuple or Exception): The make_* function, private key and
+                keyword arguments of a batch
+        """
+        if self._started is None:
+            self._started = time.monotonic()
+        if isinstance(job, Exception):
+            self._entries.append(job)
+        else:
+            self._entries.append(None)
+            self._jobs.append(job)
+        if len(self._entries) >= self._chunk_size or \
+                time.monotonic() - self._started >= self._max_delay:
+            self.flush()
+
+    def flush(self):
+        """Sends the jobs added since the last chunk"""
+        if not self._entries:
+            return
+        chunk = self._pool.submit_chunk(self._jobs) if self._jobs else None
+        self._in_flight.append((self._entries, chunk, time.monotonic()))
+        self._entries = []
+        self._jobs = []
+        self._started = None
+
+    def full(self):
+        """Whether a chunk must be taken before more jobs are added"""
+        return len(self._in_flight) >= self._max_chunks
+
+    def ready(self):
+        """Whether the oldest chunk in flight is signed"""
+        if not self._in_flight:
+            return False
+        _, chunk, _ = self._in_flight[0]
+        return chunk is None or chunk.done()
+
+    def time_left(self):
+        """Seconds until the jobs added should be sent and the oldest chunk
+        in flight taken, even if no other job is added
+
+        Returns:
+            float: The seconds, None when there are no jobs
+        """
+        deadlines = []
+        if self._started is not None:
+            deadlines.append(self._started + self._max_delay)
+        if self._in_flight:
+            deadlines.append(self._in_flight[0][2] + self._max_delay)
+        if not deadlines:
+            return None
+        return max(min(deadlines) - time.monotonic(), 0)
+
+    def __len__(self):
+        return len(self._in_flight)
+
+    def pop(self):
+        """Takes the oldest chunk in flight
+
+        Returns:
+            concurrent.futures.Future: Resolves to the batch_pb2.Batch, or
+                the error, of each job of the chunk, as (batch, error)
+        """
+        entries, chunk, _ = self._in_flight.popleft()
+        future = concurrent.futures.Future()
+
+        def done(chunk):
+            try:
+                results = iter(chunk.result() if chunk is not None else ())
+                signed = []
+                for error in entries:
+                    if error is None:
+                        data, error = next(results)
+                    if error is not None:
+                        signed.append((None, error))
+                    else:
+                        signed.append((_parse_batch(data), None))
+                future.set_result(signed)
+            except Exception as err:  # pylint: disable=broad-except
+                # The chunk itself failed, such as with a worker that died
+                future.set_result([
+                    (None, error if error is not None else err)
+                    for error in entries])
+
+        if chunk is None:
+            done(None)
+        else:
+            chunk.add_done_callback(done)
+        return future
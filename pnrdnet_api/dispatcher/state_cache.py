@@ -0,0 +1,249 @@
+"""Cache of decoded owner and record state
+
+Dashboards poll /owner/detail and /record/detail for the same records over
+and over, while the records only change when a block commits one of their
+transactions. StateCache keeps the decoded state of recently read addresses
+in memory, bounded in size and age.
+
+StateDeltaSubscriber keeps the entries fresh: it subscribes to the
+sawtooth/state-delta events of the pnrd_net namespace on the validator and
+drops the entries of every address a block changes. While the subscription
+is down, entries are only trusted for a short fallback TTL instead of the
+regular one.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from sawtooth_sdk.protobuf import client_event_pb2
+from sawtooth_sdk.protobuf import events_pb2
+from sawtooth_sdk.protobuf import transaction_receipt_pb2
+from sawtooth_sdk.protobuf import validator_pb2
+
+from pnrdnet_addressing.addresser import NAMESPACE
+
+
+LOGGER = logging.getLogger(__name__)
+
+STATE_CACHE_SIZE = 10000
+# Seconds an entry is served while state-delta events keep it fresh
+STATE_CACHE_TTL = 300
+# Seconds an entry is served while there are no events
+STATE_CACHE_FALLBACK_TTL = 2
+# Seconds between two subscription requests. Each one renews the
+# subscription from the last block seen, so a restarted validator or a lost
+# connection is noticed within this time and no event is missed.
+RESUBSCRIBE_INTERVAL = 10
+
+
+def make_subscribe_request(block_id=None):
+    """Builds the subscription to the block commits and the state changes
+    of the pnrd_net namespace
+
+    Args:
+        block_id (str): Last block seen, the validator first sends the
+            events of the blocks committed after it
+
+    Returns:
+        client_event_pb2.ClientEventsSubscribeRequest: The request
+    """
+    return client_event_pb2.ClientEventsSubscribeRequest(
+        subscriptions=[
+            events_pb2.EventSubscription(
+                event_type='sawtooth/block-commit'),
+            events_pb2.EventSubscription(
+                event_type='sawtooth/state-delta',
+                filters=[events_pb2.EventFilter(
+                    key='address',
+                    match_string='^{}.*'.format(NAMESPACE),
+                    filter_type=events_pb2.EventFilter.REGEX_ANY)])],
+        last_known_block_ids=[block_id] if block_id else [])
+
+
+class StateCache(object):
+    """Thread-safe LRU cache of decoded state keyed by address"""
+
+    def __init__(self,
+                 size=STATE_CACHE_SIZE,
+                 ttl=STATE_CACHE_TTL,
+                 fallback_ttl=STATE_CACHE_FALLBACK_TTL):
+        """
+        Args:
+            size (int): Maximum number of addresses kept
+            ttl (float): Seconds an entry is served while events are
+                received
+            fallback_ttl (float): Seconds an entry is served otherwise
+        """
+        self._size = size
+        self._ttl = ttl
+        self._fallback_ttl = fallback_ttl
+        # Address -> (time it was stored, decoded state)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # Incremented by every invalidation, so a value read before one is
+        # not stored after it
+        self._version = 0
+        self._events_active = False
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get_or_load(self, address, load):
+        """Returns the decoded state of an address, calling load on a miss.
+        Values are shared between callers and must not be modified.
+
+        Args:
+            address (str): The state address
+            load (callable): Reads and decodes the state of the address
+
+        Returns:
+            object: The value returned by load
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(address)
+            if entry is not None:
+                stored, value = entry
+                ttl = self._ttl if self._events_active else self._fallback_ttl
+                if now - stored < ttl:
+                    self._entries.move_to_end(address)
+                    self.hits += 1
+                    return value
+                del self._entries[address]
+            self.misses += 1
+            version = self._version
+
+        value = load()
+
+        with self._lock:
+            if version == self._version:
+                self._entries[address] = (now, value)
+                self._entries.move_to_end(address)
+                while len(self._entries) > self._size:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, addresses):
+        """Drops the entries of changed addresses
+
+        Args:
+            addresses (iterable of str): The state addresses
+        """
+        with self._lock:
+            self._version += 1
+            for address in addresses:
+                if self._entries.pop(address, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def set_events_active(self, active):
+        """Switches between the regular and the fallback TTL"""
+        with self._lock:
+            self._events_active = active
+
+    def stats(self):
+        """Returns the size of the cache and its hit and miss counts
+
+        Returns:
+            dict: size, hits, misses, hit_rate, invalidations and
+                events_active
+        """
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'invalidations': self.invalidations,
+                'events_active': self._events_active,
+            }
+
+
+class StateDeltaSubscriber(object):
+    def __init__(self, connection, cache, interval=RESUBSCRIBE_INTERVAL):
+        """Starts a background thread keeping a subscription to the state
+        changes of the namespace and invalidating them in the cache
+
+        Args:
+            connection (ValidatorConnection): Open connection to the
+                validator
+            cache (StateCache): The cache to keep fresh
+            interval (float): Seconds between two subscription requests
+        """
+        self._connection = connection
+        self._cache = cache
+        self._interval = interval
+        # Last block whose events were handled, the validator resends the
+        # events of the blocks committed after it
+        self._block_id = None
+        self._active = False
+        self._stopping = threading.Event()
+        connection.add_handler(
+            validator_pb2.Message.CLIENT_EVENTS, self._handle_events)
+        self._thread = threading.Thread(
+            target=self._run, name='pnrdnet-state-events', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stopping.set()
+        self._thread.join()
+        self._cache.set_events_active(False)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._active = self._subscribe()
+            self._cache.set_events_active(self._active)
+            self._stopping.wait(self._interval)
+
+    def _subscribe(self):
+        """Sends a subscription request, returns whether it succeeded"""
+        request = make_subscribe_request(self._block_id)
+        try:
+            message = self._connection.send(
+                validator_pb2.Message.CLIENT_EVENTS_SUBSCRIBE_REQUEST,
+                request.SerializeToString(),
+                timeout=self._interval)
+        except Exception as err:  # pylint: disable=broad-except
+            LOGGER.warning('State-delta subscription failed: %r', err)
+            return False
+
+        response = client_event_pb2.ClientEventsSubscribeResponse()
+        response.ParseFromString(message.content)
+        if response.status == response.UNKNOWN_BLOCK:
+            # The validator cannot replay the events missed since that
+            # block, start over from an empty cache
+            LOGGER.info('Block %s unknown to the validator, clearing the '
+                        'state cache', self._block_id)
+            self._block_id = None
+            self._cache.clear()
+            return self._subscribe()
+        if response.status != response.OK:
+            LOGGER.warning('State-delta subscription rejected: %s',
+                           response.response_message)
+            return False
+
+        if self._block_id is None and not self._active:
+            # Changes before the subscription were not seen
+            self._cache.clear()
+        return True
+
+    def _handle_events(self, message):
+        event_list = events_pb2.EventList()
+        event_list.ParseFromString(message.content)
+        for event in event_list.events:
+            if event.event_type == 'sawtooth/state-delta':
+                changes = transaction_receipt_pb2.StateChangeList()
+                changes.ParseFromString(event.data)
+                self._cache.invalidate(
+                    change.address for change in changes.state_changes)
+            elif event.event_type == 'sawtooth/block-commit':
+                for attribute in event.attributes:
+                    if attribute.key == 'block_id':
+                        self._block_id = attribute.value
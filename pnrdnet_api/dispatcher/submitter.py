@@ -0,0 +1,175 @@
+"""Micro-batching of the batches sent to the Sawtooth REST API
+
+API requests running at the same time each build their own Batch. Instead of
+one POST /batches per Batch, BatchSubmitter collects the batches handed to
+it for a short window, or until it has enough of them, and posts them as a
+single BatchList. Every Batch keeps its own id, so callers still follow and
+report their own status, and an invalid Batch does not affect the others
+once the validator has them. Batches whose caller gave up on them before
+their BatchList is sent are left out of it.
+"""
+
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+
+from sawtooth_sdk.protobuf import batch_pb2
+
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 0.01
+DEFAULT_MAX_BATCHES = 100
+
+
+class BatchSubmitter(object):
+    def __init__(self,
+                 send_batch_list,
+                 window=DEFAULT_WINDOW,
+                 max_batches=DEFAULT_MAX_BATCHES,
+                 is_rejection=None):
+        """
+        Args:
+            send_batch_list (callable): Posts serialized BatchList bytes to
+                the REST API and returns its response
+            window (float): Seconds to wait for more batches after the
+                first one of a BatchList arrives
+            max_batches (int): Batches that make a BatchList be sent
+                without waiting for the window to end
+            is_rejection (callable): Tells whether an error raised by
+                send_batch_list means the REST API refused the BatchList
+                as a whole, in which case its batches are sent again one
+                by one. Other errors fail every batch of the BatchList,
+                as some of them may have been taken. None to never retry.
+        """
+        self._send_batch_list = send_batch_list
+        self._window = window
+        self._max_batches = max_batches
+        self._is_rejection = is_rejection
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        # Batches taken from the queue and not yet sent
+        self._taken = []
+        self._thread = threading.Thread(
+            target=self._run, name='pnrdnet-batch-submitter', daemon=True)
+        self._thread.start()
+
+    def submit(self, batch):
+        """Queues a batch for the next BatchList
+
+        Args:
+            batch (batch_pb2.Batch): The batch
+
+        Returns:
+            concurrent.futures.Future: Resolves to the REST API response of
+                the BatchList that carried the batch
+        """
+        future = concurrent.futures.Future()
+        with self._lock:
+            if not self._closed:
+                self._queue.put((batch, future))
+                return future
+        future.set_exception(RuntimeError('BatchSubmitter is closed'))
+        return future
+
+    def close(self):
+        """Sends the queued batches and stops the background thread.
+        Batches submitted afterwards fail with RuntimeError.
+        """
+        with self._lock:
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+        self._fail_queued()
+
+    def _fail_queued(self):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                _resolve(item[1], error=RuntimeError(
+                    'BatchSubmitter is closed'))
+
+    def _run(self):
+        try:
+            self._send_queued()
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception('Batch submitter stopped')
+            with self._lock:
+                self._closed = True
+            for _, future in self._taken:
+                _resolve(future, error=RuntimeError(
+                    'BatchSubmitter stopped'))
+            self._fail_queued()
+
+    def _send_queued(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            pending = self._taken = [item]
+            deadline = time.monotonic() + self._window
+            while len(pending) < self._max_batches:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                pending.append(item)
+
+            self._submit(pending)
+            self._taken = []
+
+    def _submit(self, pending):
+        # A cancelled future timed out, its caller already answered that
+        # the batch was not submitted
+        pending = [item for item in pending if not item[1].cancelled()]
+        if not pending:
+            return
+
+        batch_list = batch_pb2.BatchList(
+            batches=[batch for batch, _ in pending])
+        try:
+            response = self._send_batch_list(batch_list.SerializeToString())
+        except Exception as err:  # pylint: disable=broad-except
+            if len(pending) > 1 and self._is_rejection is not None and \
+                    self._is_rejection(err):
+                # The REST API rejects a whole BatchList if one of its
+                # batches is malformed, retry them one by one so only that
+                # caller gets the error
+                LOGGER.warning(
+                    'BatchList of %s batches rejected, sending them '
+                    'separately: %s', len(pending), err)
+                for item in pending:
+                    self._submit([item])
+                return
+            for _, future in pending:
+                _resolve(future, error=err)
+            return
+
+        for _, future in pending:
+            _resolve(future, response=response)
+
+
+def _resolve(future, response=None, error=None):
+    """Sets the outcome of a future, unless it has one or its caller gave
+    up on it
+    """
+    if future.done() or not future.set_running_or_notify_cancel():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(response)
@@ -0,0 +1,172 @@
+"""Shared tracking of the status of submitted batches
+
+Requests that do not wait for their batch to be committed hand the batch id
+to BatchStatusTracker. A single background thread asks the REST API for the
+status of every outstanding id at once, instead of each request polling its
+own. Final statuses are cached for a while so /batch/<id> can answer them
+without another round trip, and callers can block on wait() until their
+batch leaves PENDING.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 0.5
+# Ids sent in one status request
+STATUS_CHUNK_SIZE = 100
+# Batches still PENDING or UNKNOWN after being tracked this long stop being
+# polled and keep their latest status
+TRACK_TIMEOUT = 300
+STATUS_CACHE_SIZE = 10000
+STATUS_CACHE_TTL = 600
+
+FINAL_STATUSES = ('COMMITTED', 'INVALID')
+
+
+class BatchStatusTracker(object):
+    def __init__(self,
+                 get_statuses,
+                 interval=DEFAULT_INTERVAL,
+                 cache_size=STATUS_CACHE_SIZE,
+                 cache_ttl=STATUS_CACHE_TTL):
+        """
+        Args:
+            get_statuses (callable): Takes a list of batch ids and returns
+                the REST API status entries of those ids
+            interval (float): Seconds between two status requests
+            cache_size (int): Final statuses kept
+            cache_ttl (float): Seconds a final status is kept
+        """
+        self._get_statuses = get_statuses
+        self._interval = interval
+        self._cache_size = cache_size
+        self._cache_ttl = cache_ttl
+        # Outstanding batch id -> (time it was tracked, latest status)
+        self._pending = {}
+        # Final batch id -> (expiry, status)
+        self._final = collections.OrderedDict()
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(
+            target=self._run, name='pnrdnet-status-tracker', daemon=True)
+        self._thread.start()
+
+    def track(self, batch_id):
+        """Starts following the status of a submitted batch"""
+        with self._condition:
+            if batch_id not in self._final:
+                self._pending.setdefault(
+                    batch_id,
+                    (time.monotonic(), {'id': batch_id, 'status': 'PENDING'}))
+            self._condition.notify_all()
+
+    def add_status(self, status):
+        """Caches a final status obtained elsewhere, such as for a batch
+        submitted by another API process
+
+        Args:
+            status (dict): REST API status entry
+        """
+        if status.get('status') in FINAL_STATUSES:
+            with self._condition:
+                self._finish(status['id'], status)
+                self._condition.notify_all()
+
+    def get(self, batch_id):
+        """Returns the latest known status of a batch
+
+        Args:
+            batch_id (str): The batch id
+
+        Returns:
+            dict: The status entry, None if the batch is not tracked
+        """
+        with self._condition:
+            return self._lookup(batch_id)
+
+    def wait(self, batch_id, timeout):
+        """Blocks until a tracked batch has a final status or the timeout
+        ends
+
+        Args:
+            batch_id (str): The batch id
+            timeout (float): Seconds to wait at most
+
+        Returns:
+            dict: The status entry, None if the batch is not tracked
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                status = self._lookup(batch_id)
+                remaining = deadline - time.monotonic()
+                if status is None or batch_id not in self._pending or \
+                        remaining <= 0:
+                    return status
+                self._condition.wait(remaining)
+
+    def close(self):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _lookup(self, batch_id):
+        if batch_id in self._pending:
+            return self._pending[batch_id][1]
+
+        entry = self._final.get(batch_id)
+        if entry is None:
+            return None
+        expires, status = entry
+        if expires < time.monotonic():
+            del self._final[batch_id]
+            return None
+        return status
+
+    def _finish(self, batch_id, status):
+        self._pending.pop(batch_id, None)
+        self._final[batch_id] = (time.monotonic() + self._cache_ttl, status)
+        self._final.move_to_end(batch_id)
+        while len(self._final) > self._cache_size:
+            self._final.popitem(last=False)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                batch_ids = list(self._pending)
+
+            for start in range(0, len(batch_ids), STATUS_CHUNK_SIZE):
+                chunk = batch_ids[start:start + STATUS_CHUNK_SIZE]
+                try:
+                    statuses = self._get_statuses(chunk)
+                except Exception as err:  # pylint: disable=broad-except
+                    LOGGER.warning('Failed to get batch statuses: %s', err)
+                    continue
+                self._update(statuses)
+
+            time.sleep(self._interval)
+
+    def _update(self, statuses):
+        now = time.monotonic()
+        with self._condition:
+            for status in statuses:
+                batch_id = status.get('id')
+                if batch_id not in self._pending:
+                    continue
+                tracked = self._pending[batch_id][0]
+                if status.get('status') in FINAL_STATUSES or \
+                        now - tracked > TRACK_TIMEOUT:
+                    self._finish(batch_id, status)
+                else:
+                    self._pending[batch_id] = (tracked, status)
+            self._condition.notify_all()
@@ -19,23 +19,36 @@ from sawtooth_sdk.protobuf import batch_pb2
 from sawtooth_sdk.protobuf import transaction_pb2
 
 from pnrdnet_addressing import addresser
+from pnrdnet_encoding import incidence
+from pnrdnet_encoding import model
 
 from pnrdnet_protobuf import payload_pb2
 
 
+def _public_key_hex(signer):
+    """Public key of a signer, without deriving it again for the
+    CachedSigners that already know it
+    """
+    public_key_hex = getattr(signer, 'public_key_hex', None)
+    if public_key_hex is None:
+        public_key_hex = signer.get_public_key().as_hex()
+    return public_key_hex
+
+
 def _make_batch(payload_bytes,
                 inputs,
                 outputs,
                 transaction_signer,
                 batch_signer):
+    batcher_public_key = _public_key_hex(batch_signer)
 
     transaction_header = transaction_pb2.TransactionHeader(
         family_name=addresser.FAMILY_NAME,
         family_version=addresser.FAMILY_VERSION,
         inputs=inputs,
         outputs=outputs,
-        signer_public_key=transaction_signer.get_public_key().as_hex(),
-        batcher_public_key=batch_signer.get_public_key().as_hex(),
+        signer_public_key=_public_key_hex(transaction_signer),
+        batcher_public_key=batcher_public_key,
         dependencies=[],
         payload_sha512=hashlib.sha512(payload_bytes).hexdigest())
     transaction_header_bytes = transaction_header.SerializeToString()
@@ -46,7 +59,7 @@ def _make_batch(payload_bytes,
         payload=payload_bytes)
 
     batch_header = batch_pb2.BatchHeader(
-        signer_public_key=batch_signer.get_public_key().as_hex(),
+        signer_public_key=batcher_public_key,
         transaction_ids=[transaction.header_signature])
     batch_header_bytes = batch_header.SerializeToString()
 
@@ -58,25 +71,17 @@ def _make_batch(payload_bytes,
     return batch
 
 
-def make_create_owner_transaction(transaction_signer,
-                                  batch_signer,
-                                  name,
-                                  timestamp):
-    """Make a CreateOwnerAction transaction and wrap it in a batch
-
-    Args:
-        transaction_signer (sawtooth_signing.Signer): The transaction key pair
-        batch_signer (sawtooth_signing.Signer): The batch key pair
-        name (str): The owner's name
-        timestamp (int): Unix UTC timestamp of when the owner is created
-
-    Returns:
-        batch_pb2.Batch: The transaction wrapped in a batch
+def _net_fields(places, transitions, incidenceMatrix, model_hash):
+    if model_hash:
+        return {'model_hash': model_hash}
+    return dict(
+        places=places,
+        transitions=transitions,
+        **incidence.encode(places, transitions, incidenceMatrix))
 
-    """
 
-    owner_address = addresser.get_owner_address(
-        transaction_signer.get_public_key().as_hex())
+def _create_owner_payload(public_key, name, timestamp):
+    owner_address = addresser.get_owner_address(public_key)
 
     inputs = [owner_address]
 
@@ -88,16 +93,194 @@ def make_create_owner_transaction(transaction_signer,
         action=payload_pb2.PnrdPayload.CREATE_OWNER,
         create_owner=action,
         timestamp=timestamp)
-    payload_bytes = payload.SerializeToString()
+
+    return payload, inputs, outputs
+
+
+def _create_record_payload(public_key,
+                           reader_id,
+                           ant_id,
+                           situation,
+                           places,
+                           transitions,
+                           incidenceMatrix,
+                           token,
+                           record_id,
+                           tag_id,
+                           timestamp,
+                           model_hash=None,
+                           token_keyframe_interval=0,
+                           validate_firing=False):
+    inputs = [
+        addresser.get_owner_address(public_key),
+        addresser.get_record_address(record_id),
+        addresser.get_history_prefix(record_id),
+        addresser.get_tag_address(tag_id)
+    ]
+
+    outputs = [
+        addresser.get_record_address(record_id),
+        addresser.get_history_prefix(record_id),
+        addresser.get_tag_address(tag_id)
+    ]
+
+    if model_hash:
+        inputs.append(addresser.get_model_address(model_hash))
+
+    action = payload_pb2.CreateRecordAction(
+        record_id=record_id,
+        reader_id=reader_id,
+        ant_id=ant_id,
+        situation=situation,
+        token=token,
+        tag_id=tag_id,
+        token_keyframe_interval=token_keyframe_interval,
+        validate_firing=validate_firing,
+        **_net_fields(places, transitions, incidenceMatrix, model_hash))
+
+    payload = payload_pb2.PnrdPayload(
+        action=payload_pb2.PnrdPayload.CREATE_RECORD,
+        create_record=action,
+        timestamp=timestamp)
+
+    return payload, inputs, outputs
+
+
+def _transfer_record_payload(public_key,
+                             receiving_owner,
+                             record_id,
+                             timestamp):
+    sending_owner_address = addresser.get_owner_address(public_key)
+    receiving_owner_address = addresser.get_owner_address(receiving_owner)
+    record_address = addresser.get_record_address(record_id)
+
+    inputs = [sending_owner_address, receiving_owner_address, record_address]
+
+    outputs = [record_address]
+
+    action = payload_pb2.TransferRecordAction(
+        record_id=record_id,
+        receiving_owner=receiving_owner)
+
+    payload = payload_pb2.PnrdPayload(
+        action=payload_pb2.PnrdPayload.TRANSFER_RECORD,
+        transfer_record=action,
+        timestamp=timestamp)
+
+    return payload, inputs, outputs
+
+
+def _update_record_payload(public_key,
+                           reader_id,
+                           ant_id,
+                           situation,
+                           places,
+                           transitions,
+                           incidenceMatrix,
+                           token,
+                           record_id,
+                           timestamp,
+                           model_hash=None):
+    owner_address = addresser.get_owner_address(public_key)
+    record_address = addresser.get_record_address(record_id)
+    history_prefix = addresser.get_history_prefix(record_id)
+
+    inputs = [owner_address, record_address, history_prefix]
+
+    outputs = [record_address, history_prefix]
+
+    if model_hash:
+        inputs.append(addresser.get_model_address(model_hash))
+
+    action = payload_pb2.UpdateRecordAction(
+        record_id=record_id,
+        reader_id=reader_id,
+        ant_id=ant_id,
+        situation=situation,
+        token=token,
+        **_net_fields(places, transitions, incidenceMatrix, model_hash))
+
+    payload = payload_pb2.PnrdPayload(
+        action=payload_pb2.PnrdPayload.UPDATE_RECORD,
+        update_record=action,
+        timestamp=timestamp)
+
+    return payload, inputs, outputs
+
+
+def _create_model_payload(public_key,
+                          places,
+                          transitions,
+                          incidenceMatrix,
+                          timestamp):
+    model_address = addresser.get_model_address(
+        model.get_model_hash(places, transitions, incidenceMatrix))
+
+    inputs = [model_address]
+
+    outputs = [model_address]
+
+    action = payload_pb2.CreateModelAction(
+        places=places,
+        transitions=transitions,
+        **incidence.encode(places, transitions, incidenceMatrix))
+
+    payload = payload_pb2.PnrdPayload(
+        action=payload_pb2.PnrdPayload.CREATE_MODEL,
+        create_model=action,
+        timestamp=timestamp)
+
+    return payload, inputs, outputs
+
+
+BATCH_OPERATIONS = {
+    'create_owner': _create_owner_payload,
+    'create_record': _create_record_payload,
+    'transfer_record': _transfer_record_payload,
+    'update_record': _update_record_payload,
+    'create_model': _create_model_payload,
+}
+
+
+def _make_payload_batch(payload_builder,
+                        transaction_signer,
+                        batch_signer,
+                        **kwargs):
+    payload, inputs, outputs = payload_builder(
+        public_key=_public_key_hex(transaction_signer), **kwargs)
 
     return _make_batch(
-        payload_bytes=payload_bytes,
+        payload_bytes=payload.SerializeToString(),
         inputs=inputs,
         outputs=outputs,
         transaction_signer=transaction_signer,
         batch_signer=batch_signer)
 
 
+def make_create_owner_transaction(transaction_signer,
+                                  batch_signer,
+                                  name,
+                                  timestamp):
+    """Make a CreateOwnerAction transaction and wrap it in a batch
+
+    Args:
+        transaction_signer (sawtooth_signing.Signer): The transaction key pair
+        batch_signer (sawtooth_signing.Signer): The batch key pair
+        name (str): The owner's name
+        timestamp (int): Unix UTC timestamp of when the owner is created
+
+    Returns:
+        batch_pb2.Batch: The transaction wrapped in a batch
+
+    """
+    return _make_payload_batch(
+        _create_owner_payload,
+        transaction_signer=transaction_signer,
+        batch_signer=batch_signer,
+        name=name,
+        timestamp=timestamp)
+
+
 def make_create_record_transaction(transaction_signer,
                                    batch_signer,
                                    reader_id,
@@ -109,28 +292,32 @@ def make_create_record_transaction(transaction_signer,
                                    token,
                                    record_id,
                                    tag_id,
-                                   timestamp):
+                                   timestamp,
+                                   model_hash=None,
+                                   token_keyframe_interval=0,
+                                   validate_firing=False):
     """Make a CreateRecordAction transaction and wrap it in a batch
 
     Args:
         transaction_signer (sawtooth_signing.Signer): The transaction key pair
         batch_signer (sawtooth_signing.Signer): The batch key pair
         ...
+        model_hash (str): Registered model to reference instead of sending
+            places, transitions and incidenceMatrix
+        token_keyframe_interval (int): Enables the delta encoding of the
+            token markings in the record history, with a full marking every
+            token_keyframe_interval entries
+        validate_firing (bool): Rejects the updates of the record whose
+            token marking is not reachable from the previous marking
+            through the net of the update
 
     Returns:
         batch_pb2.Batch: The transaction wrapped in a batch
     """
-
-    inputs = [
-        addresser.get_owner_address(
-            transaction_signer.get_public_key().as_hex()),
-        addresser.get_record_address(record_id)
-    ]
-
-    outputs = [addresser.get_record_address(record_id)]
-
-    action = payload_pb2.CreateRecordAction(
-        record_id=record_id,
+    return _make_payload_batch(
+        _create_record_payload,
+        transaction_signer=transaction_signer,
+        batch_signer=batch_signer,
         reader_id=reader_id,
         ant_id=ant_id,
         situation=situation,
@@ -138,20 +325,12 @@ def make_create_record_transaction(transaction_signer,
         transitions=transitions,
         incidenceMatrix=incidenceMatrix,
         token=token,
-        tag_id=tag_id)
-
-    payload = payload_pb2.PnrdPayload(
-        action=payload_pb2.PnrdPayload.CREATE_RECORD,
-        create_record=action,
-        timestamp=timestamp)
-    payload_bytes = payload.SerializeToString()
-
-    return _make_batch(
-        payload_bytes=payload_bytes,
-        inputs=inputs,
-        outputs=outputs,
-        transaction_signer=transaction_signer,
-        batch_signer=batch_signer)
+        record_id=record_id,
+        tag_id=tag_id,
+        timestamp=timestamp,
+        model_hash=model_hash,
+        token_keyframe_interval=token_keyframe_interval,
+        validate_firing=validate_firing)
 
 
 def make_transfer_record_transaction(transaction_signer,
@@ -171,31 +350,13 @@ def make_transfer_record_transaction(transaction_signer,
     Returns:
         batch_pb2.Batch: The transaction wrapped in a batch
     """
-    sending_owner_address = addresser.get_owner_address(
-        transaction_signer.get_public_key().as_hex())
-    receiving_owner_address = addresser.get_owner_address(receiving_owner)
-    record_address = addresser.get_record_address(record_id)
-
-    inputs = [sending_owner_address, receiving_owner_address, record_address]
-
-    outputs = [record_address]
-
-    action = payload_pb2.TransferRecordAction(
+    return _make_payload_batch(
+        _transfer_record_payload,
+        transaction_signer=transaction_signer,
+        batch_signer=batch_signer,
+        receiving_owner=receiving_owner,
         record_id=record_id,
-        receiving_owner=receiving_owner)
-
-    payload = payload_pb2.PnrdPayload(
-        action=payload_pb2.PnrdPayload.TRANSFER_RECORD,
-        transfer_record=action,
         timestamp=timestamp)
-    payload_bytes = payload.SerializeToString()
-
-    return _make_batch(
-        payload_bytes=payload_bytes,
-        inputs=inputs,
-        outputs=outputs,
-        transaction_signer=transaction_signer,
-        batch_signer=batch_signer)
 
 
 def make_update_record_transaction(transaction_signer,
@@ -208,44 +369,132 @@ def make_update_record_transaction(transaction_signer,
                                    incidenceMatrix,
                                    token,
                                    record_id,
-                                   timestamp):
+                                   timestamp,
+                                   model_hash=None):
     """Make a CreateRecordAction transaction and wrap it in a batch
 
     Args:
         transaction_signer (sawtooth_signing.Signer): The transaction key pair
         batch_signer (sawtooth_signing.Signer): The batch key pair
         timestamp (int): Unix UTC timestamp of when the record is updated
+        model_hash (str): Registered model to reference instead of sending
+            places, transitions and incidenceMatrix
 
     Returns:
         batch_pb2.Batch: The transaction wrapped in a batch
     """
-    owner_address = addresser.get_owner_address(
-        transaction_signer.get_public_key().as_hex())
-    record_address = addresser.get_record_address(record_id)
-
-    inputs = [owner_address, record_address]
-
-    outputs = [record_address]
-
-    action = payload_pb2.UpdateRecordAction(
-        record_id=record_id,
+    return _make_payload_batch(
+        _update_record_payload,
+        transaction_signer=transaction_signer,
+        batch_signer=batch_signer,
         reader_id=reader_id,
         ant_id=ant_id,
         situation=situation,
         places=places,
         transitions=transitions,
         incidenceMatrix=incidenceMatrix,
-        token=token)
+        token=token,
+        record_id=record_id,
+        timestamp=timestamp,
+        model_hash=model_hash)
+
+
+def make_create_model_transaction(transaction_signer,
+                                  batch_signer,
+                                  places,
+                                  transitions,
+                                  incidenceMatrix,
+                                  timestamp):
+    """Make a CreateModelAction transaction and wrap it in a batch
+
+    Args:
+        transaction_signer (sawtooth_signing.Signer): The transaction key pair
+        batch_signer (sawtooth_signing.Signer): The batch key pair
+        places (int): Number of places of the net
+        transitions (int): Number of transitions of the net
+        incidenceMatrix (list of int): Packed dense incidence matrix
+        timestamp (int): Unix UTC timestamp of when the model is created
+
+    Returns:
+        batch_pb2.Batch: The transaction wrapped in a batch
+    """
+    return _make_payload_batch(
+        _create_model_payload,
+        transaction_signer=transaction_signer,
+        batch_signer=batch_signer,
+        places=places,
+        transitions=transitions,
+        incidenceMatrix=incidenceMatrix,
+        timestamp=timestamp)
+
+
+def make_operation_transaction(transaction_signer,
+                               batch_signer,
+                               operation,
+                               timestamp):
+    """Make the transaction of a single operation and wrap it in a batch
+
+    Args:
+        transaction_signer (sawtooth_signing.Signer): The transaction key pair
+        batch_signer (sawtooth_signing.Signer): The batch key pair
+        operation (dict): The operation, see make_batch_transaction
+        timestamp (int): Unix UTC timestamp of the operation
+
+    Returns:
+        batch_pb2.Batch: The transaction wrapped in a batch
+    """
+    kwargs = dict(operation)
+    return _make_payload_batch(
+        BATCH_OPERATIONS[kwargs.pop('action')],
+        transaction_signer,
+        batch_signer,
+        timestamp=timestamp,
+        **kwargs)
+
+
+def make_batch_transaction(transaction_signer,
+                           batch_signer,
+                           operations,
+                           timestamp):
+    """Make a BatchAction transaction running several operations of the same
+    signer in order, and wrap it in a batch. The transaction is signed and
+    scheduled once and its inputs and outputs are the union of those of the
+    operations.
+
+    Args:
+        transaction_signer (sawtooth_signing.Signer): The transaction key pair
+        batch_signer (sawtooth_signing.Signer): The batch key pair
+        operations (list of dict): Each one has an 'action' key, one of
+            BATCH_OPERATIONS, and the arguments of the matching make_*
+            function without the signers and timestamp
+        timestamp (int): Unix UTC timestamp of the operations
+
+    Returns:
+        batch_pb2.Batch: The transaction wrapped in a batch
+    """
+    public_key = _public_key_hex(transaction_signer)
+
+    # Ordered unions, without repeating the addresses shared by operations
+    inputs = {}
+    outputs = {}
+    action = payload_pb2.BatchAction()
+    for operation in operations:
+        kwargs = dict(operation)
+        payload_builder = BATCH_OPERATIONS[kwargs.pop('action')]
+        payload, operation_inputs, operation_outputs = payload_builder(
+            public_key=public_key, timestamp=timestamp, **kwargs)
+        action.operations.extend([payload])
+        inputs.update(dict.fromkeys(operation_inputs))
+        outputs.update(dict.fromkeys(operation_outputs))
 
     payload = payload_pb2.PnrdPayload(
-        action=payload_pb2.PnrdPayload.UPDATE_RECORD,
-        update_record=action,
+        action=payload_pb2.PnrdPayload.BATCH,
+        batch=action,
         timestamp=timestamp)
-    payload_bytes = payload.SerializeToString()
 
     return _make_batch(
-        payload_bytes=payload_bytes,
-        inputs=inputs,
-        outputs=outputs,
+        payload_bytes=payload.SerializeToString(),
+        inputs=list(inputs),
+        outputs=list(outputs),
         transaction_signer=transaction_signer,
         batch_signer=batch_signer)
@@ -0,0 +1,24 @@
+from flask import Blueprint, request
+from pnrdnet_api.dispatcher.Dispatcher import get_dispatcher
+from pnrdnet_api.utils.responses import response_with
+from pnrdnet_api.utils import payloads
+from pnrdnet_api.utils import responses as resp
+
+
+batch_routes = Blueprint("batch_routes", __name__)
+
+
+@batch_routes.route("/<batch_id>", methods=["GET"])
+def get_batch_status(batch_id):
+    try:
+        wait = payloads.batch_wait(request.args)
+        dispatch = get_dispatcher()
+
+        status = dispatch.get_batch_status(batch_id, wait=wait)
+        return response_with(
+            resp.SUCCESS_200,
+            value=payloads.batch_status_value(batch_id, status)
+        )
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
@@ -1,8 +1,7 @@
 from flask import Blueprint, request
-from pnrdnet_addressing.addresser import NAMESPACE
-from pnrdnet_api.dispatcher.Dispatcher import Dispatcher
-from pnrdnet_api.utils.functions import generate_auth_token, validate_fields
+from pnrdnet_api.dispatcher.Dispatcher import get_dispatcher
 from pnrdnet_api.utils.responses import response_with
+from pnrdnet_api.utils import payloads
 from pnrdnet_api.utils import responses as resp
 
 
@@ -12,11 +11,7 @@ core_routes = Blueprint("core_routes", __name__)
 @core_routes.route("/login", methods=["POST"])
 def authenticate():
     try:
-        data = request.get_json()
-        required_fields = ['public_key', 'secret_key']
-        validate_fields(required_fields, data)
-        token = generate_auth_token(
-            data.get['secret_key'], data.get('public_key'))
+        token = payloads.auth_token(request.get_json())
         return response_with(
             resp.SUCCESS_201,
             value={'authorization': token})
@@ -27,12 +22,35 @@ def authenticate():
 @core_routes.route("/network", methods=["GET"])
 def get_owner_details():
     try:
-        print(NAMESPACE)
-        dispatch = Dispatcher()
-        net_data, net_address = dispatch.get_network_data()
+        page = payloads.network_page(request.args)
+        dispatch = get_dispatcher()
+        if page is None:
+            net_data, net_address = dispatch.get_network_data()
+            return response_with(
+                resp.SUCCESS_201,
+                value=payloads.state_value(net_data, net_address)
+            )
+
+        start, limit = page
+        net_data, net_address, next_start = dispatch.get_network_page(
+            start=start, limit=limit)
         return response_with(
             resp.SUCCESS_201,
-            value={'address': net_address, 'data': net_data}
+            value=payloads.state_value(net_data, net_address),
+            pagination=payloads.network_pagination(start, limit, next_start)
+        )
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
+
+
+@core_routes.route("/cache", methods=["GET"])
+def get_cache_stats():
+    try:
+        dispatch = get_dispatcher()
+        return response_with(
+            resp.SUCCESS_200,
+            value={'data': dispatch.get_cache_stats()}
         )
     except Exception as e:
         print(e)
@@ -1,8 +1,8 @@
 from flask import Blueprint, request
-from pnrdnet_api.config import AES_KEY, APP_SECRET_KEY
-from pnrdnet_api.dispatcher.Dispatcher import Dispatcher
-from pnrdnet_api.utils.functions import encrypt_private_key, generate_auth_token, get_time, hash_password, validate_fields
+from pnrdnet_api.dispatcher.Dispatcher import get_dispatcher
+from pnrdnet_api.utils.functions import get_time, validate_fields
 from pnrdnet_api.utils.responses import response_with
+from pnrdnet_api.utils import payloads
 from pnrdnet_api.utils import responses as resp
 
 
@@ -15,7 +15,7 @@ def create_owner():
         data = request.get_json()
         required_fields = ['name']
         validate_fields(required_fields, data)
-        dispatch = Dispatcher()
+        dispatch = get_dispatcher()
         public_key, private_key = dispatch.get_new_key_pair()
 
         result, status = dispatch.send_create_owner_transaction(
@@ -23,15 +23,9 @@ def create_owner():
             name=data.get('name'),
             timestamp=get_time())
 
-        encrypted_private_key = encrypt_private_key(
-            AES_KEY, public_key, private_key)
-
-        token = generate_auth_token(encrypted_private_key, public_key)
         return response_with(
             resp.SUCCESS_201,
-            value={'public_key': public_key,
-                   'private_key': private_key,
-                   "statusBlockchain": status}
+            value=payloads.new_owner_value(public_key, private_key, status)
         )
     except Exception as e:
         print(e)
@@ -44,14 +38,14 @@ def get_owner_details():
         data = request.get_json()
         required_fields = ['public_key']
         validate_fields(required_fields, data)
-        dispatch = Dispatcher()
+        dispatch = get_dispatcher()
 
         owner_data, owner_address = dispatch.get_owner_data(
             public_key=data.get('public_key'))
 
         return response_with(
             resp.SUCCESS_201,
-            value={'address': owner_address, 'data': owner_data}
+            value=payloads.state_value(owner_data, owner_address)
         )
     except Exception as e:
         print(e)
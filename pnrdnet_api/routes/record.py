@@ -1,53 +1,37 @@
-from flask import Blueprint, request
-from pnrdnet_api.config import AES_KEY, APP_SECRET_KEY
-from pnrdnet_api.dispatcher.Dispatcher import Dispatcher
-from pnrdnet_api.utils.functions import get_time, validate_fields
+from flask import Blueprint, current_app, request, stream_with_context
+from pnrdnet_api.dispatcher.Dispatcher import get_dispatcher
+from pnrdnet_api.utils.functions import validate_fields
 from pnrdnet_api.utils.responses import response_with
+from pnrdnet_api.utils.responses import stream_with
+from pnrdnet_api.utils import payloads
 from pnrdnet_api.utils import responses as resp
-from google.protobuf.json_format import MessageToJson
 
 
 record_routes = Blueprint("record_routes", __name__)
 
 
+def _record_response(record_data, record_address):
+    value, pagination = payloads.record_value(record_data, record_address)
+    return response_with(resp.SUCCESS_201, value=value, pagination=pagination)
+
+
+def _search_response(results, limit, offset):
+    value, pagination = payloads.search_value(results, limit, offset)
+    return response_with(resp.SUCCESS_200, value=value, pagination=pagination)
+
+
 @record_routes.route("/create", methods=["POST"])
 def create_record():
     try:
         data = request.get_json()
-        required_fields = [
-            'private_key',
-            'record_id',
-            'reader_id',
-            'ant_id',
-            'situation',
-            'places',
-            'transitions',
-            'incidenceMatrix',
-            'token',
-            'tag_id'
-        ]
-        validate_fields(required_fields, data)
-        dispatch = Dispatcher()
+        args = payloads.record_args(data, 'create_record')
+        wait = payloads.get_wait(data, current_app.config)
+        dispatch = get_dispatcher()
 
         result, status = dispatch.send_create_record_transaction(
-            private_key=data['private_key'],
-            record_id=data['record_id'],
-            reader_id=data['reader_id'],
-            ant_id=data['ant_id'],
-            situation=data['situation'],
-            places=data['places'],
-            transitions=data['transitions'],
-            incidenceMatrix=data['incidenceMatrix'],
-            token=data['token'],
-            tag_id=data['tag_id'],
-            timestamp=get_time())
-
+            wait=wait, **args)
         return response_with(
-            resp.SUCCESS_201,
-            value={
-                'data': f'Create record transaction {status}',
-                'statusBlockchain': status}
-        )
+            *payloads.submitted('record', result, status, wait))
     except Exception as e:
         print(e)
         return response_with(resp.INVALID_INPUT_422)
@@ -59,33 +43,31 @@ def get_record_details():
         data = request.get_json()
         required_fields = ['record_id']
         validate_fields(required_fields, data)
-        dispatch = Dispatcher()
+        dispatch = get_dispatcher()
 
         record_data, record_address = dispatch.get_record_data(
-            record_id=data.get('record_id'))
-        record = record_data[0][0]
-        record_decoded = {
-            'tag_id': record['tag_id'],
-            'record_id': record['record_id'],
-            'owners': record['owners'],
-            'history': list()
-        }
-        for history in record['history']:
-            record_decoded['history'].append(
-                {
-                    'reader_id': history['reader_id'],
-                    'ant_id': history['ant_id'],
-                    'situation': history['situation'],
-                    'places': history['places'],
-                    'transitions': history['transitions'],
-                    'incidenceMatrix': list(history['incidenceMatrix']),
-                    'token': list(history['token']),
-                }
-            )
-        return response_with(
-            resp.SUCCESS_201,
-            value={'address': record_address, 'data': record_decoded}
-        )
+            record_id=data.get('record_id'),
+            window=payloads.history_window(data))
+        return _record_response(record_data, record_address)
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
+
+
+@record_routes.route("/by-tag", methods=["POST"])
+def get_record_by_tag():
+    try:
+        data = request.get_json()
+        required_fields = ['tag_id']
+        validate_fields(required_fields, data)
+        dispatch = get_dispatcher()
+
+        result = dispatch.get_record_by_tag(
+            tag_id=data.get('tag_id'), window=payloads.history_window(data))
+        if result is None:
+            return response_with(resp.SERVER_ERROR_404)
+        record_data, record_address = result
+        return _record_response(record_data, record_address)
     except Exception as e:
         print(e)
         return response_with(resp.INVALID_INPUT_422)
@@ -95,22 +77,14 @@ def get_record_details():
 def transfer_record():
     try:
         data = request.get_json()
-        required_fields = ['receiving_owner_pubkey',
-                           'record_id', 'private_key']
-        validate_fields(required_fields, data)
-        dispatch = Dispatcher()
+        args = payloads.record_args(data, 'transfer_record')
+        wait = payloads.get_wait(data, current_app.config)
+        dispatch = get_dispatcher()
 
         result, status = dispatch.send_transfer_record_transaction(
-            private_key=data['private_key'],
-            receiving_owner=data['receiving_owner_pubkey'],
-            record_id=data['record_id'],
-            timestamp=get_time())
+            wait=wait, **args)
         return response_with(
-            resp.SUCCESS_201,
-            value={
-                'data': f'Create transfer transaction {status}',
-                'statusBlockchain': status}
-        )
+            *payloads.submitted('transfer', result, status, wait))
     except Exception as e:
         print(e)
         return response_with(resp.INVALID_INPUT_422)
@@ -120,37 +94,91 @@ def transfer_record():
 def update_record():
     try:
         data = request.get_json()
-        required_fields = required_fields = [
-            'private_key',
-            'record_id',
-            'reader_id',
-            'ant_id',
-            'situation',
-            'places',
-            'transitions',
-            'incidenceMatrix',
-            'token',
-        ]
-        validate_fields(required_fields, data)
-        dispatch = Dispatcher()
+        args = payloads.record_args(data, 'update_record')
+        wait = payloads.get_wait(data, current_app.config)
+        dispatch = get_dispatcher()
 
         result, status = dispatch.send_update_record_transaction(
-            private_key=data['private_key'],
-            record_id=data['record_id'],
-            reader_id=data['reader_id'],
-            ant_id=data['ant_id'],
-            situation=data['situation'],
-            places=data['places'],
-            transitions=data['transitions'],
-            incidenceMatrix=data['incidenceMatrix'],
-            token=data['token'],
-            timestamp=get_time())
+            wait=wait, **args)
+        return response_with(
+            *payloads.submitted('update', result, status, wait))
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
+
+
+@record_routes.route("/batch", methods=["POST"])
+def batch_records():
+    try:
+        data = request.get_json()
+        args = payloads.batch_args(data)
+        wait = payloads.get_wait(data, current_app.config)
+        dispatch = get_dispatcher()
+
+        result, status = dispatch.send_batch_transaction(wait=wait, **args)
         return response_with(
-            resp.SUCCESS_201,
-            value={
-                'data': f'Create update transaction {status}',
-                'statusBlockchain': status}
-        )
+            *payloads.submitted('batch', result, status, wait))
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
+
+
+def _bulk_items(lines):
+    """Yields the operations of a /bulk request as its lines are read, or
+    the error of the lines that are not valid operations
+    """
+    for line in lines:
+        item = payloads.bulk_item(line)
+        if item is not None:
+            yield item
+
+
+@record_routes.route("/bulk", methods=["POST"])
+def bulk_records():
+    """Takes one operation per line, as for /batch plus the private_key,
+    and streams back one result per operation, in the same order
+    """
+    try:
+        wait = request.args.get('wait', 0, type=float)
+        dispatch = get_dispatcher()
+
+        results = dispatch.send_bulk_transactions(
+            _bulk_items(request.stream), wait=wait)
+        return stream_with(
+            resp.SUCCESS_200,
+            stream_with_context(
+                payloads.bulk_result(index, result)
+                for index, result in enumerate(results)))
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
+
+
+@record_routes.route("/search", methods=["GET"])
+def search_records():
+    try:
+        limit, offset = payloads.search_page(request.args)
+        dispatch = get_dispatcher()
+
+        results = dispatch.search_records(
+            limit=limit + 1, offset=offset,
+            **payloads.record_filters(request.args))
+        return _search_response(results, limit, offset)
+    except Exception as e:
+        print(e)
+        return response_with(resp.INVALID_INPUT_422)
+
+
+@record_routes.route("/search/history", methods=["GET"])
+def search_history():
+    try:
+        limit, offset = payloads.search_page(request.args)
+        dispatch = get_dispatcher()
+
+        results = dispatch.search_history(
+            limit=limit + 1, offset=offset,
+            **payloads.history_filters(request.args))
+        return _search_response(results, limit, offset)
     except Exception as e:
         print(e)
         return response_with(resp.INVALID_INPUT_422)
@@ -0,0 +1,34 @@
+from quart import Response, jsonify
+
+from pnrdnet_api.utils.responses import build_response
+
+
+def response_with(
+    response, value=None, message=None, error=None, headers=None, pagination=None
+):
+    """
+    Cria as respostas de retorno da API ASGI, iguais as de response_with
+        response:
+            (quart.Response, int, dict)
+    """
+
+    result, headers = build_response(
+        response, value, message, error, dict(headers or {}), pagination)
+
+    return jsonify(result), response["http_code"], headers
+
+
+def stream_with(response, lines, mimetype="application/x-ndjson"):
+    """
+    Cria as respostas ASGI enviadas em partes, iguais as de stream_with
+        lines:
+            async iterable de str
+        response:
+            quart.Response
+    """
+
+    _, headers = build_response(response, headers={})
+
+    return Response(
+        lines, status=response["http_code"], mimetype=mimetype,
+        headers=headers)
@@ -0,0 +1,316 @@
+"""Request parsing and response shaping shared by the Flask routes and
+their ASGI counterparts, so both APIs take and answer the same fields.
+The route layers only read the request, await or call the dispatcher and
+pass the shaped values to their own response_with.
+"""
+
+import json
+
+from pnrdnet_api.decoding import HistoryWindow
+from pnrdnet_api.decoding import iter_markings
+from pnrdnet_api.dispatcher.Dispatcher import STATE_PAGE_SIZE
+from pnrdnet_api.utils.functions import generate_auth_token
+from pnrdnet_api.utils.functions import get_time
+from pnrdnet_api.utils.functions import validate_fields
+from pnrdnet_api.utils import responses as resp
+from pnrdnet_indexer.database import DEFAULT_LIMIT
+from pnrdnet_indexer.database import MAX_LIMIT
+from pnrdnet_encoding.model import get_model_hash
+
+
+# Longest long-poll a client can ask for, in seconds
+MAX_WAIT = 30
+
+HISTORY_WINDOW_FIELDS = ['offset', 'limit', 'last', 'since', 'until']
+
+
+def auth_token(data):
+    """Reads a /core/login request and returns its token"""
+    validate_fields(['public_key', 'secret_key'], data)
+    return generate_auth_token(data['secret_key'], data['public_key'])
+
+
+def network_page(args):
+    """Reads the page of a /core/network request
+
+    Returns:
+        (str, int): The start and limit of the page, None for the whole
+            network
+    """
+    limit = args.get('limit', type=int)
+    if limit is None:
+        return None
+    if not 0 < limit <= STATE_PAGE_SIZE:
+        raise ValueError('limit must be between 1 and {}'.format(
+            STATE_PAGE_SIZE))
+    return args.get('start'), limit
+
+
+def network_pagination(start, limit, next_start):
+    return {'start': start, 'limit': limit, 'next': next_start}
+
+
+def new_owner_value(public_key, private_key, status):
+    return {'public_key': public_key,
+            'private_key': private_key,
+            'statusBlockchain': status}
+
+
+def state_value(data, address):
+    """The answer of the network, owner and model reads"""
+    return {'address': address, 'data': data}
+
+
+def get_wait(data, config):
+    """Seconds a submission waits for its batch, 0 to answer 202 at once"""
+    if data.get('wait', config.get('SUBMIT_WAIT', True)):
+        return 1
+    return 0
+
+
+def batch_wait(args):
+    """Seconds a /batch/<id> request long-polls for"""
+    return min(float(args.get('wait', 0)), MAX_WAIT)
+
+
+def batch_operation(operation):
+    """Maps an operation of a /batch request to the arguments of
+    make_batch_transaction
+    """
+    action = operation.get('action')
+    if action == 'create_record':
+        required_fields = [
+            'record_id', 'reader_id', 'ant_id', 'situation', 'token', 'tag_id']
+    elif action == 'update_record':
+        required_fields = [
+            'record_id', 'reader_id', 'ant_id', 'situation', 'token']
+    elif action == 'transfer_record':
+        validate_fields(['receiving_owner_pubkey', 'record_id'], operation)
+        return {
+            'action': action,
+            'receiving_owner': operation['receiving_owner_pubkey'],
+            'record_id': operation['record_id']}
+    else:
+        raise ValueError(f'Unsupported batch action {action}')
+
+    if operation.get('model_hash') is None:
+        required_fields += ['places', 'transitions', 'incidenceMatrix']
+    validate_fields(required_fields, operation)
+
+    fields = {
+        'action': action,
+        'record_id': operation['record_id'],
+        'reader_id': operation['reader_id'],
+        'ant_id': operation['ant_id'],
+        'situation': operation['situation'],
+        'places': operation.get('places', 0),
+        'transitions': operation.get('transitions', 0),
+        'incidenceMatrix': operation.get('incidenceMatrix', []),
+        'token': operation['token'],
+        'model_hash': operation.get('model_hash')}
+    if action == 'create_record':
+        fields['tag_id'] = operation['tag_id']
+        fields['token_keyframe_interval'] = \
+            operation.get('token_keyframe_interval', 0)
+        fields['validate_firing'] = operation.get('validate_firing', False)
+    return fields
+
+
+def record_args(data, action):
+    """Reads a /record/create, /record/update or /record/transfer request
+    as the arguments of the matching send_*_transaction of the dispatchers
+
+    Args:
+        data (dict): The request body
+        action (str): create_record, update_record or transfer_record
+    """
+    validate_fields(['private_key'], data)
+    args = batch_operation(dict(data, action=action))
+    del args['action']
+    args['private_key'] = data['private_key']
+    args['timestamp'] = get_time()
+    return args
+
+
+def batch_args(data):
+    """Reads a /record/batch request as the arguments of
+    send_batch_transaction
+    """
+    validate_fields(['private_key', 'operations'], data)
+    operations = [batch_operation(operation)
+                  for operation in data['operations']]
+    if not operations:
+        raise ValueError('No operations provided')
+    return {'private_key': data['private_key'],
+            'operations': operations,
+            'timestamp': get_time()}
+
+
+def model_args(data):
+    """Reads a /model/create request as the arguments of
+    send_create_model_transaction
+    """
+    validate_fields(
+        ['private_key', 'places', 'transitions', 'incidenceMatrix'], data)
+    return {'private_key': data['private_key'],
+            'places': data['places'],
+            'transitions': data['transitions'],
+            'incidenceMatrix': data['incidenceMatrix'],
+            'timestamp': get_time()}
+
+
+def model_created_value(args, status):
+    return {
+        'data': f'Create model transaction {status}',
+        'model_hash': get_model_hash(
+            args['places'], args['transitions'], args['incidenceMatrix']),
+        'statusBlockchain': status}
+
+
+def submitted(transaction, result, status, wait):
+    """Shapes the answer of a record submission
+
+    Args:
+        transaction (str): What was submitted, as in "Create record
+            transaction COMMITTED"
+        result: The batch id when the submission did not wait
+        status (str): The status of the batch
+        wait (int): The wait of the submission
+
+    Returns:
+        (dict, dict): The response and its value
+    """
+    if not wait:
+        return resp.SUCCESS_202, {
+            'batch_id': result,
+            'statusBlockchain': 'PENDING',
+            'link': f'/batch/{result}'}
+    return resp.SUCCESS_201, {
+        'data': f'Create {transaction} transaction {status}',
+        'statusBlockchain': status}
+
+
+def batch_status_value(batch_id, status):
+    return {
+        'batch_id': batch_id,
+        'statusBlockchain': status['status'],
+        'invalid_transactions': status.get('invalid_transactions', [])}
+
+
+def history_window(data):
+    """Reads the history window of a record read, None for the whole
+    history
+    """
+    if all(data.get(field) is None for field in HISTORY_WINDOW_FIELDS):
+        return None
+    return HistoryWindow(**{
+        field: int(data[field])
+        for field in HISTORY_WINDOW_FIELDS if data.get(field) is not None})
+
+
+def record_value(record_data, record_address):
+    """Shapes a record read
+
+    Returns:
+        (dict, dict): The value and the pagination of its history
+    """
+    record = record_data[0][0]
+    record_decoded = {
+        'tag_id': record['tag_id'],
+        'record_id': record['record_id'],
+        'owners': record['owners'],
+        'history': list()
+    }
+    for history in iter_markings(record['history']):
+        record_decoded['history'].append(
+            {
+                'reader_id': history['reader_id'],
+                'ant_id': history['ant_id'],
+                'situation': history['situation'],
+                'places': history['places'],
+                'transitions': history['transitions'],
+                'incidenceMatrix': history['incidenceMatrix'],
+                'token': history['token'],
+            }
+        )
+    return ({'address': record_address, 'data': record_decoded},
+            record.get('history_pagination'))
+
+
+def search_page(args):
+    """Reads the limit and offset query arguments of a search"""
+    limit = args.get('limit', DEFAULT_LIMIT, type=int)
+    offset = args.get('offset', 0, type=int)
+    if not 0 < limit <= MAX_LIMIT or offset < 0:
+        raise ValueError('limit must be between 1 and {}'.format(MAX_LIMIT))
+    return limit, offset
+
+
+def record_filters(args):
+    """Reads the filters of a /record/search request"""
+    return {'owner_id': args.get('owner'),
+            'tag_id': args.get('tag_id'),
+            'situation': args.get('situation')}
+
+
+def history_filters(args):
+    """Reads the filters of a /record/search/history request"""
+    return {'record_id': args.get('record_id'),
+            'reader_id': args.get('reader_id'),
+            'ant_id': args.get('ant_id'),
+            'situation': args.get('situation'),
+            'since': args.get('since', type=int),
+            'until': args.get('until', type=int)}
+
+
+def search_value(results, limit, offset):
+    """Shapes a search fetched with limit + 1 results
+
+    Returns:
+        (dict, dict): The value and its pagination
+    """
+    next_offset = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_offset = offset + limit
+    return ({'data': results},
+            {'limit': limit, 'offset': offset, 'next': next_offset})
+
+
+def bulk_operation(line):
+    """Reads one line of a /bulk request"""
+    data = json.loads(line)
+    validate_fields(['private_key'], data)
+    return data['private_key'], batch_operation(data), get_time()
+
+
+def bulk_item(line):
+    """Reads one line of a /bulk request, None for a blank line and the
+    error of a line that is not a valid operation
+    """
+    if not line.strip():
+        return None
+    try:
+        return bulk_operation(line)
+    except Exception as e:
+        return e
+
+
+def bulk_result(index, result):
+    """Formats the result of an operation as a line of the response"""
+    if result['status'] == 'INVALID_INPUT':
+        return json.dumps({
+            'index': index,
+            'status': resp.INVALID_INPUT_422['status'],
+            'message': resp.INVALID_INPUT_422['message']}) + '\n'
+    if result['status'] == 'REJECTED':
+        return json.dumps({
+            'index': index,
+            'batch_id': result['batch_id'],
+            'status': resp.BAD_REQUEST_400['status'],
+            'message': result['error']}) + '\n'
+    return json.dumps({
+        'index': index,
+        'batch_id': result['batch_id'],
+        'statusBlockchain': result['status'],
+        'link': f"/batch/{result['batch_id']}"}) + '\n'
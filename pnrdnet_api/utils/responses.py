@@ -1,4 +1,4 @@
-from flask import make_response, jsonify
+from flask import Response, make_response, jsonify
 
 INVALID_FIELD_NAME_SENT_422 = {
     "http_code": 422,
@@ -47,19 +47,18 @@ UNAUTHORIZED_403 = {
 }
 SUCCESS_200 = {"http_code": 200, "status": "success"}
 SUCCESS_201 = {"http_code": 201, "status": "success"}
+SUCCESS_202 = {"http_code": 202, "status": "accepted"}
 SUCCESS_204 = {"http_code": 204, "status": "success"}
 
 
-def response_with(
+def build_response(
     response, value=None, message=None, error=None, headers={}, pagination=None
 ):
     """
-    Cria as respostas de retorno da API
-        request:
-            any
+    Monta o corpo e os headers das respostas da API, sem depender do
+    framework
         response:
-            status: String
-            any
+            (dict, dict): corpo e headers
     """
 
     result = {}
@@ -80,4 +79,39 @@ def response_with(
     headers.update({"Access-Control-Allow-Origin": "*"})
     headers.update({"server": "PNRD NET"})
 
+    return result, headers
+
+
+def response_with(
+    response, value=None, message=None, error=None, headers={}, pagination=None
+):
+    """
+    Cria as respostas de retorno da API
+        request:
+            any
+        response:
+            status: String
+            any
+    """
+
+    result, headers = build_response(
+        response, value, message, error, headers, pagination)
+
     return make_response(jsonify(result), response["http_code"], headers)
+
+
+def stream_with(response, lines, mimetype="application/x-ndjson"):
+    """
+    Cria as respostas enviadas em partes, a medida que as linhas sao
+    produzidas, com os headers de response_with
+        lines:
+            iterable de str
+        response:
+            flask.Response
+    """
+
+    _, headers = build_response(response, headers={})
+
+    return Response(
+        lines, status=response["http_code"], mimetype=mimetype,
+        headers=headers)
@@ -0,0 +1,120 @@
+"""Dense and sparse (CSR) encodings of the Petri net incidence matrix
+
+The dense encoding is the incidenceMatrix field, places x transitions values
+packed row by row. The sparse encoding is the incidenceRowPtr,
+incidenceColIdx and incidenceValues fields.
+"""
+
+
+def to_sparse(places, transitions, incidence_matrix):
+    """Converts a packed dense incidence matrix to CSR
+
+    Args:
+        places (int): Number of places (rows)
+        transitions (int): Number of transitions (columns)
+        incidence_matrix (list of int): Packed dense matrix
+
+    Returns:
+        tuple: row_ptr, col_idx and values lists
+    """
+    row_ptr = [0]
+    col_idx = []
+    values = []
+    for place in range(places):
+        row = incidence_matrix[place * transitions:(place + 1) * transitions]
+        for transition, value in enumerate(row):
+            if value:
+                col_idx.append(transition)
+                values.append(value)
+        row_ptr.append(len(values))
+    return row_ptr, col_idx, values
+
+
+def to_dense(places, transitions, row_ptr, col_idx, values):
+    """Converts a CSR incidence matrix to its packed dense form
+
+    Args:
+        places (int): Number of places (rows)
+        transitions (int): Number of transitions (columns)
+        row_ptr (list of int): Index of the first value of every row, plus
+            the number of values
+        col_idx (list of int): Column of every value
+        values (list of int): Non-zero values
+
+    Returns:
+        list of int: Packed dense matrix
+    """
+    dense = [0] * (places * transitions)
+    for place in range(places):
+        offset = place * transitions
+        for k in range(row_ptr[place], row_ptr[place + 1]):
+            dense[offset + col_idx[k]] = values[k]
+    return dense
+
+
+def is_valid_sparse(places, transitions, row_ptr, col_idx, values):
+    """Checks that CSR arrays describe a places x transitions matrix"""
+    if len(row_ptr) != places + 1 or row_ptr[0] != 0:
+        return False
+    if len(col_idx) != len(values) or row_ptr[-1] != len(values):
+        return False
+    if any(row_ptr[p] > row_ptr[p + 1] for p in range(places)):
+        return False
+    if not all(c < transitions for c in col_idx):
+        return False
+    # A repeated column would make to_dense keep only one of its values
+    return all(
+        len(set(col_idx[row_ptr[p]:row_ptr[p + 1]])) ==
+        row_ptr[p + 1] - row_ptr[p]
+        for p in range(places))
+
+
+def is_sparse(message):
+    """Whether a message carrying an incidence matrix uses the CSR fields"""
+    return len(message.incidenceRowPtr) > 0
+
+
+def get_dense(message):
+    """Returns the packed dense incidence matrix of a message, whichever
+    encoding it carries
+
+    Args:
+        message: CreateRecordAction, UpdateRecordAction or Record.History
+
+    Returns:
+        list of int: Packed dense matrix
+    """
+    if not is_sparse(message):
+        return list(message.incidenceMatrix)
+    return to_dense(
+        message.places,
+        message.transitions,
+        message.incidenceRowPtr,
+        message.incidenceColIdx,
+        message.incidenceValues)
+
+
+def encode(places, transitions, incidence_matrix):
+    """Picks the smaller encoding for a packed dense incidence matrix
+
+    Args:
+        places (int): Number of places (rows)
+        transitions (int): Number of transitions (columns)
+        incidence_matrix (list of int): Packed dense matrix
+
+    Returns:
+        dict: The message fields holding the matrix
+    """
+    if len(incidence_matrix) != places * transitions:
+        return {'incidenceMatrix': incidence_matrix}
+
+    row_ptr, col_idx, values = to_sparse(
+        places, transitions, incidence_matrix)
+    if len(row_ptr) + 2 * len(values) >= len(incidence_matrix):
+        return {'incidenceMatrix': incidence_matrix}
+
+    return {
+        'incidenceRowPtr': row_ptr,
+        'incidenceColIdx': col_idx,
+        'incidenceValues': values,
+    }
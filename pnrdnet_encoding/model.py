@@ -0,0 +1,25 @@
+import hashlib
+
+
+def get_model_hash(places, transitions, incidence_matrix):
+    """Computes the content hash that identifies a net model. It only
+    depends on the net itself, so the dense and sparse forms of a matrix
+    give the same hash.
+
+    Args:
+        places (int): Number of places of the net
+        transitions (int): Number of transitions of the net
+        incidence_matrix (list of int): Packed dense incidence matrix
+
+    Returns:
+        str: Hex encoded SHA-512 of the model
+    """
+    content = '{}:{}:{}'.format(
+        places, transitions, ','.join(str(v) for v in incidence_matrix))
+    return hashlib.sha512(content.encode('utf-8')).hexdigest()
+
+
+def is_model_hash(model_hash):
+    """Whether a string has the shape of a model hash"""
+    return len(model_hash) == 128 and \
+        all(c in '0123456789abcdef' for c in model_hash)
@@ -0,0 +1,329 @@
+"""SQLite index of the owners, records and history of the pnrd_net state
+
+State addresses are hashes of the owner public key or the record id, so the
+ledger can only be read by exact key. The indexer keeps a copy of the
+decoded state in an SQLite database, indexed by the fields searched on, and
+the API answers /record/search from it.
+
+A history row is identified by its page and its position in the page.
+Records created before history paging keep their history inline in the
+record, as page 0.
+"""
+
+import sqlite3
+import threading
+
+from pnrdnet_addressing.addresser import AddressSpace
+from pnrdnet_addressing.addresser import get_address_type
+from pnrdnet_api.decoding import deserialize_data
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS owners (
+    address TEXT PRIMARY KEY,
+    public_key TEXT NOT NULL,
+    name TEXT,
+    timestamp INTEGER
+);
+CREATE TABLE IF NOT EXISTS records (
+    address TEXT PRIMARY KEY,
+    record_id TEXT NOT NULL UNIQUE,
+    tag_id TEXT,
+    owner_id TEXT,
+    owner_timestamp INTEGER,
+    situation TEXT,
+    history_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS record_owners (
+    record_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    owner_id TEXT NOT NULL,
+    timestamp INTEGER,
+    PRIMARY KEY (record_id, position)
+);
+CREATE TABLE IF NOT EXISTS history (
+    record_id TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    address TEXT NOT NULL,
+    reader_id TEXT,
+    ant_id TEXT,
+    situation TEXT,
+    timestamp INTEGER,
+    model_hash TEXT,
+    PRIMARY KEY (record_id, page, position)
+);
+CREATE INDEX IF NOT EXISTS owners_name ON owners (name);
+CREATE INDEX IF NOT EXISTS records_tag_id ON records (tag_id);
+CREATE INDEX IF NOT EXISTS records_owner_id ON records (owner_id);
+CREATE INDEX IF NOT EXISTS records_situation ON records (situation);
+CREATE INDEX IF NOT EXISTS record_owners_owner_id
+    ON record_owners (owner_id);
+CREATE INDEX IF NOT EXISTS history_address ON history (address);
+CREATE INDEX IF NOT EXISTS history_reader_id
+    ON history (reader_id, timestamp);
+CREATE INDEX IF NOT EXISTS history_ant_id ON history (ant_id, timestamp);
+CREATE INDEX IF NOT EXISTS history_situation
+    ON history (situation, timestamp);
+CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp);
+'''
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# Records and history pages are written after owners, and history pages
+# after their record, whatever the order of the changes in a block
+_TYPE_ORDER = {
+    AddressSpace.OWNER: 0,
+    AddressSpace.RECORD: 1,
+    AddressSpace.HISTORY: 2,
+}
+
+
+class IndexDatabase(object):
+    """Connections to the index, one per thread"""
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path of the SQLite database, created if missing
+        """
+        self._path = path
+        self._local = threading.local()
+        connection = self.connection()
+        connection.executescript(SCHEMA)
+        connection.commit()
+
+    def connection(self):
+        """Returns the connection of the calling thread"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            # Readers are not blocked by the indexer while it writes
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def get_meta(self, key):
+        row = self.connection().execute(
+            'SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row is not None else None
+
+    def apply_changes(self, changes, block_id=None):
+        """Writes the state changes of a block, or of a backfill, in a
+        single transaction
+
+        Args:
+            changes (iterable of tuple): The address and the serialized
+                container of each change, None as data for a deletion
+            block_id (str): Block the changes bring the index to, kept to
+                resume the event subscription from it
+        """
+        changes = sorted(
+            ((get_address_type(address), address, data)
+             for address, data in changes),
+            key=lambda change: _TYPE_ORDER.get(change[0], 3))
+
+        connection = self.connection()
+        with connection:
+            touched = set()
+            for data_type, address, data in changes:
+                if data_type is AddressSpace.OWNER:
+                    self._write_owners(connection, address, data)
+                elif data_type is AddressSpace.RECORD:
+                    touched.update(
+                        self._write_records(connection, address, data))
+                elif data_type is AddressSpace.HISTORY:
+                    touched.update(
+                        self._write_history_pages(connection, address, data))
+
+            for record_id in touched:
+                connection.execute(
+                    'UPDATE records SET situation = ('
+                    '    SELECT situation FROM history'
+                    '    WHERE history.record_id = records.record_id'
+                    '    ORDER BY page DESC, position DESC LIMIT 1) '
+                    'WHERE record_id = ?', (record_id,))
+
+            if block_id is not None:
+                connection.execute(
+                    'INSERT OR REPLACE INTO meta (key, value) '
+                    'VALUES (?, ?)', ('block_id', block_id))
+
+    def clear(self):
+        connection = self.connection()
+        with connection:
+            for table in ('meta', 'owners', 'records', 'record_owners',
+                          'history'):
+                connection.execute('DELETE FROM {}'.format(table))
+
+    def _write_owners(self, connection, address, data):
+        connection.execute('DELETE FROM owners WHERE address = ?', (address,))
+        if data is None:
+            return
+        _, owners = deserialize_data(address, data)
+        connection.executemany(
+            'INSERT INTO owners (address, public_key, name, timestamp) '
+            'VALUES (?, ?, ?, ?)',
+            [(address, owner['public_key'], owner['name'], owner['timestamp'])
+             for owner in owners])
+
+    def _write_records(self, connection, address, data):
+        previous = [row['record_id'] for row in connection.execute(
+            'SELECT record_id FROM records WHERE address = ?', (address,))]
+        connection.execute(
+            'DELETE FROM records WHERE address = ?', (address,))
+        for record_id in previous:
+            connection.execute(
+                'DELETE FROM record_owners WHERE record_id = ?',
+                (record_id,))
+        if data is None:
+            for record_id in previous:
+                connection.execute(
+                    'DELETE FROM history WHERE record_id = ?', (record_id,))
+            return previous
+
+        _, records = deserialize_data(address, data)
+        for record in records:
+            owner = record['owners'][-1] if record['owners'] else {}
+            connection.execute(
+                'INSERT INTO records (address, record_id, tag_id, owner_id, '
+                'owner_timestamp, history_count) VALUES (?, ?, ?, ?, ?, ?)',
+                (address, record['record_id'], record['tag_id'],
+                 owner.get('owner_id'), owner.get('timestamp'),
+                 record['history_count'] or len(record['history'])))
+            connection.executemany(
+                'INSERT INTO record_owners (record_id, position, owner_id, '
+                'timestamp) VALUES (?, ?, ?, ?)',
+                [(record['record_id'], position, owner['owner_id'],
+                  owner['timestamp'])
+                 for position, owner in enumerate(record['owners'])])
+            if not record['history_page_size']:
+                # History kept inline, replaced as a whole
+                connection.execute(
+                    'DELETE FROM history WHERE record_id = ?',
+                    (record['record_id'],))
+                self._insert_history(
+                    connection, address, record['record_id'], 0,
+                    record['history'])
+        return previous + [record['record_id'] for record in records]
+
+    def _write_history_pages(self, connection, address, data):
+        previous = [row['record_id'] for row in connection.execute(
+            'SELECT DISTINCT record_id FROM history WHERE address = ?',
+            (address,))]
+        connection.execute('DELETE FROM history WHERE address = ?', (address,))
+        if data is None:
+            return previous
+
+        _, pages = deserialize_data(address, data)
+        for page in pages:
+            self._insert_history(
+                connection, address, page['record_id'], page['page'],
+                page['entries'])
+        return previous + [page['record_id'] for page in pages]
+
+    def _insert_history(self, connection, address, record_id, page, entries):
+        connection.executemany(
+            'INSERT OR REPLACE INTO history (record_id, page, position, '
+            'address, reader_id, ant_id, situation, timestamp, model_hash) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [(record_id, page, position, address, entry['reader_id'],
+              entry['ant_id'], entry['situation'], entry['timestamp'],
+              entry['model_hash'] or None)
+             for position, entry in enumerate(entries)])
+
+    def search_records(self,
+                       owner_id=None,
+                       tag_id=None,
+                       situation=None,
+                       limit=DEFAULT_LIMIT,
+                       offset=0):
+        """Lists the records matching every given filter, by record_id
+
+        Args:
+            owner_id (str): Public key of the current owner
+            tag_id (str): The tag id
+            situation (str): Situation of the latest history entry
+            limit (int): Records returned at most
+            offset (int): Records skipped
+
+        Returns:
+            list of dict: record_id, tag_id, owner_id, owner_timestamp,
+                situation and history_count of each record
+        """
+        query, params = _where((
+            ('owner_id = ?', owner_id),
+            ('tag_id = ?', tag_id),
+            ('situation = ?', situation)))
+        rows = self.connection().execute(
+            'SELECT record_id, tag_id, owner_id, owner_timestamp, situation, '
+            'history_count FROM records' + query +
+            ' ORDER BY record_id LIMIT ? OFFSET ?',
+            params + [limit, offset])
+        return [dict(row) for row in rows]
+
+    def search_history(self,
+                       record_id=None,
+                       reader_id=None,
+                       ant_id=None,
+                       situation=None,
+                       since=None,
+                       until=None,
+                       limit=DEFAULT_LIMIT,
+                       offset=0):
+        """Lists the history entries matching every given filter, newest
+        first
+
+        Args:
+            record_id (str): The record of the entries
+            reader_id (str): The reader that made the reads
+            ant_id (str): The antenna of the reads
+            situation (str): The situation of the entries
+            since (int): Unix UTC timestamp of the oldest entries
+            until (int): Unix UTC timestamp after the newest entries
+            limit (int): Entries returned at most
+            offset (int): Entries skipped
+
+        Returns:
+            list of dict: record_id, reader_id, ant_id, situation, timestamp
+                and model_hash of each entry
+        """
+        query, params = _where((
+            ('record_id = ?', record_id),
+            ('reader_id = ?', reader_id),
+            ('ant_id = ?', ant_id),
+            ('situation = ?', situation),
+            ('timestamp >= ?', since),
+            ('timestamp < ?', until)))
+        rows = self.connection().execute(
+            'SELECT record_id, reader_id, ant_id, situation, timestamp, '
+            'model_hash FROM history' + query +
+            ' ORDER BY timestamp DESC, record_id, page DESC, position DESC'
+            ' LIMIT ? OFFSET ?',
+            params + [limit, offset])
+        return [dict(row) for row in rows]
+
+
+def _where(conditions):
+    clauses = []
+    params = []
+    for clause, value in conditions:
+        if value is not None:
+            clauses.append(clause)
+            params.append(value)
+    if not clauses:
+        return '', params
+    return ' WHERE ' + ' AND '.join(clauses), params
@@ -0,0 +1,244 @@
+"""Keeps the index database in step with the ledger
+
+On its first start the indexer copies the namespace as of the head block,
+reading the state of that block's state root so the copy is consistent.
+It then subscribes to the state changes of the blocks committed after it.
+The last block written is stored with the index. A restarted indexer
+resumes from that block, and the validator resends the events it missed.
+
+The subscription is made once. The head block is read every interval, as a
+ping: the indexer subscribes again only when the validator could not be
+reached, or when the head moved while no events came, such as after a
+validator restart. The validator then replays the blocks after the last one
+written, some of which may already be queued, so the events of a block that
+was already written are dropped.
+"""
+
+import collections
+import logging
+import queue
+import threading
+import time
+
+from sawtooth_sdk.protobuf import block_pb2
+from sawtooth_sdk.protobuf import client_block_pb2
+from sawtooth_sdk.protobuf import client_event_pb2
+from sawtooth_sdk.protobuf import client_list_control_pb2
+from sawtooth_sdk.protobuf import client_state_pb2
+from sawtooth_sdk.protobuf import events_pb2
+from sawtooth_sdk.protobuf import transaction_receipt_pb2
+from sawtooth_sdk.protobuf import validator_pb2
+
+from pnrdnet_addressing.addresser import NAMESPACE
+from pnrdnet_api.dispatcher.state_cache import make_subscribe_request
+
+
+LOGGER = logging.getLogger(__name__)
+
+BACKFILL_PAGE_SIZE = 1000
+RESUBSCRIBE_INTERVAL = 10
+# Ids of the latest blocks written, whose replayed events are dropped
+APPLIED_BLOCKS_KEPT = 1000
+
+
+class IndexerError(Exception):
+    pass
+
+
+class Indexer(object):
+    def __init__(self, connection, database, interval=RESUBSCRIBE_INTERVAL):
+        """
+        Args:
+            connection (ValidatorConnection): Open connection to the
+                validator
+            database (IndexDatabase): The index
+            interval (float): Seconds between two reads of the head
+                block, which detect a lost or restarted validator
+        """
+        self._connection = connection
+        self._database = database
+        self._interval = interval
+        self._events = queue.Queue()
+        self._stopping = threading.Event()
+        self._block_id = None
+        self._applied = collections.OrderedDict()
+        self._subscribed = False
+        self._received = False
+        connection.add_handler(
+            validator_pb2.Message.CLIENT_EVENTS, self._events.put)
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self):
+        """Backfills the index if needed and applies the state changes of
+        every new block until stop() is called
+        """
+        block_id = self._database.get_meta('block_id')
+        if block_id is None:
+            self.backfill()
+        else:
+            self._set_applied(block_id)
+
+        next_check = 0
+        while not self._stopping.is_set():
+            if time.monotonic() >= next_check:
+                self._check_subscription()
+                next_check = time.monotonic() + self._interval
+            try:
+                message = self._events.get(timeout=1)
+            except queue.Empty:
+                continue
+            self._received = True
+            self._handle_events(message)
+
+    def backfill(self):
+        """Rebuilds the index from the state of the head block"""
+        head = self._get_head()
+        self._database.clear()
+        self._applied.clear()
+        if head is None:
+            LOGGER.info('No block committed yet, nothing to backfill')
+            self._block_id = None
+            return
+
+        block_id, state_root = head
+        LOGGER.info('Backfilling the index from block %s', block_id)
+        count = 0
+        start = ''
+        while True:
+            response = self._send(
+                validator_pb2.Message.CLIENT_STATE_LIST_REQUEST,
+                client_state_pb2.ClientStateListRequest(
+                    state_root=state_root,
+                    address=NAMESPACE,
+                    paging=client_list_control_pb2.ClientPagingControls(
+                        start=start, limit=BACKFILL_PAGE_SIZE)),
+                client_state_pb2.ClientStateListResponse)
+            if response.status == response.NO_RESOURCE:
+                break
+            if response.status != response.OK:
+                raise IndexerError('Failed to list state: {}'.format(
+                    response.Status.Name(response.status)))
+            self._database.apply_changes(
+                (entry.address, entry.data) for entry in response.entries)
+            count += len(response.entries)
+            start = response.paging.next
+            if not start:
+                break
+
+        self._database.apply_changes((), block_id=block_id)
+        self._set_applied(block_id)
+        LOGGER.info('Backfilled %s state entries', count)
+
+    def _set_applied(self, block_id):
+        self._block_id = block_id
+        self._applied[block_id] = None
+        if len(self._applied) > APPLIED_BLOCKS_KEPT:
+            self._applied.popitem(last=False)
+
+    def _send(self, message_type, request, response_class, timeout=None):
+        message = self._connection.send(
+            message_type, request.SerializeToString(), timeout=timeout)
+        response = response_class()
+        response.ParseFromString(message.content)
+        return response
+
+    def _get_head(self, timeout=None):
+        """Returns the id and state root of the head block, None when the
+        chain is empty
+        """
+        response = self._send(
+            validator_pb2.Message.CLIENT_BLOCK_LIST_REQUEST,
+            client_block_pb2.ClientBlockListRequest(
+                paging=client_list_control_pb2.ClientPagingControls(
+                    limit=1)),
+            client_block_pb2.ClientBlockListResponse,
+            timeout=timeout)
+        if response.status == response.NO_RESOURCE or not response.blocks:
+            return None
+        if response.status != response.OK:
+            raise IndexerError('Failed to get the head block: {}'.format(
+                response.Status.Name(response.status)))
+
+        block = response.blocks[0]
+        header = block_pb2.BlockHeader()
+        header.ParseFromString(block.header)
+        return block.header_signature, header.state_root_hash
+
+    def _check_subscription(self):
+        """Subscribes if not subscribed yet, or if the validator was lost
+        or stopped sending events since the last check
+        """
+        received, self._received = self._received, False
+        try:
+            head = self._get_head(timeout=self._interval)
+        except Exception as err:  # pylint: disable=broad-except
+            if self._subscribed:
+                LOGGER.warning('Validator unreachable: %r', err)
+            self._subscribed = False
+            return
+
+        if self._subscribed:
+            if head is None or head[0] in self._applied or received or \
+                    not self._events.empty():
+                return
+            LOGGER.warning('No events received up to block %s, '
+                           'subscribing again', head[0])
+        self._subscribed = self._subscribe()
+
+    def _subscribe(self):
+        """Subscribes to the events after the last block written
+
+        Returns:
+            bool: Whether the subscription was accepted
+        """
+        try:
+            response = self._send(
+                validator_pb2.Message.CLIENT_EVENTS_SUBSCRIBE_REQUEST,
+                make_subscribe_request(self._block_id),
+                client_event_pb2.ClientEventsSubscribeResponse)
+        except Exception as err:  # pylint: disable=broad-except
+            LOGGER.warning('Event subscription failed: %r', err)
+            return False
+
+        if response.status == response.UNKNOWN_BLOCK:
+            # The indexed block is not in the chain anymore, such as after
+            # the ledger was reset
+            LOGGER.warning('Block %s unknown to the validator, rebuilding '
+                           'the index', self._block_id)
+            self.backfill()
+            return self._subscribe()
+        if response.status != response.OK:
+            LOGGER.warning('Event subscription rejected: %s',
+                           response.response_message)
+            return False
+        return True
+
+    def _handle_events(self, message):
+        event_list = events_pb2.EventList()
+        event_list.ParseFromString(message.content)
+
+        block_id = None
+        changes = []
+        for event in event_list.events:
+            if event.event_type == 'sawtooth/block-commit':
+                for attribute in event.attributes:
+                    if attribute.key == 'block_id':
+                        block_id = attribute.value
+            elif event.event_type == 'sawtooth/state-delta':
+                state_changes = transaction_receipt_pb2.StateChangeList()
+                state_changes.ParseFromString(event.data)
+                changes.extend(
+                    (change.address,
+                     change.value if change.type == change.SET else None)
+                    for change in state_changes.state_changes
+                    if change.address.startswith(NAMESPACE))
+
+        if block_id in self._applied:
+            LOGGER.debug('Dropping the replayed events of block %s',
+                         block_id)
+            return
+        self._database.apply_changes(changes, block_id=block_id)
+        if block_id is not None:
+            self._set_applied(block_id)
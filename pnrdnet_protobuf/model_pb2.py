@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: model.proto
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import message as _message
+from google.protobuf import reflection as _reflection
+from google.protobuf import symbol_database as _symbol_database
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0bmodel.proto\"\xca\x01\n\x08NetModel\x12\x12\n\nmodel_hash\x18\x01 \x01(\t\x12\x0e\n\x06places\x18\x02 \x01(\x05\x12\x13\n\x0btransitions\x18\x03 \x01(\x05\x12\x1b\n\x0fincidenceMatrix\x18\x04 \x03(\x11\x42\x02\x10\x01\x12\x1b\n\x0fincidenceRowPtr\x18\x05 \x03(\rB\x02\x10\x01\x12\x1b\n\x0fincidenceColIdx\x18\x06 \x03(\rB\x02\x10\x01\x12\x1b\n\x0fincidenceValues\x18\x07 \x03(\x11\x42\x02\x10\x01\x12\x11\n\ttimestamp\x18\x08 \x01(\x04\"/\n\x11NetModelContainer\x12\x1a\n\x07\x65ntries\x18\x01 \x03(\x0b\x32\t.NetModelb\x06proto3')
+
+
+
+_NETMODEL = DESCRIPTOR.message_types_by_name['NetModel']
+_NETMODELCONTAINER = DESCRIPTOR.message_types_by_name['NetModelContainer']
+NetModel = _reflection.GeneratedProtocolMessageType('NetModel', (_message.Message,), {
+  'DESCRIPTOR' : _NETMODEL,
+  '__module__' : 'model_pb2'
+  # @@protoc_insertion_point(class_scope:NetModel)
+  })
+_sym_db.RegisterMessage(NetModel)
+
+NetModelContainer = _reflection.GeneratedProtocolMessageType('NetModelContainer', (_message.Message,), {
+  'DESCRIPTOR' : _NETMODELCONTAINER,
+  '__module__' : 'model_pb2'
+  # @@protoc_insertion_point(class_scope:NetModelContainer)
+  })
+_sym_db.RegisterMessage(NetModelContainer)
+
+if _descriptor._USE_C_DESCRIPTORS == False:
+
+  DESCRIPTOR._options = None
+  _NETMODEL.fields_by_name['incidenceMatrix']._options = None
+  _NETMODEL.fields_by_name['incidenceMatrix']._serialized_options = b'\020\001'
+  _NETMODEL.fields_by_name['incidenceRowPtr']._options = None
+  _NETMODEL.fields_by_name['incidenceRowPtr']._serialized_options = b'\020\001'
+  _NETMODEL.fields_by_name['incidenceColIdx']._options = None
+  _NETMODEL.fields_by_name['incidenceColIdx']._serialized_options = b'\020\001'
+  _NETMODEL.fields_by_name['incidenceValues']._options = None
+  _NETMODEL.fields_by_name['incidenceValues']._serialized_options = b'\020\001'
+  _NETMODEL._serialized_start=16
+  _NETMODEL._serialized_end=218
+  _NETMODELCONTAINER._serialized_start=220
+  _NETMODELCONTAINER._serialized_end=267
+# @@protoc_insertion_point(module_scope)
@@ -14,7 +14,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rpayload.proto\"\xce\x02\n\x0bPnrdPayload\x12#\n\x06\x61\x63tion\x18\x01 \x01(\x0e\x32\x13.PnrdPayload.Action\x12(\n\x0c\x63reate_owner\x18\x02 \x01(\x0b\x32\x12.CreateOwnerAction\x12*\n\rcreate_record\x18\x03 \x01(\x0b\x32\x13.CreateRecordAction\x12*\n\rupdate_record\x18\x04 \x01(\x0b\x32\x13.UpdateRecordAction\x12.\n\x0ftransfer_record\x18\x05 \x01(\x0b\x32\x15.TransferRecordAction\x12\x11\n\ttimestamp\x18\x06 \x01(\x04\"U\n\x06\x41\x63tion\x12\x10\n\x0c\x43REATE_OWNER\x10\x00\x12\x11\n\rCREATE_RECORD\x10\x01\x12\x11\n\rUPDATE_RECORD\x10\x02\x12\x13\n\x0fTRANSFER_RECORD\x10\x03\"!\n\x11\x43reateOwnerAction\x12\x0c\n\x04name\x18\x01 \x01(\t\"\xc2\x01\n\x12\x43reateRecordAction\x12\x11\n\trecord_id\x18\x01 \x01(\t\x12\x0e\n\x06tag_id\x18\x02 \x01(\t\x12\x11\n\treader_id\x18\x03 \x01(\t\x12\x0e\n\x06\x61nt_id\x18\x04 \x01(\t\x12\x11\n\tsituation\x18\x05 \x01(\t\x12\x0e\n\x06places\x18\x06 \x01(\x05\x12\x13\n\x0btransitions\x18\x07 \x01(\x05\x12\x11\n\x05token\x18\x08 \x03(\x11\x42\x02\x10\x01\x12\x1b\n\x0fincidenceMatrix\x18\t \x03(\x11\x42\x02\x10\x01\"\xb2\x01\n\x12UpdateRecordAction\x12\x11\n\trecord_id\x18\x01 \x01(\t\x12\x11\n\treader_id\x18\x02 \x01(\t\x12\x0e\n\x06\x61nt_id\x18\x03 \x01(\t\x12\x11\n\tsituation\x18\x04 \x01(\t\x12\x0e\n\x06places\x18\x05 \x01(\x05\x12\x13\n\x0btransitions\x18\x06 \x01(\x05\x12\x11\n\x05token\x18\x07 \x03(\x11\x42\x02\x10\x01\x12\x1b\n\x0fincidenceMatrix\x18\x08 \x03(\x11\x42\x02\x10\x01\"B\n\x14TransferRecordAction\x12\x11\n\trecord_id\x18\x01 \x01(\t\x12\x17\n\x0freceiving_owner\x18\x02 \x01(\tb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rpayload.proto\"\xb2\x03\n\x0bPnrdPayload\x12#\n\x06\x61\x63tion\x18\x01 \x01(\x0e\x32\x13.PnrdPayload.Action\x12(\n\x0c\x63reate_owner\x18\x02 \x01(\x0b\x32\x12.CreateOwnerAction\x12*\n\rcreate_record\x18\x03 \x01(\x0b\x32\x13.CreateRecordAction\x12*\n\rupdate_record\x18\x04 \x01(\x0b\x32\x13.UpdateRecordAction\x12.\n\x0ftransfer_record\x18\x05 \x01(\x0b\x32\x15.TransferRecordAction\x12(\n\x0c\x63reate_model\x18\x07 \x01(\x0b\x32\x12.CreateModelAction\x12\x1b\n\x05\x62\x61tch\x18\x08 \x01(\x0b\x32\x0c.BatchAction\x12\x11\n\ttimestamp\x18\x06 \x01(\x04\"r\n\x06\x41\x63tion\x12\x10\n\x0c\x43REATE_OWNER\x10\x00\x12\x11\n\rCREATE_RECORD\x10\x01\x12\x11\n\rUPDATE_RECORD\x10\x02\x12\x13\n\x0fTRANSFER_RECORD\x10\x03\x12\x10\n\x0c\x43REATE_MODEL\x10\x04\x12\t\n\x05\x42\x41TCH\x10\x05\"!\n\x11\x43reateOwnerAction\x12\x0c\n\x04name\x18\x01 \x01(\t\"\xe7\x02\n\x12\x43reateRecordAction\x12\x11\n\trecord_id\x18\x01 \x01(\t\x12\x0e\n\x06tag_id\x18\x02 \x01(\t\x12\x11\n\treader_id\x18\x03 \x01(\t\x12\x0e\n\x06\x61nt_id\x18\x04 \x01(\t\x12\x11\n\tsituation\x18\x05 \x01(\t\x12\x0e\n\x06places\x18\x06 \x01(\x05\x12\x13\n\x0btransitions\x18\x07 \x01(\x05\x12\x11\n\x05token\x18\x08 \x03(\x11\x42\x02\x10\x01\x12\x1b\n\x0fincidenceMatrix\x18\t \x03(\x11\x42\x02\x10\x01\x12\x1b\n\x0fincidenceRowPtr\x18\n \x03(\rB\x02\x10\x01\x12\x1b\n\x0fincidenceColIdx\x18\x0b \x03(\rB\x02\x10\x01\x12\x1b\n\x0fincidenceValues\x18\x0c \x03(\x11\x42\x02\x10\x01\x12\x12\n\nmodel_hash\x18\r \x01(\t\x12\x1f\n\x17token_keyframe_interval\x18\x0e \x01(\r\x12\x17\n\x0fvalidate_firing\x18\x0f \x01(\x08\"\x9d\x02\n\x12UpdateRecordAction\x12\x11\n\trecord_id\x18\x01 \x01(\t\x12\x11\n\treader_id\x18\x02 \x01(\t\x12\x0e\n\x06\x61nt_id\x18\x03 \x01(\t\x12\x11\n\tsituation\x18\x04 \x01(\t\x12\x0e\n\x06places\x18\x05 \x01(\x05\x12\x13\n\x0btransitions\x18\x06 \x01(\x05\x12\x11\n\x05token\x18\x07 \x03(\x11\x42\x02\x10\x01\x12\x1b\n\x0fincidenceMatrix\x18\x08 \x03(\x11\x42\x02\x10\x01\x12\x1b\n\x0fincidenceRowPtr\x18\t \x03(\rB\x02\x10\x01\x12\x1b\n\x0fincidenceColIdx\x18\n \x03(\rB\x02\x10\x01\x12\x1b\n\x0fincidenceValues\x18\x0b \x03(\x11\x42\x02\x10\x01\x12\x12\n\nmodel_hash\x18\x0c \x01(\t\"B\n\x14TransferRecordAction\x12\x11\n\trecord_id\x18\x01 \x01(\t\x12\x17\n\x0freceiving_owner\x18\x02 \x01(\t\"\xac\x01\n\x11\x43reateModelAction\x12\x0e\n\x06places\x18\x01 \x01(\x05\x12\x13\n\x0btransitions\x18\x02 \x01(\x05\x12\x1b\n\x0fincidenceMatrix\x18\x03 \x03(\x11\x42\x02\x10\x01\x12\x1b\n\x0fincidenceRowPtr\x18\x04 \x03(\rB\x02\x10\x01\x12\x1b\n\x0fincidenceColIdx\x18\x05 \x03(\rB\x02\x10\x01\x12\x1b\n\x0fincidenceValues\x18\x06 \x03(\x11\x42\x02\x10\x01\"/\n\x0b\x42\x61tchAction\x12 \n\noperations\x18\x01 \x03(\x0b\x32\x0c.PnrdPayloadb\x06proto3')
 
 
 
@@ -23,6 +23,8 @@ _CREATEOWNERACTION = DESCRIPTOR.message_types_by_name['CreateOwnerAction']
 _CREATERECORDACTION = DESCRIPTOR.message_types_by_name['CreateRecordAction']
 _UPDATERECORDACTION = DESCRIPTOR.message_types_by_name['UpdateRecordAction']
 _TRANSFERRECORDACTION = DESCRIPTOR.message_types_by_name['TransferRecordAction']
+_CREATEMODELACTION = DESCRIPTOR.message_types_by_name['CreateModelAction']
+_BATCHACTION = DESCRIPTOR.message_types_by_name['BatchAction']
 _PNRDPAYLOAD_ACTION = _PNRDPAYLOAD.enum_types_by_name['Action']
 PnrdPayload = _reflection.GeneratedProtocolMessageType('PnrdPayload', (_message.Message,), {
   'DESCRIPTOR' : _PNRDPAYLOAD,
@@ -59,6 +61,20 @@ TransferRecordAction = _reflection.GeneratedProtocolMessageType('TransferRecordA
   })
 _sym_db.RegisterMessage(TransferRecordAction)
 
+CreateModelAction = _reflection.GeneratedProtocolMessageType('CreateModelAction', (_message.Message,), {
+  'DESCRIPTOR' : _CREATEMODELACTION,
+  '__module__' : 'payload_pb2'
+  # @@protoc_insertion_point(class_scope:CreateModelAction)
+  })
+_sym_db.RegisterMessage(CreateModelAction)
+
+BatchAction = _reflection.GeneratedProtocolMessageType('BatchAction', (_message.Message,), {
+  'DESCRIPTOR' : _BATCHACTION,
+  '__module__' : 'payload_pb2'
+  # @@protoc_insertion_point(class_scope:BatchAction)
+  })
+_sym_db.RegisterMessage(BatchAction)
+
 if _descriptor._USE_C_DESCRIPTORS == False:
 
   DESCRIPTOR._options = None
@@ -66,20 +82,44 @@ if _descriptor._USE_C_DESCRIPTORS == False:
   _CREATERECORDACTION.fields_by_name['token']._serialized_options = b'\020\001'
   _CREATERECORDACTION.fields_by_name['incidenceMatrix']._options = None
   _CREATERECORDACTION.fields_by_name['incidenceMatrix']._serialized_options = b'\020\001'
+  _CREATERECORDACTION.fields_by_name['incidenceRowPtr']._options = None
+  _CREATERECORDACTION.fields_by_name['incidenceRowPtr']._serialized_options = b'\020\001'
+  _CREATERECORDACTION.fields_by_name['incidenceColIdx']._options = None
+  _CREATERECORDACTION.fields_by_name['incidenceColIdx']._serialized_options = b'\020\001'
+  _CREATERECORDACTION.fields_by_name['incidenceValues']._options = None
+  _CREATERECORDACTION.fields_by_name['incidenceValues']._serialized_options = b'\020\001'
   _UPDATERECORDACTION.fields_by_name['token']._options = None
   _UPDATERECORDACTION.fields_by_name['token']._serialized_options = b'\020\001'
   _UPDATERECORDACTION.fields_by_name['incidenceMatrix']._options = None
   _UPDATERECORDACTION.fields_by_name['incidenceMatrix']._serialized_options = b'\020\001'
+  _UPDATERECORDACTION.fields_by_name['incidenceRowPtr']._options = None
+  _UPDATERECORDACTION.fields_by_name['incidenceRowPtr']._serialized_options = b'\020\001'
+  _UPDATERECORDACTION.fields_by_name['incidenceColIdx']._options = None
+  _UPDATERECORDACTION.fields_by_name['incidenceColIdx']._serialized_options = b'\020\001'
+  _UPDATERECORDACTION.fields_by_name['incidenceValues']._options = None
+  _UPDATERECORDACTION.fields_by_name['incidenceValues']._serialized_options = b'\020\001'
+  _CREATEMODELACTION.fields_by_name['incidenceMatrix']._options = None
+  _CREATEMODELACTION.fields_by_name['incidenceMatrix']._serialized_options = b'\020\001'
+  _CREATEMODELACTION.fields_by_name['incidenceRowPtr']._options = None
+  _CREATEMODELACTION.fields_by_name['incidenceRowPtr']._serialized_options = b'\020\001'
+  _CREATEMODELACTION.fields_by_name['incidenceColIdx']._options = None
+  _CREATEMODELACTION.fields_by_name['incidenceColIdx']._serialized_options = b'\020\001'
+  _CREATEMODELACTION.fields_by_name['incidenceValues']._options = None
+  _CREATEMODELACTION.fields_by_name['incidenceValues']._serialized_options = b'\020\001'
   _PNRDPAYLOAD._serialized_start=18
-  _PNRDPAYLOAD._serialized_end=352
-  _PNRDPAYLOAD_ACTION._serialized_start=267
-  _PNRDPAYLOAD_ACTION._serialized_end=352
-  _CREATEOWNERACTION._serialized_start=354
-  _CREATEOWNERACTION._serialized_end=387
-  _CREATERECORDACTION._serialized_start=390
-  _CREATERECORDACTION._serialized_end=584
-  _UPDATERECORDACTION._serialized_start=587
-  _UPDATERECORDACTION._serialized_end=765
-  _TRANSFERRECORDACTION._serialized_start=767
-  _TRANSFERRECORDACTION._serialized_end=833
+  _PNRDPAYLOAD._serialized_end=452
+  _PNRDPAYLOAD_ACTION._serialized_start=338
+  _PNRDPAYLOAD_ACTION._serialized_end=452
+  _CREATEOWNERACTION._serialized_start=454
+  _CREATEOWNERACTION._serialized_end=487
+  _CREATERECORDACTION._serialized_start=490
+  _CREATERECORDACTION._serialized_end=849
+  _UPDATERECORDACTION._serialized_start=852
+  _UPDATERECORDACTION._serialized_end=1137
+  _TRANSFERRECORDACTION._serialized_start=1139
+  _TRANSFERRECORDACTION._serialized_end=1205
+  _CREATEMODELACTION._serialized_start=1208
+  _CREATEMODELACTION._serialized_end=1380
+  _BATCHACTION._serialized_start=1382
+  _BATCHACTION._serialized_end=1429
 # @@protoc_insertion_point(module_scope)
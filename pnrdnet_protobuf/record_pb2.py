@@ -14,14 +14,18 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0crecord.proto\"\xc4\x02\n\x06Record\x12\x11\n\trecord_id\x18\x01 \x01(\t\x12\x0e\n\x06tag_id\x18\x02 \x01(\t\x12\x1d\n\x06owners\x18\x03 \x03(\x0b\x32\r.Record.Owner\x12 \n\x07history\x18\x04 \x03(\x0b\x32\x0f.Record.History\x1a,\n\x05Owner\x12\x10\n\x08owner_id\x18\x01 \x01(\t\x12\x11\n\ttimestamp\x18\x02 \x01(\x04\x1a\xa7\x01\n\x07History\x12\x11\n\treader_id\x18\x01 \x01(\t\x12\x0e\n\x06\x61nt_id\x18\x02 \x01(\t\x12\x11\n\tsituation\x18\x03 \x01(\t\x12\x0e\n\x06places\x18\x04 \x01(\x05\x12\x13\n\x0btransitions\x18\x05 \x01(\x05\x12\x11\n\x05token\x18\x06 \x03(\x11\x42\x02\x10\x01\x12\x1b\n\x0fincidenceMatrix\x18\x07 \x03(\x11\x42\x02\x10\x01\x12\x11\n\ttimestamp\x18\x08 \x01(\x04\"+\n\x0fRecordContainer\x12\x18\n\x07\x65ntries\x18\x01 \x03(\x0b\x32\x07.Recordb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0crecord.proto\"\x85\x05\n\x06Record\x12\x11\n\trecord_id\x18\x01 \x01(\t\x12\x0e\n\x06tag_id\x18\x02 \x01(\t\x12\x1d\n\x06owners\x18\x03 \x03(\x0b\x32\r.Record.Owner\x12 \n\x07history\x18\x04 \x03(\x0b\x32\x0f.Record.History\x12\x19\n\x11history_page_size\x18\x05 \x01(\r\x12\x15\n\rhistory_count\x18\x06 \x01(\x04\x12\x1f\n\x17token_keyframe_interval\x18\x07 \x01(\r\x12\x16\n\nlast_token\x18\x08 \x03(\x11\x42\x02\x10\x01\x12\x17\n\x0fvalidate_firing\x18\t \x01(\x08\x1a,\n\x05Owner\x12\x10\n\x08owner_id\x18\x01 \x01(\t\x12\x11\n\ttimestamp\x18\x02 \x01(\x04\x1a\xe4\x02\n\x07History\x12\x11\n\treader_id\x18\x01 \x01(\t\x12\x0e\n\x06\x61nt_id\x18\x02 \x01(\t\x12\x11\n\tsituation\x18\x03 \x01(\t\x12\x0e\n\x06places\x18\x04 \x01(\x05\x12\x13\n\x0btransitions\x18\x05 \x01(\x05\x12\x11\n\x05token\x18\x06 \x03(\x11\x42\x02\x10\x01\x12\x1b\n\x0fincidenceMatrix\x18\x07 \x03(\x11\x42\x02\x10\x01\x12\x11\n\ttimestamp\x18\x08 \x01(\x04\x12\x1b\n\x0fincidenceRowPtr\x18\t \x03(\rB\x02\x10\x01\x12\x1b\n\x0fincidenceColIdx\x18\n \x03(\rB\x02\x10\x01\x12\x1b\n\x0fincidenceValues\x18\x0b \x03(\x11\x42\x02\x10\x01\x12\x12\n\nmodel_hash\x18\x0c \x01(\t\x12\x16\n\x0etoken_is_delta\x18\r \x01(\x08\x12\x1b\n\x0ftoken_delta_idx\x18\x0e \x03(\rB\x02\x10\x01\x12\x1b\n\x0ftoken_delta_val\x18\x0f \x03(\x11\x42\x02\x10\x01\"P\n\x0bHistoryPage\x12\x11\n\trecord_id\x18\x01 \x01(\t\x12\x0c\n\x04page\x18\x02 \x01(\x04\x12 \n\x07\x65ntries\x18\x03 \x03(\x0b\x32\x0f.Record.History\"5\n\x14HistoryPageContainer\x12\x1d\n\x07\x65ntries\x18\x01 \x03(\x0b\x32\x0c.HistoryPage\"+\n\x0fRecordContainer\x12\x18\n\x07\x65ntries\x18\x01 \x03(\x0b\x32\x07.Record\".\n\tRecordTag\x12\x0e\n\x06tag_id\x18\x01 \x01(\t\x12\x11\n\trecord_id\x18\x02 \x01(\t\"1\n\x12RecordTagContainer\x12\x1b\n\x07\x65ntries\x18\x01 \x03(\x0b\x32\n.RecordTagb\x06proto3')
 
 
 
 _RECORD = DESCRIPTOR.message_types_by_name['Record']
 _RECORD_OWNER = _RECORD.nested_types_by_name['Owner']
 _RECORD_HISTORY = _RECORD.nested_types_by_name['History']
+_HISTORYPAGE = DESCRIPTOR.message_types_by_name['HistoryPage']
+_HISTORYPAGECONTAINER = DESCRIPTOR.message_types_by_name['HistoryPageContainer']
 _RECORDCONTAINER = DESCRIPTOR.message_types_by_name['RecordContainer']
+_RECORDTAG = DESCRIPTOR.message_types_by_name['RecordTag']
+_RECORDTAGCONTAINER = DESCRIPTOR.message_types_by_name['RecordTagContainer']
 Record = _reflection.GeneratedProtocolMessageType('Record', (_message.Message,), {
 
   'Owner' : _reflection.GeneratedProtocolMessageType('Owner', (_message.Message,), {
@@ -45,6 +49,20 @@ _sym_db.RegisterMessage(Record)
 _sym_db.RegisterMessage(Record.Owner)
 _sym_db.RegisterMessage(Record.History)
 
+HistoryPage = _reflection.GeneratedProtocolMessageType('HistoryPage', (_message.Message,), {
+  'DESCRIPTOR' : _HISTORYPAGE,
+  '__module__' : 'record_pb2'
+  # @@protoc_insertion_point(class_scope:HistoryPage)
+  })
+_sym_db.RegisterMessage(HistoryPage)
+
+HistoryPageContainer = _reflection.GeneratedProtocolMessageType('HistoryPageContainer', (_message.Message,), {
+  'DESCRIPTOR' : _HISTORYPAGECONTAINER,
+  '__module__' : 'record_pb2'
+  # @@protoc_insertion_point(class_scope:HistoryPageContainer)
+  })
+_sym_db.RegisterMessage(HistoryPageContainer)
+
 RecordContainer = _reflection.GeneratedProtocolMessageType('RecordContainer', (_message.Message,), {
   'DESCRIPTOR' : _RECORDCONTAINER,
   '__module__' : 'record_pb2'
@@ -52,6 +70,20 @@ RecordContainer = _reflection.GeneratedProtocolMessageType('RecordContainer', (_
   })
 _sym_db.RegisterMessage(RecordContainer)
 
+RecordTag = _reflection.GeneratedProtocolMessageType('RecordTag', (_message.Message,), {
+  'DESCRIPTOR' : _RECORDTAG,
+  '__module__' : 'record_pb2'
+  # @@protoc_insertion_point(class_scope:RecordTag)
+  })
+_sym_db.RegisterMessage(RecordTag)
+
+RecordTagContainer = _reflection.GeneratedProtocolMessageType('RecordTagContainer', (_message.Message,), {
+  'DESCRIPTOR' : _RECORDTAGCONTAINER,
+  '__module__' : 'record_pb2'
+  # @@protoc_insertion_point(class_scope:RecordTagContainer)
+  })
+_sym_db.RegisterMessage(RecordTagContainer)
+
 if _descriptor._USE_C_DESCRIPTORS == False:
 
   DESCRIPTOR._options = None
@@ -59,12 +91,32 @@ if _descriptor._USE_C_DESCRIPTORS == False:
   _RECORD_HISTORY.fields_by_name['token']._serialized_options = b'\020\001'
   _RECORD_HISTORY.fields_by_name['incidenceMatrix']._options = None
   _RECORD_HISTORY.fields_by_name['incidenceMatrix']._serialized_options = b'\020\001'
+  _RECORD_HISTORY.fields_by_name['incidenceRowPtr']._options = None
+  _RECORD_HISTORY.fields_by_name['incidenceRowPtr']._serialized_options = b'\020\001'
+  _RECORD_HISTORY.fields_by_name['incidenceColIdx']._options = None
+  _RECORD_HISTORY.fields_by_name['incidenceColIdx']._serialized_options = b'\020\001'
+  _RECORD_HISTORY.fields_by_name['incidenceValues']._options = None
+  _RECORD_HISTORY.fields_by_name['incidenceValues']._serialized_options = b'\020\001'
+  _RECORD_HISTORY.fields_by_name['token_delta_idx']._options = None
+  _RECORD_HISTORY.fields_by_name['token_delta_idx']._serialized_options = b'\020\001'
+  _RECORD_HISTORY.fields_by_name['token_delta_val']._options = None
+  _RECORD_HISTORY.fields_by_name['token_delta_val']._serialized_options = b'\020\001'
+  _RECORD.fields_by_name['last_token']._options = None
+  _RECORD.fields_by_name['last_token']._serialized_options = b'\020\001'
   _RECORD._serialized_start=17
-  _RECORD._serialized_end=341
-  _RECORD_OWNER._serialized_start=127
-  _RECORD_OWNER._serialized_end=171
-  _RECORD_HISTORY._serialized_start=174
-  _RECORD_HISTORY._serialized_end=341
-  _RECORDCONTAINER._serialized_start=343
-  _RECORDCONTAINER._serialized_end=386
+  _RECORD._serialized_end=662
+  _RECORD_OWNER._serialized_start=259
+  _RECORD_OWNER._serialized_end=303
+  _RECORD_HISTORY._serialized_start=306
+  _RECORD_HISTORY._serialized_end=662
+  _HISTORYPAGE._serialized_start=664
+  _HISTORYPAGE._serialized_end=744
+  _HISTORYPAGECONTAINER._serialized_start=746
+  _HISTORYPAGECONTAINER._serialized_end=799
+  _RECORDCONTAINER._serialized_start=801
+  _RECORDCONTAINER._serialized_end=844
+  _RECORDTAG._serialized_start=846
+  _RECORDTAG._serialized_end=892
+  _RECORDTAGCONTAINER._serialized_start=894
+  _RECORDTAGCONTAINER._serialized_end=943
 # @@protoc_insertion_point(module_scope)
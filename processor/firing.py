@@ -0,0 +1,354 @@
+"""Petri net firing validation for UPDATE_RECORD transactions
+
+A marking M' is accepted as the successor of M when M' - M = C . sigma for a
+non-negative integer firing count vector sigma, where C is the incidence
+matrix of the net (places x transitions, packed row by row in
+incidenceMatrix).
+
+Single-transition firings, by far the most common case for RFID reads, are
+resolved with a hash lookup of the marking delta among the columns of C.
+Anything else goes through an exact search for sigma in integer arithmetic,
+so every validator reaches the same result whatever its platform. The search
+looks for at most MAX_FIRINGS firings per update and gives up, rejecting the
+update, after MAX_SEARCH_STEPS steps; both limits are part of the rules of
+the network and bound the work a single transaction can cause.
+"""
+
+import collections
+import functools
+
+import numpy as np
+
+from pnrdnet_encoding import incidence
+
+
+NET_CACHE_SIZE = 128
+# Transitions fired at most by one update, counting repeats
+MAX_FIRINGS = 32
+# Search steps spent at most on one update before rejecting it
+MAX_SEARCH_STEPS = 10000
+
+_model_nets = collections.OrderedDict()
+
+
+class PetriNet(object):
+    def __init__(self, places, transitions, incidence_matrix):
+        """
+        Args:
+            places (int): Number of places of the net
+            transitions (int): Number of transitions of the net
+            incidence_matrix (numpy.ndarray): Packed incidence matrix
+        """
+        self.places = places
+        self.transitions = transitions
+        self.incidence = incidence_matrix.reshape(places, transitions)
+        self._columns = {}
+        for index, column in enumerate(self.incidence.T):
+            self._columns.setdefault(column.tobytes(), index)
+
+        # Distinct non-zero columns, the only ones the search has to try,
+        # and the ones that add to or take from each place
+        self._firing_columns = []
+        seen = set()
+        for column in self.incidence.T.tolist():
+            if any(column) and tuple(column) not in seen:
+                seen.add(tuple(column))
+                self._firing_columns.append(column)
+        self._producers = [[] for _ in range(places)]
+        self._consumers = [[] for _ in range(places)]
+        for column in self._firing_columns:
+            for place, value in enumerate(column):
+                if value > 0:
+                    self._producers[place].append(column)
+                elif value < 0:
+                    self._consumers[place].append(column)
+        # What one firing adds to or takes from each place at most
+        self._most_added = [max([0] + [column[place] for column in columns])
+                            for place, columns in enumerate(self._producers)]
+        self._most_taken = [max([0] + [-column[place] for column in columns])
+                            for place, columns in enumerate(self._consumers)]
+
+    def is_reachable(self, previous_token, token):
+        """Checks a single marking update
+
+        Args:
+            previous_token (list of int): Marking before the update
+            token (list of int): Marking after the update
+
+        Returns:
+            bool: Whether token is reachable from previous_token
+        """
+        return bool(self.are_reachable([previous_token], [token])[0])
+
+    def are_reachable(self, previous_tokens, tokens):
+        """Checks many marking updates of this net at once
+
+        Args:
+            previous_tokens (list of list of int): Markings before the updates
+            tokens (list of list of int): Markings after the updates
+
+        Returns:
+            numpy.ndarray: One bool per update
+        """
+        valid = np.zeros(len(tokens), dtype=bool)
+        if not len(tokens):
+            return valid
+
+        sizes = [len(token) for token in previous_tokens] + \
+            [len(token) for token in tokens]
+        if any(size != self.places for size in sizes):
+            return valid
+
+        before = np.array(
+            [token[:] for token in previous_tokens], dtype=np.int64)
+        after = np.array([token[:] for token in tokens], dtype=np.int64)
+        deltas = after - before
+
+        pending = []
+        for index, delta in enumerate(deltas):
+            if not delta.any() or delta.tobytes() in self._columns:
+                valid[index] = True
+            else:
+                pending.append(index)
+
+        if pending:
+            valid[pending] = self._solve(deltas[pending])
+
+        valid &= (after >= 0).all(axis=1)
+        return valid
+
+    def _solve(self, deltas):
+        """Looks for non-negative integer firing vectors
+
+        Args:
+            deltas (numpy.ndarray): Marking deltas, one per row
+
+        Returns:
+            list of bool: One bool per delta
+        """
+        return [self._has_firing_vector(delta) for delta in deltas.tolist()]
+
+    def _has_firing_vector(self, delta):
+        """Depth-first search for a firing vector, one firing at a time.
+
+        While the residual delta is not zero, some column of a solution
+        must move its most constrained place in the right direction, so
+        only the columns that do are tried. Residuals are memoized, as the
+        order of the firings does not matter.
+
+        Args:
+            delta (list of int): Marking delta
+
+        Returns:
+            bool: Whether a firing vector of at most MAX_FIRINGS firings
+                was found within MAX_SEARCH_STEPS steps
+        """
+        # Largest number of remaining firings known to fail, per residual
+        failed = {}
+        steps = 0
+        # Frames of (residual, remaining firings, candidates, next candidate)
+        stack = [[tuple(delta), MAX_FIRINGS, None, 0]]
+        while stack:
+            frame = stack[-1]
+            residual, remaining, candidates, index = frame
+            if candidates is None:
+                if not any(residual):
+                    return True
+                candidates = self._candidates(residual, remaining)
+                if not candidates or failed.get(residual, -1) >= remaining:
+                    stack.pop()
+                    continue
+                steps += 1
+                if steps > MAX_SEARCH_STEPS:
+                    return False
+                frame[2] = candidates
+            if index == len(candidates):
+                failed[residual] = remaining
+                stack.pop()
+                continue
+
+            frame[3] = index + 1
+            stack.append([
+                tuple(value - entry
+                      for value, entry in zip(residual, candidates[index])),
+                remaining - 1,
+                None,
+                0])
+        return False
+
+    def _candidates(self, residual, remaining):
+        """Returns the columns one of which must fire next for residual to
+        be reached in at most remaining firings, none if it cannot be
+        """
+        best = None
+        for place, value in enumerate(residual):
+            if value > 0:
+                if value > remaining * self._most_added[place]:
+                    return []
+                columns = self._producers[place]
+            elif value < 0:
+                if -value > remaining * self._most_taken[place]:
+                    return []
+                columns = self._consumers[place]
+            else:
+                continue
+            if best is None or len(columns) < len(best):
+                best = columns
+        return best
+
+
+@functools.lru_cache(maxsize=NET_CACHE_SIZE)
+def _load_net(places, transitions, incidence_matrix):
+    return PetriNet(
+        places,
+        transitions,
+        np.array(incidence_matrix, dtype=np.int64))
+
+
+def get_net(places, transitions, incidence_matrix):
+    """Returns the PetriNet for a packed incidence matrix, reusing the ones
+    built for recently seen matrices
+
+    Args:
+        places (int): Number of places of the net
+        transitions (int): Number of transitions of the net
+        incidence_matrix (list of int): Packed incidence matrix
+
+    Returns:
+        PetriNet: The net, or None if the matrix does not match its size
+    """
+    if places <= 0 or transitions <= 0 or \
+            len(incidence_matrix) != places * transitions:
+        return None
+
+    # Slicing a repeated protobuf field is much cheaper than iterating it
+    return _load_net(places, transitions, tuple(incidence_matrix[:]))
+
+
+@functools.lru_cache(maxsize=NET_CACHE_SIZE)
+def _load_sparse_net(places, transitions, row_ptr, col_idx, values):
+    dense = np.zeros((places, transitions), dtype=np.int64)
+    rows = np.repeat(np.arange(places), np.diff(row_ptr))
+    dense[rows, list(col_idx)] = values
+    return PetriNet(places, transitions, dense)
+
+
+def get_sparse_net(places, transitions, row_ptr, col_idx, values):
+    """Returns the PetriNet for a CSR incidence matrix, reusing the ones
+    built for recently seen matrices
+
+    Returns:
+        PetriNet: The net, or None if the arrays do not match its size
+    """
+    if places <= 0 or transitions <= 0 or not incidence.is_valid_sparse(
+            places, transitions, row_ptr, col_idx, values):
+        return None
+
+    return _load_sparse_net(
+        places,
+        transitions,
+        tuple(row_ptr[:]),
+        tuple(col_idx[:]),
+        tuple(values[:]))
+
+
+def get_history_net(history):
+    """Returns the PetriNet of a history entry, whichever encoding its
+    incidence matrix uses
+
+    Args:
+        history (record_pb2.Record.History): The history entry, or any
+            message with the same net fields
+
+    Returns:
+        PetriNet: The net, or None if the matrix does not match its size
+    """
+    if incidence.is_sparse(history):
+        return get_sparse_net(
+            history.places,
+            history.transitions,
+            history.incidenceRowPtr,
+            history.incidenceColIdx,
+            history.incidenceValues)
+    return get_net(
+        history.places, history.transitions, history.incidenceMatrix)
+
+
+def get_model_net(net_model):
+    """Returns the PetriNet of a registered model. Models are immutable and
+    content-addressed, so their nets are cached by hash.
+
+    Args:
+        net_model (model_pb2.NetModel): The model, may be None
+
+    Returns:
+        PetriNet: The net, or None if there is no usable model
+    """
+    if net_model is None:
+        return None
+
+    net = _model_nets.get(net_model.model_hash)
+    if net is not None:
+        _model_nets.move_to_end(net_model.model_hash)
+        return net
+
+    net = get_history_net(net_model)
+    if net is not None:
+        _model_nets[net_model.model_hash] = net
+        if len(_model_nets) > NET_CACHE_SIZE:
+            _model_nets.popitem(last=False)
+    return net
+
+
+def is_valid_firing(places,
+                    transitions,
+                    incidence_matrix,
+                    previous_token,
+                    token):
+    """Checks that token is reachable from previous_token by firing the
+    transitions of the net
+
+    Args:
+        places (int): Number of places of the net
+        transitions (int): Number of transitions of the net
+        incidence_matrix (list of int): Packed incidence matrix
+        previous_token (list of int): Marking before the update
+        token (list of int): Marking after the update
+
+    Returns:
+        bool: Whether the update is a valid firing
+    """
+    net = get_net(places, transitions, incidence_matrix)
+    if net is None:
+        return False
+    return net.is_reachable(previous_token, token)
+
+
+def validate_firings(updates):
+    """Checks many updates at once, grouping them by net so every group is
+    validated with a single vectorized call
+
+    Args:
+        updates (list of tuple): (places, transitions, incidence_matrix,
+            previous_token, token) for each update
+
+    Returns:
+        list of bool: Whether each update is a valid firing
+    """
+    results = [False] * len(updates)
+    groups = {}
+    for index, (places, transitions, incidence_matrix, previous_token,
+                token) in enumerate(updates):
+        net = get_net(places, transitions, incidence_matrix)
+        if net is not None:
+            groups.setdefault(id(net), (net, []))[1].append(
+                (index, previous_token, token))
+
+    for net, members in groups.values():
+        valid = net.are_reachable(
+            [previous_token for _, previous_token, _ in members],
+            [token for _, _, token in members])
+        for (index, _, _), result in zip(members, valid):
+            results[index] = bool(result)
+
+    return results
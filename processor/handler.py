@@ -6,8 +6,12 @@ from sawtooth_sdk.processor.handler import TransactionHandler
 from sawtooth_sdk.processor.exceptions import InvalidTransaction
 
 from pnrdnet_addressing import addresser
+from pnrdnet_encoding import incidence
+from pnrdnet_encoding import model
 from pnrdnet_protobuf import payload_pb2
 
+from processor import firing
+from processor import metrics
 from processor.payload import PnrdNetPayload
 from processor.state import PnrdNetState
 
@@ -17,47 +21,161 @@ SYNC_TOLERANCE = 60 * 5
 
 class PnrdNetHandler(TransactionHandler):
 
+    def __init__(self, metrics=None):
+        """
+        Args:
+            metrics (processor.metrics.Metrics): Records latency, state I/O
+                and rejections of every transaction, None to disable
+        """
+        self._metrics = metrics
+
     @property
     def family_name(self):
         return addresser.FAMILY_NAME
 
     @property
     def family_versions(self):
-        return [addresser.FAMILY_VERSION]
+        return [addresser.LEGACY_FAMILY_VERSION, addresser.FAMILY_VERSION]
 
     @property
     def namespaces(self):
         return [addresser.NAMESPACE]
 
     def apply(self, transaction, context):
-        header = transaction.header
-        payload = PnrdNetPayload(transaction.payload)
-        state = PnrdNetState(context)
-
-        _validate_timestamp(payload.timestamp)
-
-        if payload.action == payload_pb2.PnrdPayload.CREATE_OWNER:
-            _create_owner(
-                state=state,
-                public_key=header.signer_public_key,
-                payload=payload)
-        elif payload.action == payload_pb2.PnrdPayload.CREATE_RECORD:
-            _create_record(
-                state=state,
-                public_key=header.signer_public_key,
-                payload=payload)
-        elif payload.action == payload_pb2.PnrdPayload.TRANSFER_RECORD:
-            _transfer_record(
-                state=state,
-                public_key=header.signer_public_key,
-                payload=payload)
-        elif payload.action == payload_pb2.PnrdPayload.UPDATE_RECORD:
-            _update_record(
-                state=state,
-                public_key=header.signer_public_key,
-                payload=payload)
-        else:
-            raise InvalidTransaction('Unhandled action')
+        if self._metrics is None:
+            _apply_transaction(
+                header=transaction.header,
+                payload=PnrdNetPayload(transaction.payload),
+                context=context)
+            return
+
+        start = time.perf_counter()
+        parse_seconds = 0
+        action = 'UNKNOWN'
+        context = metrics.MeteredContext(context)
+        try:
+            payload = PnrdNetPayload(transaction.payload)
+            parse_seconds = time.perf_counter() - start
+            action = _action_name(payload.action)
+            _apply_transaction(
+                header=transaction.header,
+                payload=payload,
+                context=context)
+        except InvalidTransaction as err:
+            self._metrics.reject(action, str(err))
+            raise
+        finally:
+            self._metrics.observe(
+                action=action,
+                apply_seconds=time.perf_counter() - start,
+                parse_seconds=parse_seconds,
+                context=context)
+
+
+def _action_name(action):
+    try:
+        return payload_pb2.PnrdPayload.Action.Name(action)
+    except ValueError:
+        return 'UNKNOWN'
+
+
+def _apply_transaction(header, payload, context):
+    state = PnrdNetState(
+        context,
+        legacy=header.family_version == addresser.LEGACY_FAMILY_VERSION)
+
+    if payload.action == payload_pb2.PnrdPayload.BATCH:
+        _apply_batch(
+            state=state,
+            public_key=header.signer_public_key,
+            payload=payload)
+    else:
+        _apply_action(
+            state=state,
+            public_key=header.signer_public_key,
+            payload=payload)
+
+    state.flush()
+
+
+def _apply_action(state, public_key, payload):
+    _validate_timestamp(payload.timestamp)
+
+    if payload.action == payload_pb2.PnrdPayload.CREATE_OWNER:
+        _create_owner(
+            state=state,
+            public_key=public_key,
+            payload=payload)
+    elif payload.action == payload_pb2.PnrdPayload.CREATE_RECORD:
+        _create_record(
+            state=state,
+            public_key=public_key,
+            payload=payload)
+    elif payload.action == payload_pb2.PnrdPayload.TRANSFER_RECORD:
+        _transfer_record(
+            state=state,
+            public_key=public_key,
+            payload=payload)
+    elif payload.action == payload_pb2.PnrdPayload.UPDATE_RECORD:
+        _update_record(
+            state=state,
+            public_key=public_key,
+            payload=payload)
+    elif payload.action == payload_pb2.PnrdPayload.CREATE_MODEL:
+        _create_model(
+            state=state,
+            payload=payload)
+    else:
+        raise InvalidTransaction('Unhandled action')
+
+
+def _apply_batch(state, public_key, payload):
+    """Applies the operations of a batch in order. State is read for all of
+    them upfront, grouped by address, and written once by the caller; any
+    invalid operation invalidates the whole transaction.
+    """
+    operations = [PnrdNetPayload.from_message(operation)
+                  for operation in payload.data.operations]
+    if not operations:
+        raise InvalidTransaction('Empty batch')
+
+    public_keys = set()
+    record_ids = set()
+    model_hashes = set()
+    tag_ids = set()
+    for operation in operations:
+        if operation.action == payload_pb2.PnrdPayload.BATCH:
+            raise InvalidTransaction('Nested batches are not allowed')
+        data = operation.data
+        if operation.action == payload_pb2.PnrdPayload.CREATE_OWNER:
+            public_keys.add(public_key)
+        elif operation.action == payload_pb2.PnrdPayload.CREATE_RECORD:
+            public_keys.add(public_key)
+            record_ids.add(data.record_id)
+            if not state.legacy:
+                tag_ids.add(data.tag_id)
+        elif operation.action == payload_pb2.PnrdPayload.UPDATE_RECORD:
+            record_ids.add(data.record_id)
+        elif operation.action == payload_pb2.PnrdPayload.TRANSFER_RECORD:
+            public_keys.add(data.receiving_owner)
+            record_ids.add(data.record_id)
+        if operation.action in (payload_pb2.PnrdPayload.CREATE_RECORD,
+                                payload_pb2.PnrdPayload.UPDATE_RECORD):
+            _validate_model_hash(data.model_hash)
+            model_hashes.update(_referenced_models(data))
+
+    state.prefetch(
+        public_keys=sorted(public_keys),
+        record_ids=sorted(record_ids),
+        model_hashes=sorted(model_hashes),
+        tag_ids=sorted(tag_ids))
+    state.prefetch_history(sorted(record_ids))
+
+    for operation in operations:
+        _apply_action(
+            state=state,
+            public_key=public_key,
+            payload=operation)
 
 
 def _create_owner(state, public_key, payload):
@@ -70,7 +188,42 @@ def _create_owner(state, public_key, payload):
         timestamp=payload.timestamp)
 
 
+def _create_model(state, payload):
+    data = payload.data
+    if data.places <= 0 or data.transitions <= 0:
+        raise InvalidTransaction('Model must have places and transitions')
+
+    _validate_incidence(data)
+    incidence_matrix = incidence.get_dense(data)
+    if len(incidence_matrix) != data.places * data.transitions:
+        raise InvalidTransaction(
+            'Incidence matrix does not match places and transitions')
+
+    model_hash = model.get_model_hash(
+        data.places, data.transitions, incidence_matrix)
+    if state.get_model(model_hash):
+        raise InvalidTransaction(
+            'Model {} already exists'.format(model_hash))
+
+    state.set_model(
+        model_hash=model_hash,
+        places=data.places,
+        transitions=data.transitions,
+        incidenceMatrix=data.incidenceMatrix,
+        incidenceRowPtr=data.incidenceRowPtr,
+        incidenceColIdx=data.incidenceColIdx,
+        incidenceValues=data.incidenceValues,
+        timestamp=payload.timestamp)
+
+
 def _create_record(state, public_key, payload):
+    _validate_model_hash(payload.data.model_hash)
+    state.prefetch(
+        public_keys=[public_key],
+        record_ids=[payload.data.record_id],
+        model_hashes=_referenced_models(payload.data),
+        tag_ids=[] if state.legacy else [payload.data.tag_id])
+
     if state.get_owner(public_key) is None:
         raise InvalidTransaction('Owner with the public key {} does '
                                  'not exist'.format(public_key))
@@ -84,6 +237,20 @@ def _create_record(state, public_key, payload):
 
     _validate_tag(payload.data.tag_id)
 
+    if state.legacy and payload.data.token_keyframe_interval:
+        raise InvalidTransaction(
+            'Token keyframes need family version {}'.format(
+                addresser.FAMILY_VERSION))
+
+    # Transactions of 0.1 do not declare the tag index, tags were not
+    # unique then
+    record_tag = None
+    if not state.legacy:
+        record_tag = state.get_record_tag(payload.data.tag_id)
+    if record_tag is not None:
+        raise InvalidTransaction('Tag {} belongs to the record {}'.format(
+            payload.data.tag_id, record_tag.record_id))
+
     state.set_record(
         public_key=public_key,
         record_id=payload.data.record_id,
@@ -91,14 +258,18 @@ def _create_record(state, public_key, payload):
         reader_id=payload.data.reader_id,
         ant_id=payload.data.ant_id,
         situation=payload.data.situation,
-        places=payload.data.places,
-        transitions=payload.data.transitions,
-        incidenceMatrix=payload.data.incidenceMatrix,
         token=payload.data.token,
-        timestamp=payload.timestamp)
+        timestamp=payload.timestamp,
+        token_keyframe_interval=payload.data.token_keyframe_interval,
+        validate_firing=payload.data.validate_firing,
+        **_get_net_fields(state, payload.data))
 
 
 def _transfer_record(state, public_key, payload):
+    state.prefetch(
+        public_keys=[payload.data.receiving_owner],
+        record_ids=[payload.data.record_id])
+
     if state.get_owner(payload.data.receiving_owner) is None:
         raise InvalidTransaction(
             'Owner with the public key {} does '
@@ -121,6 +292,11 @@ def _transfer_record(state, public_key, payload):
 
 
 def _update_record(state, public_key, payload):
+    _validate_model_hash(payload.data.model_hash)
+    state.prefetch(
+        record_ids=[payload.data.record_id],
+        model_hashes=_referenced_models(payload.data))
+
     record = state.get_record(payload.data.record_id)
     if record is None:
         raise InvalidTransaction('Record with the record id {} does not '
@@ -131,16 +307,74 @@ def _update_record(state, public_key, payload):
         raise InvalidTransaction(
             'Transaction signer is not the owner of the record')
 
+    if state.legacy and record.history_page_size:
+        raise InvalidTransaction(
+            'Record {} has a paged history, which family version {} does '
+            'not declare'.format(payload.data.record_id,
+                                 addresser.LEGACY_FAMILY_VERSION))
+
+    last_history = state.get_last_history(record)
+    if last_history is not None and not state.legacy and \
+            payload.timestamp < last_history.timestamp:
+        # Record reads bisect the history by timestamp, so it must stay
+        # in order. Transactions of 0.1 were not held to it.
+        raise InvalidTransaction(
+            'Timestamp {} is older than the last history entry of the '
+            'record, {}'.format(payload.timestamp, last_history.timestamp))
+
+    net_fields = _get_net_fields(state, payload.data)
+
+    if record.validate_firing and last_history is not None:
+        _validate_firing(
+            state=state,
+            data=payload.data,
+            previous_token=state.get_last_token(record),
+            token=payload.data.token)
+
     state.update_record(
         record_id=payload.data.record_id,
         reader_id=payload.data.reader_id,
         ant_id=payload.data.ant_id,
         situation=payload.data.situation,
-        places=payload.data.places,
-        transitions=payload.data.transitions,
-        incidenceMatrix=payload.data.incidenceMatrix,
         token=payload.data.token,
-        timestamp=payload.timestamp)
+        timestamp=payload.timestamp,
+        **net_fields)
+
+
+def _referenced_models(data):
+    return [data.model_hash] if data.model_hash else []
+
+
+def _get_net_fields(state, data):
+    """Returns the history fields describing the net of a create or update
+    action, taking them from the referenced model when there is one
+    """
+    if not data.model_hash:
+        _validate_incidence(data)
+        return {
+            'places': data.places,
+            'transitions': data.transitions,
+            'incidenceMatrix': data.incidenceMatrix,
+            'incidenceRowPtr': data.incidenceRowPtr,
+            'incidenceColIdx': data.incidenceColIdx,
+            'incidenceValues': data.incidenceValues,
+        }
+
+    if data.incidenceMatrix or incidence.is_sparse(data):
+        raise InvalidTransaction(
+            'Incidence matrix sent together with a model hash')
+
+    net_model = state.get_model(data.model_hash)
+    if net_model is None:
+        raise InvalidTransaction(
+            'Model {} does not exist'.format(data.model_hash))
+
+    return {
+        'places': net_model.places,
+        'transitions': net_model.transitions,
+        'incidenceMatrix': [],
+        'model_hash': data.model_hash,
+    }
 
 
 def _validate_record_owner(signer_public_key, record):
@@ -151,6 +385,44 @@ def _validate_record_owner(signer_public_key, record):
     return latest_owner == signer_public_key
 
 
+def _validate_firing(state, data, previous_token, token):
+    """Validates that the new token marking can be reached from the latest
+    marking of the record through the net of the update. The net of the
+    previous entry is not used, as the model it references is not among
+    the inputs of an update that switches to another net.
+    """
+    if data.model_hash:
+        net = firing.get_model_net(state.get_model(data.model_hash))
+    else:
+        net = firing.get_history_net(data)
+    if net is None or not net.is_reachable(previous_token, token):
+        raise InvalidTransaction(
+            'Token marking is not reachable from the previous marking')
+
+
+def _validate_incidence(data):
+    """Validates the sparse form of the incidence matrix, when it is used"""
+    if not incidence.is_sparse(data):
+        return
+
+    if data.incidenceMatrix:
+        raise InvalidTransaction(
+            'Incidence matrix sent in both dense and sparse form')
+
+    if not incidence.is_valid_sparse(
+            places=data.places,
+            transitions=data.transitions,
+            row_ptr=data.incidenceRowPtr,
+            col_idx=data.incidenceColIdx,
+            values=data.incidenceValues):
+        raise InvalidTransaction('Malformed sparse incidence matrix')
+
+
+def _validate_model_hash(model_hash):
+    if model_hash and not model.is_model_hash(model_hash):
+        raise InvalidTransaction('Malformed model hash')
+
+
 def _validate_tag(tag_id):
     if tag_id is None or tag_id == '':
         raise InvalidTransaction('Incorrect TAG')
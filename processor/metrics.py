@@ -0,0 +1,211 @@
+"""Per-action metrics of the transaction processor
+
+PnrdNetHandler records, for every applied transaction, the total apply
+latency, the payload parse time and the get_state/set_state calls, latency
+and bytes, labelled by action. Rejections are counted by action and reason.
+The metrics are kept in memory and served in the Prometheus text format by
+start_http_server. Nothing is recorded when the handler has no Metrics.
+"""
+
+import bisect
+import http.server
+import re
+import threading
+import time
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5)
+CALL_BUCKETS = (1, 2, 4, 8, 16, 32)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# Rejection reasons are label values, so their number is bounded
+MAX_REASONS = 64
+
+HISTOGRAMS = (
+    ('pnrdnet_apply_seconds', 'Total apply latency', LATENCY_BUCKETS),
+    ('pnrdnet_parse_seconds', 'Payload parse time', LATENCY_BUCKETS),
+    ('pnrdnet_get_state_calls', 'get_state calls per transaction',
+     CALL_BUCKETS),
+    ('pnrdnet_get_state_seconds', 'get_state latency per transaction',
+     LATENCY_BUCKETS),
+    ('pnrdnet_set_state_calls', 'set_state calls per transaction',
+     CALL_BUCKETS),
+    ('pnrdnet_set_state_seconds', 'set_state latency per transaction',
+     LATENCY_BUCKETS),
+    ('pnrdnet_state_read_bytes', 'State bytes read per transaction',
+     BYTE_BUCKETS),
+    ('pnrdnet_state_written_bytes', 'State bytes written per transaction',
+     BYTE_BUCKETS),
+)
+
+REJECTIONS = 'pnrdnet_rejected_transactions_total'
+
+# Record ids, public keys and hashes embedded in rejection messages
+_IDENTIFIER = re.compile(r'\S*\d\S*')
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MeteredContext(object):
+    """Wraps the transaction context to measure the state calls of one
+    transaction
+    """
+
+    def __init__(self, context):
+        self._context = context
+        self.get_state_calls = 0
+        self.get_state_seconds = 0
+        self.set_state_calls = 0
+        self.set_state_seconds = 0
+        self.read_bytes = 0
+        self.written_bytes = 0
+
+    def get_state(self, addresses, timeout=None):
+        start = time.perf_counter()
+        entries = self._context.get_state(addresses, timeout=timeout)
+        self.get_state_seconds += time.perf_counter() - start
+        self.get_state_calls += 1
+        self.read_bytes += sum(len(entry.data) for entry in entries)
+        return entries
+
+    def set_state(self, entries, timeout=None):
+        start = time.perf_counter()
+        addresses = self._context.set_state(entries, timeout=timeout)
+        self.set_state_seconds += time.perf_counter() - start
+        self.set_state_calls += 1
+        self.written_bytes += sum(len(data) for data in entries.values())
+        return addresses
+
+    def __getattr__(self, name):
+        return getattr(self._context, name)
+
+
+class Metrics(object):
+    """Thread-safe store of the processor metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._rejections = {}
+
+    def observe(self, action, apply_seconds, parse_seconds, context):
+        """Records one applied transaction
+
+        Args:
+            action (str): Name of the payload action
+            apply_seconds (float): Total apply latency
+            parse_seconds (float): Payload parse time
+            context (MeteredContext): The context of the transaction
+        """
+        values = (apply_seconds,
+                  parse_seconds,
+                  context.get_state_calls,
+                  context.get_state_seconds,
+                  context.set_state_calls,
+                  context.set_state_seconds,
+                  context.read_bytes,
+                  context.written_bytes)
+        with self._lock:
+            for (name, _, buckets), value in zip(HISTOGRAMS, values):
+                key = (name, action)
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(buckets)
+                histogram.observe(value)
+
+    def reject(self, action, reason):
+        """Counts an InvalidTransaction raised while applying a transaction
+
+        Args:
+            action (str): Name of the payload action
+            reason (str): Message of the exception
+        """
+        reason = _IDENTIFIER.sub('<id>', reason)
+        with self._lock:
+            if (action, reason) not in self._rejections and \
+                    len(self._rejections) >= MAX_REASONS:
+                reason = 'other'
+            key = (action, reason)
+            self._rejections[key] = self._rejections.get(key, 0) + 1
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, description, _ in HISTOGRAMS:
+                lines.append('# HELP {} {}'.format(name, description))
+                lines.append('# TYPE {} histogram'.format(name))
+                for (key, action), histogram in sorted(
+                        self._histograms.items()):
+                    if key != name:
+                        continue
+                    labels = 'action="{}"'.format(action)
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ('+Inf',),
+                                            histogram.counts):
+                        cumulative += count
+                        lines.append('{}_bucket{{{},le="{}"}} {}'.format(
+                            name, labels, bound, cumulative))
+                    lines.append('{}_sum{{{}}} {}'.format(
+                        name, labels, histogram.sum))
+                    lines.append('{}_count{{{}}} {}'.format(
+                        name, labels, histogram.count))
+
+            lines.append('# HELP {} Rejected transactions'.format(REJECTIONS))
+            lines.append('# TYPE {} counter'.format(REJECTIONS))
+            for (action, reason), count in sorted(self._rejections.items()):
+                lines.append('{}{{action="{}",reason="{}"}} {}'.format(
+                    REJECTIONS, action, _escape(reason), count))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def start_http_server(metrics, port, host='127.0.0.1'):
+    """Serves the metrics on http://host:port/metrics from a daemon thread
+
+    Args:
+        metrics (Metrics): The metrics to serve
+        port (int): Local port to listen on
+        host (str): Interface to listen on
+
+    Returns:
+        http.server.HTTPServer: The running server
+    """
+
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header(
+                'Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(
+        target=server.serve_forever, name='pnrdnet-metrics', daemon=True)
+    thread.start()
+    return server
@@ -24,6 +24,13 @@ class PnrdNetPayload(object):
         self._transaction = payload_pb2.PnrdPayload()
         self._transaction.ParseFromString(payload)
 
+    @classmethod
+    def from_message(cls, message):
+        """Wraps an already parsed PnrdPayload, such as a batch operation"""
+        payload = cls.__new__(cls)
+        payload._transaction = message
+        return payload
+
     @property
     def action(self):
         return self._transaction.action
@@ -50,6 +57,16 @@ class PnrdNetPayload(object):
                 payload_pb2.PnrdPayload.UPDATE_RECORD:
             return self._transaction.update_record
 
+        if self._transaction.HasField('create_model') and \
+            self._transaction.action == \
+                payload_pb2.PnrdPayload.CREATE_MODEL:
+            return self._transaction.create_model
+
+        if self._transaction.HasField('batch') and \
+            self._transaction.action == \
+                payload_pb2.PnrdPayload.BATCH:
+            return self._transaction.batch
+
         raise InvalidTransaction('Action does not match payload data')
 
     @property
@@ -1,13 +1,269 @@
 from pnrdnet_addressing import addresser
 
+from pnrdnet_protobuf import model_pb2
 from pnrdnet_protobuf import owner_pb2
 from pnrdnet_protobuf import record_pb2
 
 
+HISTORY_PAGE_SIZE = 64
+
+
 class PnrdNetState(object):
-    def __init__(self, context, timeout=2):
+    """Read-through, write-back view of the pnrd_net state for a single
+    transaction.
+
+    Every address is fetched from the validator at most once and kept as a
+    parsed container; writes only touch the cached containers and are sent
+    together by flush(). A new instance must be created for every
+    transaction.
+    """
+
+    def __init__(self, context, timeout=2, legacy=False):
+        """
+        Args:
+            context (sawtooth_sdk.processor.context.Context): The context of
+                the transaction
+            timeout (int): Seconds to wait for the validator
+            legacy (bool): Apply a transaction of the 0.1 family version,
+                which does not declare the history pages and the tag
+                index: the history of the records it creates and updates
+                stays inline and their tags are not indexed
+        """
         self._context = context
         self._timeout = timeout
+        self.legacy = legacy
+        self._containers = {}
+        self._dirty = set()
+
+    def prefetch(self,
+                 public_keys=(),
+                 record_ids=(),
+                 model_hashes=(),
+                 tag_ids=()):
+        """Loads the owner, record, model and tag containers in a single
+        get_state call
+
+        Args:
+            public_keys (list of str): Public keys of the owners to load
+            record_ids (list of str): Ids of the records to load
+            model_hashes (list of str): Hashes of the models to load
+            tag_ids (list of str): Tag ids whose index entries to load
+        """
+        addresses = dict.fromkeys(
+            addresser.get_owner_addresses(public_keys),
+            owner_pb2.OwnerContainer)
+        addresses.update(dict.fromkeys(
+            addresser.get_record_addresses(record_ids),
+            record_pb2.RecordContainer))
+        for model_hash in model_hashes:
+            addresses[addresser.get_model_address(model_hash)] = \
+                model_pb2.NetModelContainer
+        for tag_id in tag_ids:
+            addresses[addresser.get_tag_address(tag_id)] = \
+                record_pb2.RecordTagContainer
+        self._load(addresses)
+
+    def prefetch_history(self, record_ids):
+        """Loads the history pages that new entries of the records would be
+        appended to in a single get_state call, the first page for the
+        records that do not exist yet. The records themselves must already
+        be loaded.
+
+        Args:
+            record_ids (list of str): Ids of the records
+        """
+        if self.legacy:
+            return
+
+        addresses = {}
+        for record_id in record_ids:
+            record = self.get_record(record_id)
+            if record is None:
+                addresses[addresser.get_history_page_address(
+                    record_id, 0)] = record_pb2.HistoryPageContainer
+            elif record.history_page_size:
+                # The page holding the latest entry and the next one to
+                # append to, which are the same unless the latest is full
+                count = record.history_count
+                pages = {max(count - 1, 0) // record.history_page_size,
+                         count // record.history_page_size}
+                for page in pages:
+                    addresses[addresser.get_history_page_address(
+                        record_id, page)] = record_pb2.HistoryPageContainer
+        self._load(addresses)
+
+    def flush(self):
+        """Writes every modified container back to state in one set_state
+        call
+        """
+        if not self._dirty:
+            return
+
+        updated_state = {}
+        for address in self._dirty:
+            updated_state[address] = \
+                self._containers[address].SerializeToString()
+        self._context.set_state(updated_state, timeout=self._timeout)
+        self._dirty.clear()
+
+    def _load(self, addresses):
+        """Fetches the addresses that are not cached yet
+
+        Args:
+            addresses (dict): Container class keyed by state address
+        """
+        missing = [a for a in addresses if a not in self._containers]
+        if not missing:
+            return
+
+        state_entries = self._context.get_state(
+            addresses=missing, timeout=self._timeout)
+        for address in missing:
+            self._containers[address] = addresses[address]()
+        for entry in state_entries:
+            self._containers[entry.address].ParseFromString(entry.data)
+
+    def _get_container(self, address, container_class):
+        self._load({address: container_class})
+        return self._containers[address]
+
+    def _get_owner_container(self, public_key):
+        return self._get_container(
+            addresser.get_owner_address(public_key),
+            owner_pb2.OwnerContainer)
+
+    def _get_record_container(self, record_id):
+        return self._get_container(
+            addresser.get_record_address(record_id),
+            record_pb2.RecordContainer)
+
+    def _get_tag_container(self, tag_id):
+        return self._get_container(
+            addresser.get_tag_address(tag_id),
+            record_pb2.RecordTagContainer)
+
+    def _get_history_page(self, record_id, page):
+        """Gets a history page of a record, adding an empty one to its
+        container when the page does not exist yet
+        """
+        container = self._get_container(
+            addresser.get_history_page_address(record_id, page),
+            record_pb2.HistoryPageContainer)
+        for history_page in container.entries:
+            if history_page.record_id == record_id and \
+                    history_page.page == page:
+                return history_page
+
+        return container.entries.add(record_id=record_id, page=page)
+
+    def _append_history(self, record, entries):
+        """Appends history entries to the paged history of a record. Only
+        the page being appended to is read and written.
+        """
+        first = record.history_count // record.history_page_size
+        last = (record.history_count + len(entries) - 1) // \
+            record.history_page_size
+        self._load({
+            addresser.get_history_page_address(record.record_id, page):
+                record_pb2.HistoryPageContainer
+            for page in range(first, last + 1)})
+
+        for history in entries:
+            self._encode_token(record, history)
+            page = record.history_count // record.history_page_size
+            self._get_history_page(record.record_id, page).entries.extend(
+                [history])
+            self._dirty.add(
+                addresser.get_history_page_address(record.record_id, page))
+            record.history_count += 1
+
+    def get_model(self, model_hash):
+        """Gets the net model with the given hash
+
+        Args:
+            model_hash (str): The content hash of the model
+
+        Returns:
+            model_pb2.NetModel: Model with the provided hash
+        """
+        container = self._get_container(
+            addresser.get_model_address(model_hash),
+            model_pb2.NetModelContainer)
+        for net_model in container.entries:
+            if net_model.model_hash == model_hash:
+                return net_model
+
+        return None
+
+    def set_model(self,
+                  model_hash,
+                  places,
+                  transitions,
+                  incidenceMatrix,
+                  incidenceRowPtr,
+                  incidenceColIdx,
+                  incidenceValues,
+                  timestamp):
+        """Registers a new net model in state
+
+        Args:
+            model_hash (str): The content hash of the model
+            places (int): Number of places of the net
+            transitions (int): Number of transitions of the net
+            timestamp (int): Unix UTC timestamp of when the model was created
+        """
+        address = addresser.get_model_address(model_hash)
+        net_model = model_pb2.NetModel(
+            model_hash=model_hash,
+            places=places,
+            transitions=transitions,
+            incidenceMatrix=incidenceMatrix,
+            incidenceRowPtr=incidenceRowPtr,
+            incidenceColIdx=incidenceColIdx,
+            incidenceValues=incidenceValues,
+            timestamp=timestamp)
+        container = self._get_container(address, model_pb2.NetModelContainer)
+        container.entries.extend([net_model])
+        self._dirty.add(address)
+
+    def _encode_token(self, record, history):
+        """Replaces the marking of a new history entry by its delta against
+        the previous marking, unless the entry is a keyframe or the record
+        does not use the delta encoding
+        """
+        interval = record.token_keyframe_interval
+        if not interval:
+            return
+
+        previous = record.last_token[:]
+        token = history.token[:]
+        record.last_token[:] = token
+
+        if record.history_count % interval == 0 or \
+                len(previous) != len(token):
+            return
+
+        changed = [i for i, (before, after) in enumerate(zip(previous, token))
+                   if before != after]
+        del history.token[:]
+        history.token_is_delta = True
+        history.token_delta_idx.extend(changed)
+        history.token_delta_val.extend(token[i] for i in changed)
+
+    def get_last_token(self, record):
+        """Gets the latest full token marking of a record
+
+        Args:
+            record (record_pb2.Record): The record
+
+        Returns:
+            list of int: The marking, empty if the record has no history
+        """
+        if record.token_keyframe_interval:
+            return record.last_token[:]
+
+        last_history = self.get_last_history(record)
+        return last_history.token[:] if last_history is not None else []
 
     def get_owner(self, public_key):
         """Gets the owner associated with the public_key
@@ -18,15 +274,10 @@ class PnrdNetState(object):
         Returns:
             owner_pb2.Owner: Agent with the provided public_key
         """
-        address = addresser.get_owner_address(public_key)
-        state_entries = self._context.get_state(
-            addresses=[address], timeout=self._timeout)
-        if state_entries:
-            container = owner_pb2.OwnerContainer()
-            container.ParseFromString(state_entries[0].data)
-            for owner in container.entries:
-                if owner.public_key == public_key:
-                    return owner
+        container = self._get_owner_container(public_key)
+        for owner in container.entries:
+            if owner.public_key == public_key:
+                return owner
 
         return None
 
@@ -38,21 +289,11 @@ class PnrdNetState(object):
             name (str): The human-readable name of the agent
             timestamp (int): Unix UTC timestamp of when the agent was created
         """
-        address = addresser.get_owner_address(public_key)
         owner = owner_pb2.Owner(
             public_key=public_key, name=name, timestamp=timestamp)
-        container = owner_pb2.OwnerContainer()
-        state_entries = self._context.get_state(
-            addresses=[address], timeout=self._timeout)
-        if state_entries:
-            container.ParseFromString(state_entries[0].data)
-
+        container = self._get_owner_container(public_key)
         container.entries.extend([owner])
-        data = container.SerializeToString()
-
-        updated_state = {}
-        updated_state[address] = data
-        self._context.set_state(updated_state, timeout=self._timeout)
+        self._dirty.add(addresser.get_owner_address(public_key))
 
     def get_record(self, record_id):
         """Gets the record associated with the record_id
@@ -63,18 +304,49 @@ class PnrdNetState(object):
         Returns:
             record_pb2.Record: Record with the provided record_id
         """
-        address = addresser.get_record_address(record_id)
-        state_entries = self._context.get_state(
-            addresses=[address], timeout=self._timeout)
-        if state_entries:
-            container = record_pb2.RecordContainer()
-            container.ParseFromString(state_entries[0].data)
-            for record in container.entries:
-                if record.record_id == record_id:
-                    return record
+        container = self._get_record_container(record_id)
+        for record in container.entries:
+            if record.record_id == record_id:
+                return record
 
         return None
 
+    def get_record_tag(self, tag_id):
+        """Gets the tag index entry of a tag id
+
+        Args:
+            tag_id (str): The tag id
+
+        Returns:
+            record_pb2.RecordTag: The entry naming the record of the tag,
+                None if no record has the tag
+        """
+        container = self._get_tag_container(tag_id)
+        for record_tag in container.entries:
+            if record_tag.tag_id == tag_id:
+                return record_tag
+
+        return None
+
+    def get_last_history(self, record):
+        """Gets the most recent history entry of a record
+
+        Args:
+            record (record_pb2.Record): The record
+
+        Returns:
+            record_pb2.Record.History: The latest entry, if any
+        """
+        if not record.history_page_size:
+            return record.history[-1] if record.history else None
+
+        if not record.history_count:
+            return None
+
+        page = (record.history_count - 1) // record.history_page_size
+        entries = self._get_history_page(record.record_id, page).entries
+        return entries[-1] if entries else None
+
     def set_record(self,
                    public_key,
                    reader_id,
@@ -86,7 +358,13 @@ class PnrdNetState(object):
                    token,
                    record_id,
                    tag_id,
-                   timestamp):
+                   timestamp,
+                   incidenceRowPtr=(),
+                   incidenceColIdx=(),
+                   incidenceValues=(),
+                   model_hash='',
+                   token_keyframe_interval=0,
+                   validate_firing=False):
         """Creates a new record in state
 
         Args:
@@ -96,7 +374,6 @@ class PnrdNetState(object):
             record_id (str): Unique ID of the record
             timestamp (int): Unix UTC timestamp of when the agent was created
         """
-        address = addresser.get_record_address(record_id)
         owner = record_pb2.Record.Owner(
             owner_id=public_key,
             timestamp=timestamp)
@@ -107,42 +384,44 @@ class PnrdNetState(object):
             places=places,
             transitions=transitions,
             incidenceMatrix=incidenceMatrix,
+            incidenceRowPtr=incidenceRowPtr,
+            incidenceColIdx=incidenceColIdx,
+            incidenceValues=incidenceValues,
+            model_hash=model_hash,
             token=token,
             timestamp=timestamp)
         record = record_pb2.Record(
             record_id=record_id,
             tag_id=tag_id,
             owners=[owner],
-            history=[history])
-        container = record_pb2.RecordContainer()
-        state_entries = self._context.get_state(
-            addresses=[address], timeout=self._timeout)
-        if state_entries:
-            container.ParseFromString(state_entries[0].data)
+            token_keyframe_interval=token_keyframe_interval,
+            validate_firing=validate_firing)
+        if self.legacy:
+            record.history.extend([history])
+        else:
+            record.history_page_size = HISTORY_PAGE_SIZE
+            self._append_history(record, [history])
+        container = self._get_record_container(record_id)
         container.entries.extend([record])
-        data = container.SerializeToString()
+        self._dirty.add(addresser.get_record_address(record_id))
 
-        updated_state = {}
-        updated_state[address] = data
-        self._context.set_state(updated_state, timeout=self._timeout)
+        if self.legacy:
+            return
+
+        # Flushed with the record, so the index never names a record that
+        # was not created
+        tag_container = self._get_tag_container(tag_id)
+        tag_container.entries.add(tag_id=tag_id, record_id=record_id)
+        self._dirty.add(addresser.get_tag_address(tag_id))
 
     def transfer_record(self, receiving_owner, record_id, timestamp):
         owner = record_pb2.Record.Owner(
             owner_id=receiving_owner,
             timestamp=timestamp)
-        address = addresser.get_record_address(record_id)
-        container = record_pb2.RecordContainer()
-        state_entries = self._context.get_state(
-            addresses=[address], timeout=self._timeout)
-        if state_entries:
-            container.ParseFromString(state_entries[0].data)
-            for record in container.entries:
-                if record.record_id == record_id:
-                    record.owners.extend([owner])
-        data = container.SerializeToString()
-        updated_state = {}
-        updated_state[address] = data
-        self._context.set_state(updated_state, timeout=self._timeout)
+        record = self.get_record(record_id)
+        if record is not None:
+            record.owners.extend([owner])
+            self._dirty.add(addresser.get_record_address(record_id))
 
     def update_record(self,
                       reader_id,
@@ -153,7 +432,11 @@ class PnrdNetState(object):
                       incidenceMatrix,
                       token,
                       record_id,
-                      timestamp):
+                      timestamp,
+                      incidenceRowPtr=(),
+                      incidenceColIdx=(),
+                      incidenceValues=(),
+                      model_hash=''):
         history = record_pb2.Record.History(
             reader_id=reader_id,
             ant_id=ant_id,
@@ -161,18 +444,23 @@ class PnrdNetState(object):
             places=places,
             transitions=transitions,
             incidenceMatrix=incidenceMatrix,
+            incidenceRowPtr=incidenceRowPtr,
+            incidenceColIdx=incidenceColIdx,
+            incidenceValues=incidenceValues,
+            model_hash=model_hash,
             token=token,
             timestamp=timestamp)
-        address = addresser.get_record_address(record_id)
-        container = record_pb2.RecordContainer()
-        state_entries = self._context.get_state(
-            addresses=[address], timeout=self._timeout)
-        if state_entries:
-            container.ParseFromString(state_entries[0].data)
-            for record in container.entries:
-                if record.record_id == record_id:
-                    record.history.extend([history])
-        data = container.SerializeToString()
-        updated_state = {}
-        updated_state[address] = data
-        self._context.set_state(updated_state, timeout=self._timeout)
+        record = self.get_record(record_id)
+        if record is not None:
+            if self.legacy:
+                record.history.extend([history])
+                self._dirty.add(addresser.get_record_address(record_id))
+                return
+            if not record.history_page_size:
+                # Records created before paging move their inline history
+                # to pages on their first update
+                record.history_page_size = HISTORY_PAGE_SIZE
+                self._append_history(record, record.history)
+                del record.history[:]
+            self._append_history(record, [history])
+            self._dirty.add(addresser.get_record_address(record_id))
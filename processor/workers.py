@@ -0,0 +1,154 @@
+"""Runs several transaction processor processes against one validator
+
+Each worker is a separate Python process with its own TransactionProcessor
+and PnrdNetHandler, so apply() throughput scales past a single core. The
+validator balances transactions between the processors registered for the
+family.
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+from sawtooth_sdk.processor.core import TransactionProcessor
+from sawtooth_sdk.processor.log import init_console_logging
+
+from processor import metrics
+from processor.handler import PnrdNetHandler
+
+
+LOGGER = logging.getLogger(__name__)
+
+RESTART_DELAY = 1
+SHUTDOWN_TIMEOUT = 5
+
+
+class BoundedTransactionProcessor(TransactionProcessor):
+    """TransactionProcessor that tells the validator how many transactions
+    it accepts in flight (max_occupancy of the registration request)
+    """
+
+    def __init__(self, url, max_queue=None):
+        super().__init__(url=url)
+        self._max_queue = max_queue
+
+    def _register_requests(self):
+        for request in super()._register_requests():
+            if self._max_queue:
+                request.max_occupancy = self._max_queue
+            yield request
+
+
+def create_handler(metrics_port=None):
+    """Creates the PnrdNetHandler, serving its metrics on metrics_port when
+    one is given
+
+    Args:
+        metrics_port (int): Local port of the Prometheus endpoint, None to
+            disable the metrics
+
+    Returns:
+        PnrdNetHandler: The handler
+    """
+    handler_metrics = None
+    if metrics_port:
+        handler_metrics = metrics.Metrics()
+        metrics.start_http_server(handler_metrics, metrics_port)
+        LOGGER.info('Serving metrics on port %s', metrics_port)
+
+    return PnrdNetHandler(metrics=handler_metrics)
+
+
+def run_processor(url,
+                  max_queue=None,
+                  metrics_port=None,
+                  verbose=0):
+    """Runs one transaction processor until it is interrupted
+
+    Args:
+        url (str): Endpoint for the validator connection
+        max_queue (int): Transactions accepted in flight, None for the
+            validator default
+        metrics_port (int): See create_handler
+        verbose (int): Console logging verbosity
+    """
+    init_console_logging(verbose_level=verbose)
+    processor = BoundedTransactionProcessor(url=url, max_queue=max_queue)
+    try:
+        processor.add_handler(create_handler(metrics_port=metrics_port))
+        processor.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        processor.stop()
+
+
+class WorkerSupervisor(object):
+    """Keeps a fixed number of worker processes running, restarting the
+    ones that exit, and stops all of them on SIGINT or SIGTERM. Worker i
+    serves its metrics on metrics_port + i.
+    """
+
+    def __init__(self, workers, worker_kwargs):
+        """
+        Args:
+            workers (int): Number of worker processes
+            worker_kwargs (dict): Keyword arguments for run_processor
+        """
+        self._workers = workers
+        self._worker_kwargs = worker_kwargs
+        self._processes = {}
+        self._stopping = False
+        self._mp = multiprocessing.get_context('spawn')
+
+    def _start_worker(self, index):
+        kwargs = dict(self._worker_kwargs)
+        if kwargs.get('metrics_port'):
+            kwargs['metrics_port'] += index
+        process = self._mp.Process(
+            target=run_processor,
+            kwargs=kwargs,
+            name='pnrdnet-worker-{}'.format(index),
+            daemon=True)
+        process.start()
+        self._processes[index] = process
+        LOGGER.info('Started worker %s (pid %s)', index, process.pid)
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGTERM, self._request_stop)
+
+        for index in range(self._workers):
+            self._start_worker(index)
+
+        while not self._stopping:
+            for index, process in list(self._processes.items()):
+                if not process.is_alive() and not self._stopping:
+                    LOGGER.warning(
+                        'Worker %s (pid %s) exited with code %s, restarting',
+                        index, process.pid, process.exitcode)
+                    time.sleep(RESTART_DELAY)
+                    self._start_worker(index)
+            time.sleep(0.5)
+
+        self.stop()
+
+    def stop(self):
+        """Interrupts every worker so it unregisters from the validator,
+        terminating the ones that do not exit in time
+        """
+        for process in self._processes.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGINT)
+
+        deadline = time.time() + SHUTDOWN_TIMEOUT
+        for process in self._processes.values():
+            process.join(max(0, deadline - time.time()))
+            if process.is_alive():
+                process.terminate()
+                process.join()
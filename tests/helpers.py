@@ -0,0 +1,172 @@
+"""Applies transactions to an in-memory state, the way the validator would"""
+
+import time
+
+from sawtooth_sdk.processor.exceptions import AuthorizationException
+from sawtooth_sdk.protobuf import processor_pb2
+from sawtooth_sdk.protobuf import state_context_pb2
+from sawtooth_sdk.protobuf import transaction_pb2
+from sawtooth_signing import create_context
+from sawtooth_signing import CryptoFactory
+
+from pnrdnet_addressing import addresser
+from pnrdnet_api import decoding
+from pnrdnet_api.dispatcher import transaction_creation
+from pnrdnet_protobuf import record_pb2
+
+from processor.handler import PnrdNetHandler
+
+
+class FakeContext(object):
+    """In-memory stand-in of sawtooth_sdk.processor.context.Context. Like
+    the validator, it refuses the addresses a transaction did not declare.
+    """
+
+    def __init__(self, state, inputs, outputs):
+        """
+        Args:
+            state (dict): State data keyed by address
+            inputs (list of str): Addresses or prefixes that can be read
+            outputs (list of str): Addresses or prefixes that can be written
+        """
+        self._state = state
+        self._inputs = inputs
+        self._outputs = outputs
+        self.reads = []
+        self.writes = []
+        self.set_state_calls = 0
+
+    def get_state(self, addresses, timeout=None):
+        _check_declared(addresses, self._inputs, 'read')
+        self.reads.extend(addresses)
+        return [
+            state_context_pb2.TpStateEntry(
+                address=address, data=self._state[address])
+            for address in addresses if self._state.get(address)]
+
+    def set_state(self, entries, timeout=None):
+        _check_declared(entries, self._outputs, 'write')
+        self.writes.extend(entries)
+        self.set_state_calls += 1
+        self._state.update(entries)
+        return list(entries)
+
+
+def _check_declared(addresses, declared, access):
+    for address in addresses:
+        if not any(address.startswith(prefix) for prefix in declared):
+            raise AuthorizationException(
+                'Tried to {} undeclared address {}'.format(access, address))
+
+
+class Ledger(object):
+    """Signs transactions with the API builders and applies them to a
+    shared state
+    """
+
+    def __init__(self):
+        context = create_context('secp256k1')
+        self._factory = CryptoFactory(context)
+        self._batch_signer = self._factory.new_signer(
+            context.new_random_private_key())
+        self.handler = PnrdNetHandler()
+        self.state = {}
+        self.timestamp = int(time.time()) - 60
+
+    def new_signer(self):
+        return self._factory.new_signer(
+            self._factory.context.new_random_private_key())
+
+    def apply(self, batch, legacy=False):
+        """Applies the transaction of a batch
+
+        Args:
+            legacy (bool): Apply it the way the builders of family version
+                0.1 declared it, with owner and record addresses only
+
+        Returns:
+            FakeContext: The context the transaction was applied with
+        """
+        transaction = batch.transactions[0]
+        header = transaction_pb2.TransactionHeader()
+        header.ParseFromString(transaction.header)
+        if legacy:
+            header.family_version = addresser.LEGACY_FAMILY_VERSION
+            for addresses in (header.inputs, header.outputs):
+                addresses[:] = [
+                    address for address in addresses
+                    if addresser.get_address_type(address) in (
+                        addresser.AddressSpace.OWNER,
+                        addresser.AddressSpace.RECORD)]
+        context = FakeContext(self.state, header.inputs, header.outputs)
+        self.handler.apply(
+            processor_pb2.TpProcessRequest(
+                header=header,
+                payload=transaction.payload,
+                signature=transaction.header_signature),
+            context)
+        return context
+
+    def run(self, signer, action, legacy=False, **kwargs):
+        """Applies a single operation, see make_operation_transaction"""
+        self.timestamp += 1
+        kwargs['action'] = action
+        return self.apply(transaction_creation.make_operation_transaction(
+            transaction_signer=signer,
+            batch_signer=self._batch_signer,
+            operation=kwargs,
+            timestamp=self.timestamp), legacy=legacy)
+
+    def run_batch(self, signer, operations):
+        """Applies several operations in one BATCH transaction"""
+        self.timestamp += 1
+        return self.apply(transaction_creation.make_batch_transaction(
+            transaction_signer=signer,
+            batch_signer=self._batch_signer,
+            operations=operations,
+            timestamp=self.timestamp))
+
+    def get_record(self, record_id):
+        container = record_pb2.RecordContainer()
+        container.ParseFromString(
+            self.state.get(addresser.get_record_address(record_id), b''))
+        for record in container.entries:
+            if record.record_id == record_id:
+                return record
+        return None
+
+    def get_history(self, record_id):
+        """Returns the stored history entries of a record, oldest first"""
+        prefix = addresser.get_history_prefix(record_id)
+        return decoding.parse_history_pages(record_id, [
+            {'address': address, 'data': data}
+            for address, data in self.state.items()
+            if address.startswith(prefix)])
+
+
+def net_fields(incidence=None, model_hash=None, places=2, transitions=2):
+    """The net arguments of a create or update operation"""
+    if model_hash:
+        return {'places': 0, 'transitions': 0, 'incidenceMatrix': [],
+                'model_hash': model_hash}
+    return {'places': places, 'transitions': transitions,
+            'incidenceMatrix': incidence}
+
+
+def create_record(token, record_id='record', tag_id=None,
+                  token_keyframe_interval=0, validate_firing=False, **net):
+    """A create_record operation, tagged tag-<record_id> by default"""
+    return dict(
+        action='create_record', reader_id='reader', ant_id='antenna',
+        situation='created', token=token, record_id=record_id,
+        tag_id=tag_id or 'tag-' + record_id,
+        token_keyframe_interval=token_keyframe_interval,
+        validate_firing=validate_firing, **net_fields(**net))
+
+
+def update_record(token, record_id='record', situation='updated', **net):
+    """An update_record operation"""
+    return dict(
+        action='update_record', reader_id='reader', ant_id='antenna',
+        situation=situation, token=token, record_id=record_id,
+        **net_fields(**net))
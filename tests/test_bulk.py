@@ -0,0 +1,137 @@
+import asyncio
+import queue
+import threading
+import time
+
+import pytest
+
+from sawtooth_sdk.protobuf import batch_pb2
+
+from pnrdnet_api.dispatcher import bulk
+from pnrdnet_api.dispatcher.AsyncDispatcher import AsyncDispatcher
+from pnrdnet_api.dispatcher.Dispatcher import Dispatcher
+
+
+def _batch(name):
+    return batch_pb2.Batch(header_signature=name)
+
+
+def _fake_dispatcher(cls):
+    """A dispatcher signing into named batches and recording the
+    BatchLists it sends, with the time they were sent at
+    """
+    dispatcher = cls.__new__(cls)
+    dispatcher._signing_pool = None
+    dispatcher._max_batches = bulk.BULK_MAX_BATCHES
+    dispatcher.sent = []
+
+    def send_bulk(pending, wait):
+        dispatcher.sent.append((time.monotonic(), len(pending)))
+        return bulk.bulk_results(pending, {}, {})
+
+    def make_batch(make_transaction, private_key, operation, timestamp):
+        return _batch(operation['record_id'])
+
+    dispatcher._send_bulk = send_bulk
+    dispatcher._make_batch = make_batch
+    return dispatcher
+
+
+def _operation(record_id):
+    return 'key', {'action': 'create_record', 'record_id': record_id}, 1
+
+
+def test_batches_sent_at_size():
+    pending = bulk.BulkBatches(max_batches=2, max_delay=60)
+    assert pending.time_left() is None
+    assert not pending.add(batch=_batch('a'))
+    assert not pending.add(error=ValueError())
+    assert pending.add(batch=_batch('b'))
+    assert len(pending.take()) == 3
+    assert pending.time_left() is None
+
+
+def test_batches_due_after_delay():
+    pending = bulk.BulkBatches(max_delay=0.05)
+    pending.add(batch=_batch('a'))
+    assert 0 < pending.time_left() <= 0.05
+    time.sleep(0.06)
+    assert pending.time_left() == 0
+
+
+def test_reader_times_out_and_ends():
+    released = threading.Event()
+
+    def items():
+        yield 1
+        released.wait(5)
+        yield 2
+
+    reader = bulk.BulkReader(items())
+    assert reader.get(1) == 1
+    with pytest.raises(queue.Empty):
+        reader.get(0.05)
+    released.set()
+    assert reader.get(1) == 2
+    assert reader.get(1) is bulk.END
+
+
+def test_reader_raises_stream_errors():
+    def items():
+        yield 1
+        raise IOError('disconnected')
+
+    reader = bulk.BulkReader(items())
+    assert reader.get(1) == 1
+    with pytest.raises(IOError):
+        reader.get(1)
+
+
+def test_idle_stream_is_sent_after_delay():
+    dispatcher = _fake_dispatcher(Dispatcher)
+    released = threading.Event()
+
+    def items():
+        yield _operation('first')
+        released.wait(5)
+        yield _operation('second')
+
+    start = time.monotonic()
+    results = dispatcher.send_bulk_transactions(items())
+    assert next(results)['batch_id'] == 'first'
+    assert not released.is_set()
+    assert dispatcher.sent[0][0] - start < bulk.BULK_MAX_DELAY + 1
+    released.set()
+    assert [result['batch_id'] for result in results] == ['second']
+
+
+def test_async_idle_stream_is_sent_after_delay():
+    dispatcher = _fake_dispatcher(AsyncDispatcher)
+
+    async def send_bulk(pending, wait):
+        dispatcher.sent.append((time.monotonic(), len(pending)))
+        return list(bulk.bulk_results(pending, {}, {}))
+
+    async def sign(make_transaction, private_key, operation, timestamp):
+        return _batch(operation['record_id'])
+
+    dispatcher._send_bulk = send_bulk
+    dispatcher._sign = sign
+
+    async def run():
+        released = asyncio.Event()
+
+        async def items():
+            yield _operation('first')
+            await released.wait()
+            yield _operation('second')
+
+        start = time.monotonic()
+        results = dispatcher.send_bulk_transactions(items()).__aiter__()
+        first = await results.__anext__()
+        assert first['batch_id'] == 'first'
+        assert dispatcher.sent[0][0] - start < bulk.BULK_MAX_DELAY + 1
+        released.set()
+        return [result['batch_id'] async for result in results]
+
+    assert asyncio.run(run()) == ['second']
@@ -0,0 +1,126 @@
+import pytest
+
+from pnrdnet_api import decoding
+from pnrdnet_protobuf import record_pb2
+
+
+def _history(count, keyframe_interval=0):
+    """Entries with timestamps 10, 20, ... and markings [i, -i]"""
+    history = []
+    for index in range(count):
+        entry = record_pb2.Record.History(
+            situation=str(index), timestamp=10 * (index + 1))
+        if keyframe_interval and index % keyframe_interval:
+            entry.token_is_delta = True
+            entry.token_delta_idx.extend([0, 1])
+            entry.token_delta_val.extend([index, -index])
+        else:
+            entry.token.extend([index, -index])
+        history.append(entry)
+    return history
+
+
+def _situations(entries):
+    return [int(entry['situation']) for entry in entries]
+
+
+def test_offset_and_limit():
+    entries, pagination = decoding.HistoryWindow(offset=3, limit=4).decode(
+        _history(10))
+    assert _situations(entries) == [3, 4, 5, 6]
+    assert pagination == {'total': 10, 'offset': 3, 'limit': 4, 'next': 7}
+
+
+def test_last_page_has_no_next():
+    entries, pagination = decoding.HistoryWindow(offset=8, limit=4).decode(
+        _history(10))
+    assert _situations(entries) == [8, 9]
+    assert pagination['next'] is None
+
+
+def test_last():
+    entries, pagination = decoding.HistoryWindow(last=3).decode(_history(10))
+    assert _situations(entries) == [7, 8, 9]
+    assert pagination == {'total': 10, 'offset': 7, 'limit': 3,
+                          'next': None}
+
+
+def test_since_until():
+    window = decoding.HistoryWindow(since=30, until=70, limit=2)
+    entries, pagination = window.decode(_history(10))
+    assert _situations(entries) == [2, 3]
+    assert pagination == {'total': 4, 'offset': 0, 'limit': 2, 'next': 2}
+
+
+def test_since_until_out_of_order():
+    history = _history(6)
+    history[1].timestamp, history[4].timestamp = 50, 20
+    window = decoding.HistoryWindow(since=20, until=40)
+    entries, pagination = window.decode(history)
+    assert _situations(entries) == [2, 4]
+    assert pagination == {'total': 2, 'offset': 0, 'limit': None,
+                          'next': None}
+
+    entries, pagination = decoding.HistoryWindow(since=45, last=1).decode(
+        history)
+    assert _situations(entries) == [5]
+    assert pagination['total'] == 2
+
+
+def test_offset_past_the_end():
+    entries, pagination = decoding.HistoryWindow(offset=20).decode(
+        _history(5))
+    assert entries == []
+    assert pagination['offset'] == 5
+
+
+def test_window_rebuilds_delta_markings():
+    entries, _ = decoding.HistoryWindow(offset=5, limit=3).decode(
+        _history(12, keyframe_interval=4))
+    assert [entry['token'] for entry in entries] == \
+        [[5, -5], [6, -6], [7, -7]]
+    assert not any(entry['token_is_delta'] for entry in entries)
+
+
+def test_iter_markings_leaves_entries_unchanged():
+    history = [decoding._convert_proto_to_dict(entry)
+               for entry in _history(3, keyframe_interval=4)]
+    markings = [entry['token'] for entry in decoding.iter_markings(history)]
+    assert markings == [[0, 0], [1, -1], [2, -2]]
+    assert [entry['token'] for entry in history] == [[0, 0], [], []]
+
+
+def test_pages_of_window():
+    record = record_pb2.Record(history_page_size=4, history_count=10)
+    assert decoding.HistoryWindow(offset=5, limit=2).get_pages(record) == \
+        range(1, 2)
+    assert decoding.HistoryWindow(last=3).get_pages(record) == range(1, 3)
+    assert decoding.HistoryWindow(offset=10).get_pages(record) == range(0)
+    assert decoding.HistoryWindow(since=1).get_pages(record) is None
+
+    # The first entry of a delta encoded window needs its keyframe
+    record.token_keyframe_interval = 3
+    assert decoding.HistoryWindow(offset=5, limit=2).get_pages(record) == \
+        range(0, 2)
+
+
+def test_decode_pages_matches_full_history():
+    history = _history(10, keyframe_interval=3)
+    window = decoding.HistoryWindow(offset=5, limit=3)
+    expected, expected_pagination = window.decode(history)
+    # Pages 1 and 2 of size 3, from the keyframe of entry 5
+    entries, pagination = window.decode(history[3:9], first=3, count=10)
+    assert entries == expected
+    assert pagination == expected_pagination
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'offset': -1},
+    {'limit': 0},
+    {'last': 0},
+    {'last': 2, 'offset': 1},
+    {'last': 2, 'limit': 1},
+])
+def test_invalid_window(kwargs):
+    with pytest.raises(ValueError):
+        decoding.HistoryWindow(**kwargs)
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from sawtooth_sdk.protobuf import client_batch_submit_pb2
+from sawtooth_sdk.protobuf import validator_pb2
+
+from pnrdnet_api.dispatcher import Dispatcher as dispatcher_module
+from pnrdnet_api.dispatcher.AsyncDispatcher import AsyncDispatcher
+from pnrdnet_api.dispatcher.Dispatcher import Dispatcher
+
+
+class FakeConnection(object):
+    """Answers batch status requests with COMMITTED, recording the
+    requests and the timeout they were waited for with
+    """
+
+    def __init__(self):
+        self.requests = []
+
+    def send(self, message_type, content, timeout=None):
+        request = client_batch_submit_pb2.ClientBatchStatusRequest()
+        request.ParseFromString(content)
+        self.requests.append((request, timeout))
+        response = client_batch_submit_pb2.ClientBatchStatusResponse(
+            status=client_batch_submit_pb2.ClientBatchStatusResponse.OK,
+            batch_statuses=[client_batch_submit_pb2.ClientBatchStatus(
+                batch_id=batch_id,
+                status=client_batch_submit_pb2.ClientBatchStatus.COMMITTED)
+                for batch_id in request.batch_ids])
+        return validator_pb2.Message(content=response.SerializeToString())
+
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = Dispatcher.__new__(Dispatcher)
+    dispatcher._connection = FakeConnection()
+    return dispatcher
+
+
+@pytest.mark.parametrize('wait, hold', [(0.5, 1), (1, 1), (45, 45)])
+def test_validator_status_wait(dispatcher, wait, hold):
+    statuses = dispatcher._get_validator_statuses(['batch'], wait=wait)
+    assert statuses[0]['status'] == 'COMMITTED'
+    request, timeout = dispatcher._connection.requests[0]
+    assert request.wait and request.timeout == hold
+    assert timeout == hold + dispatcher_module.STATUS_WAIT_MARGIN
+
+
+def test_validator_status_without_wait(dispatcher):
+    dispatcher._get_validator_statuses(['batch'])
+    request, timeout = dispatcher._connection.requests[0]
+    assert not request.wait
+    assert timeout is None
+
+
+@pytest.mark.parametrize('wait, suffix', [
+    (0, 'batch_statuses?id=batch'),
+    (0.5, 'batch_statuses?id=batch&wait=1'),
+    (2, 'batch_statuses?id=batch&wait=2')])
+def test_async_batch_status_wait(wait, suffix):
+    dispatcher = AsyncDispatcher.__new__(AsyncDispatcher)
+    requests = []
+
+    async def get_json(request_suffix, name=None):
+        requests.append(request_suffix)
+        return {'data': [{'id': 'batch', 'status': 'COMMITTED'}]}
+
+    dispatcher._get_json = get_json
+    status = asyncio.run(dispatcher.get_batch_status('batch', wait=wait))
+    assert status['status'] == 'COMMITTED'
+    assert requests == [suffix]
+
+
+def test_async_batch_statuses_wait_rounded_up():
+    dispatcher = AsyncDispatcher.__new__(AsyncDispatcher)
+    requests = []
+
+    async def send_request(suffix, data=None, headers=None, name=None):
+        requests.append(suffix)
+        return '{"data": []}'
+
+    dispatcher._send_request = send_request
+    asyncio.run(dispatcher._get_statuses(['batch'], 0.2))
+    assert requests == ['batch_statuses?wait=1']
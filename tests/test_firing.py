@@ -0,0 +1,71 @@
+from processor import firing
+
+
+# Two places, t0 moves a token from p0 to p1 and t1 moves it back, so the
+# columns of the incidence matrix are linearly dependent
+LOOP = [-1, 1,
+        1, -1]
+
+# Three places in a row, t0 moves a token from p0 to p1, t1 from p1 to p2
+CHAIN = [-1, 0,
+         1, -1,
+         0, 1]
+
+
+def test_no_change_is_valid():
+    assert firing.is_valid_firing(2, 2, LOOP, [1, 1], [1, 1])
+
+
+def test_single_transition():
+    assert firing.is_valid_firing(2, 2, LOOP, [1, 0], [0, 1])
+    assert firing.is_valid_firing(2, 2, LOOP, [0, 1], [1, 0])
+
+
+def test_repeated_firing():
+    assert firing.is_valid_firing(3, 2, CHAIN, [3, 0, 0], [0, 3, 0])
+    assert firing.is_valid_firing(3, 2, CHAIN, [3, 0, 0], [1, 0, 2])
+
+
+def test_repeated_firing_with_dependent_columns():
+    assert firing.is_valid_firing(2, 2, LOOP, [2, 0], [0, 2])
+    assert firing.is_valid_firing(2, 2, LOOP, [0, 5], [5, 0])
+
+
+def test_unreachable_marking():
+    # Tokens are not conserved
+    assert not firing.is_valid_firing(2, 2, LOOP, [2, 0], [1, 2])
+    # Only a negative count of t0 would give it back
+    assert not firing.is_valid_firing(3, 2, CHAIN, [1, 1, 0], [2, 0, 0])
+
+
+def test_negative_marking():
+    assert not firing.is_valid_firing(3, 2, CHAIN, [0, 0, 0], [-1, 1, 0])
+
+
+def test_size_mismatch():
+    assert not firing.is_valid_firing(2, 2, LOOP, [1, 0], [0, 1, 0])
+    assert not firing.is_valid_firing(2, 3, LOOP, [1, 0], [0, 1])
+
+
+def test_too_many_firings():
+    limit = firing.MAX_FIRINGS
+    assert firing.is_valid_firing(2, 2, LOOP, [limit, 0], [0, limit])
+    assert not firing.is_valid_firing(
+        2, 2, LOOP, [limit + 1, 0], [0, limit + 1])
+
+
+def test_validate_firings_keeps_order():
+    results = firing.validate_firings([
+        (2, 2, LOOP, [2, 0], [0, 2]),
+        (3, 2, CHAIN, [1, 1, 0], [2, 0, 0]),
+        (2, 2, [1], [0, 0], [0, 0]),
+        (3, 2, CHAIN, [3, 0, 0], [1, 0, 2]),
+    ])
+    assert results == [True, False, False, True]
+
+
+def test_sparse_net_matches_dense():
+    net = firing.get_sparse_net(
+        3, 2, [0, 1, 3, 4], [0, 0, 1, 1], [-1, 1, -1, 1])
+    assert net.is_reachable([3, 0, 0], [1, 0, 2])
+    assert not net.is_reachable([1, 1, 0], [2, 0, 0])
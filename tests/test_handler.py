@@ -0,0 +1,222 @@
+import pytest
+
+from sawtooth_sdk.processor.exceptions import InvalidTransaction
+
+from pnrdnet_addressing import addresser
+from pnrdnet_encoding import incidence
+from pnrdnet_encoding import model
+
+from tests.helpers import create_record
+from tests.helpers import Ledger
+from tests.helpers import update_record
+
+
+LOOP = [-1, 1,
+        1, -1]
+# t0 moves a token from p0 to p1, t1 does nothing
+ONE_WAY = [-1, 0,
+           1, 0]
+
+
+def _register(ledger, signer, incidence_matrix):
+    ledger.run(signer, 'create_model',
+               places=2, transitions=2, incidenceMatrix=incidence_matrix)
+    return model.get_model_hash(2, 2, incidence_matrix)
+
+
+@pytest.fixture
+def ledger():
+    return Ledger()
+
+
+@pytest.fixture
+def signer(ledger):
+    signer = ledger.new_signer()
+    ledger.run(signer, 'create_owner', name='owner')
+    return signer
+
+
+def test_update_switching_models(ledger, signer):
+    loop = _register(ledger, signer, LOOP)
+    one_way = _register(ledger, signer, ONE_WAY)
+    ledger.run(signer, **create_record(
+        [1, 0], model_hash=loop, validate_firing=True))
+
+    context = ledger.run(signer, **update_record([0, 1], model_hash=one_way))
+    assert addresser.get_model_address(loop) not in context.reads
+
+    with pytest.raises(InvalidTransaction):
+        ledger.run(signer, **update_record([1, 0], model_hash=one_way))
+
+
+def test_update_switching_from_model_to_inline_net(ledger, signer):
+    loop = _register(ledger, signer, LOOP)
+    ledger.run(signer, **create_record(
+        [1, 0], model_hash=loop, validate_firing=True))
+
+    ledger.run(signer, **update_record([0, 1], incidence=ONE_WAY))
+    with pytest.raises(InvalidTransaction):
+        ledger.run(signer, **update_record([1, 0], incidence=ONE_WAY))
+
+
+def test_batch_update_switching_models(ledger, signer):
+    loop = _register(ledger, signer, LOOP)
+    one_way = _register(ledger, signer, ONE_WAY)
+    ledger.run(signer, **create_record(
+        [1, 0], model_hash=loop, validate_firing=True))
+
+    ledger.run_batch(signer, [
+        update_record([0, 1], model_hash=one_way),
+        update_record([1, 0], model_hash=loop),
+    ])
+    with pytest.raises(InvalidTransaction):
+        ledger.run_batch(signer, [update_record([0, 1], model_hash=one_way),
+                                  update_record([1, 0], model_hash=one_way)])
+
+
+def test_firing_validated_for_opted_in_records_only(ledger, signer):
+    ledger.run(signer, **create_record([1, 0], 'free', incidence=ONE_WAY))
+    ledger.run(signer, **create_record(
+        [1, 0], 'checked', incidence=ONE_WAY, validate_firing=True))
+    assert ledger.get_record('checked').validate_firing
+
+    ledger.run(signer, **update_record([0, 1], 'free', incidence=ONE_WAY))
+    ledger.run(signer, **update_record([1, 0], 'free', incidence=ONE_WAY))
+    ledger.run(signer, **update_record([0, 1], 'checked', incidence=ONE_WAY))
+    with pytest.raises(InvalidTransaction, match='not reachable'):
+        ledger.run(signer, **update_record(
+            [1, 0], 'checked', incidence=ONE_WAY))
+
+
+def test_model_hash_ignores_encoding():
+    dense = [0] * 50
+    dense[3] = -1
+    dense[17] = 1
+    assert 'incidenceRowPtr' in incidence.encode(10, 5, dense)
+    assert model.get_model_hash(10, 5, dense) == model.get_model_hash(
+        10, 5, incidence.to_dense(10, 5, *incidence.to_sparse(10, 5, dense)))
+
+
+def test_record_referencing_model(ledger, signer):
+    loop = _register(ledger, signer, LOOP)
+    ledger.run(signer, **create_record([1, 0], model_hash=loop))
+
+    history = ledger.get_history('record')
+    assert history[0].model_hash == loop
+    assert history[0].places == 2
+    assert history[0].transitions == 2
+    assert not history[0].incidenceMatrix
+
+
+def test_model_registered_once(ledger, signer):
+    _register(ledger, signer, LOOP)
+    with pytest.raises(InvalidTransaction):
+        _register(ledger, signer, LOOP)
+
+
+def test_unknown_model_rejected(ledger, signer):
+    with pytest.raises(InvalidTransaction):
+        ledger.run(signer, **create_record(
+            [1, 0], model_hash=model.get_model_hash(2, 2, LOOP)))
+
+
+def test_update_older_than_history_rejected(ledger, signer):
+    ledger.run(signer, **create_record([1, 0], incidence=LOOP))
+    created = ledger.timestamp
+    ledger.timestamp = created - 10
+    with pytest.raises(InvalidTransaction, match='older than the last'):
+        ledger.run(signer, **update_record([0, 1], incidence=LOOP))
+    # Updates in the same second keep the order they were applied in
+    ledger.timestamp = created - 1
+    ledger.run(signer, **update_record([0, 1], incidence=LOOP))
+    assert len(ledger.get_history('record')) == 2
+
+
+def test_legacy_update_older_than_history_accepted(ledger, signer):
+    ledger.run(signer, legacy=True, **create_record([1, 0], incidence=LOOP))
+    ledger.timestamp -= 10
+    ledger.run(signer, legacy=True, **update_record([0, 1], incidence=LOOP))
+    assert len(ledger.get_record('record').history) == 2
+
+
+def test_sparse_record(ledger, signer):
+    places = transitions = 20
+    dense = [0] * (places * transitions)
+    for transition in range(transitions):
+        dense[transition * transitions + transition] = -1
+        dense[((transition + 1) % places) * transitions + transition] = 1
+    token = [1] + [0] * (places - 1)
+    ledger.run(signer, **create_record(
+        token, incidence=dense, places=places, transitions=transitions))
+    ledger.run(signer, **update_record(
+        [0, 1] + [0] * (places - 2),
+        incidence=dense, places=places, transitions=transitions))
+
+    history = ledger.get_history('record')
+    assert [incidence.is_sparse(entry) for entry in history] == [True, True]
+    assert incidence.get_dense(history[1]) == dense
+
+
+def test_duplicate_tag_rejected(ledger, signer):
+    ledger.run(signer, **create_record([1, 0], 'first', tag_id='tag',
+                                       incidence=LOOP))
+    with pytest.raises(InvalidTransaction, match='Tag tag belongs'):
+        ledger.run(signer, **create_record([1, 0], 'second', tag_id='tag',
+                                           incidence=LOOP))
+    assert ledger.get_record('second') is None
+
+
+def test_duplicate_tag_in_batch_rejected(ledger, signer):
+    with pytest.raises(InvalidTransaction):
+        ledger.run_batch(signer, [
+            create_record([1, 0], 'first', tag_id='tag', incidence=LOOP),
+            create_record([1, 0], 'second', tag_id='tag', incidence=LOOP),
+        ])
+    assert ledger.get_record('first') is None
+
+
+def test_tag_index(ledger, signer):
+    context = ledger.run(signer, **create_record(
+        [1, 0], 'record', tag_id='tag', incidence=LOOP))
+    assert addresser.get_tag_address('tag') in context.writes
+    assert ledger.get_record('record').tag_id == 'tag'
+
+
+def test_legacy_family_version_skips_tag_index(ledger, signer):
+    for record_id in ('first', 'second'):
+        context = ledger.run(signer, legacy=True, **create_record(
+            [1, 0], record_id, tag_id='tag', incidence=LOOP))
+        assert context.writes == [addresser.get_record_address(record_id)]
+
+    record = ledger.get_record('second')
+    assert record.tag_id == 'tag'
+    assert len(record.history) == 1
+
+
+def test_batch_applies_operations_in_order(ledger):
+    signer = ledger.new_signer()
+    context = ledger.run_batch(signer, [
+        {'action': 'create_owner', 'name': 'owner'},
+        create_record([1, 0], incidence=LOOP),
+        update_record([0, 1], incidence=LOOP),
+        update_record([1, 0], incidence=LOOP),
+    ])
+    assert context.set_state_calls == 1
+    assert [entry.token[:] for entry in ledger.get_history('record')] == \
+        [[1, 0], [0, 1], [1, 0]]
+
+
+def test_batch_is_atomic(ledger, signer):
+    ledger.run(signer, **create_record([1, 0], incidence=LOOP))
+    state = dict(ledger.state)
+    with pytest.raises(InvalidTransaction):
+        ledger.run_batch(signer, [
+            update_record([0, 1], incidence=LOOP),
+            update_record([0, 1], record_id='missing', incidence=LOOP),
+        ])
+    assert ledger.state == state
+
+
+def test_empty_batch_rejected(ledger, signer):
+    with pytest.raises(InvalidTransaction):
+        ledger.run_batch(signer, [])
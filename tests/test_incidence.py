@@ -0,0 +1,58 @@
+from pnrdnet_encoding import incidence
+
+
+# 3 places x 4 transitions
+DENSE = [0, -1, 0, 2,
+         0, 0, 0, 0,
+         1, 0, 0, -1]
+
+
+def test_sparse_round_trip():
+    row_ptr, col_idx, values = incidence.to_sparse(3, 4, DENSE)
+    assert row_ptr == [0, 2, 2, 4]
+    assert col_idx == [1, 3, 0, 3]
+    assert values == [-1, 2, 1, -1]
+    assert incidence.is_valid_sparse(3, 4, row_ptr, col_idx, values)
+    assert incidence.to_dense(3, 4, row_ptr, col_idx, values) == DENSE
+
+
+def test_empty_matrix_round_trip():
+    sparse = incidence.to_sparse(2, 3, [0] * 6)
+    assert sparse == ([0, 0, 0], [], [])
+    assert incidence.to_dense(2, 3, *sparse) == [0] * 6
+
+
+def test_encode_picks_smaller_form():
+    assert incidence.encode(3, 4, DENSE) == {'incidenceMatrix': DENSE}
+
+    dense = [0] * 100
+    dense[42] = 1
+    encoded = incidence.encode(10, 10, dense)
+    assert encoded == {
+        'incidenceRowPtr': [0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1],
+        'incidenceColIdx': [2],
+        'incidenceValues': [1],
+    }
+
+
+def test_encode_keeps_mismatched_matrix():
+    assert incidence.encode(3, 3, [1, 0]) == {'incidenceMatrix': [1, 0]}
+
+
+def test_invalid_sparse():
+    # Wrong number of rows
+    assert not incidence.is_valid_sparse(3, 4, [0, 1, 2], [0, 1], [1, 1])
+    # Not starting at zero
+    assert not incidence.is_valid_sparse(2, 4, [1, 1, 2], [0, 1], [1, 1])
+    # Decreasing row pointers
+    assert not incidence.is_valid_sparse(2, 4, [0, 2, 1], [0, 1], [1, 1])
+    # Row pointers not ending at the number of values
+    assert not incidence.is_valid_sparse(2, 4, [0, 1, 1], [0, 1], [1, 1])
+    # Column out of range
+    assert not incidence.is_valid_sparse(2, 4, [0, 1, 2], [0, 4], [1, 1])
+    # Columns and values of different lengths
+    assert not incidence.is_valid_sparse(2, 4, [0, 1, 2], [0, 1], [1])
+    # Column repeated within a row
+    assert not incidence.is_valid_sparse(2, 4, [0, 2, 2], [1, 1], [1, -1])
+    # The same column in different rows is fine
+    assert incidence.is_valid_sparse(2, 4, [0, 1, 2], [1, 1], [1, -1])
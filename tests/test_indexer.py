@@ -0,0 +1,126 @@
+import pytest
+
+from sawtooth_sdk.protobuf import block_pb2
+from sawtooth_sdk.protobuf import client_block_pb2
+from sawtooth_sdk.protobuf import client_event_pb2
+from sawtooth_sdk.protobuf import events_pb2
+from sawtooth_sdk.protobuf import transaction_receipt_pb2
+from sawtooth_sdk.protobuf import validator_pb2
+
+from pnrdnet_addressing import addresser
+from pnrdnet_indexer.database import IndexDatabase
+from pnrdnet_indexer.indexer import Indexer
+from pnrdnet_protobuf import owner_pb2
+
+
+OWNER_ADDRESS = addresser.get_owner_address('key')
+
+
+class FakeConnection(object):
+    """Answers the head block and subscription requests of the indexer"""
+
+    def __init__(self):
+        self.head = None
+        self.reachable = True
+        self.subscriptions = []
+        self.handlers = {}
+
+    def add_handler(self, message_type, handler):
+        self.handlers[message_type] = handler
+
+    def send(self, message_type, content, timeout=None):
+        if not self.reachable:
+            raise TimeoutError()
+        if message_type == validator_pb2.Message.CLIENT_BLOCK_LIST_REQUEST:
+            response = client_block_pb2.ClientBlockListResponse(
+                status=client_block_pb2.ClientBlockListResponse.OK)
+            if self.head is not None:
+                response.blocks.add(
+                    header_signature=self.head,
+                    header=block_pb2.BlockHeader().SerializeToString())
+        else:
+            request = client_event_pb2.ClientEventsSubscribeRequest()
+            request.ParseFromString(content)
+            self.subscriptions.append(list(request.last_known_block_ids))
+            response = client_event_pb2.ClientEventsSubscribeResponse(
+                status=client_event_pb2.ClientEventsSubscribeResponse.OK)
+        return validator_pb2.Message(content=response.SerializeToString())
+
+
+def _events(block_id, name):
+    owner = owner_pb2.OwnerContainer(entries=[
+        owner_pb2.Owner(public_key='key', name=name)])
+    changes = transaction_receipt_pb2.StateChangeList(state_changes=[
+        transaction_receipt_pb2.StateChange(
+            address=OWNER_ADDRESS,
+            value=owner.SerializeToString(),
+            type=transaction_receipt_pb2.StateChange.SET)])
+    event_list = events_pb2.EventList(events=[
+        events_pb2.Event(
+            event_type='sawtooth/block-commit',
+            attributes=[events_pb2.Event.Attribute(
+                key='block_id', value=block_id)]),
+        events_pb2.Event(
+            event_type='sawtooth/state-delta',
+            data=changes.SerializeToString())])
+    return validator_pb2.Message(
+        message_type=validator_pb2.Message.CLIENT_EVENTS,
+        content=event_list.SerializeToString())
+
+
+def _owner_name(database):
+    row = database.connection().execute(
+        'SELECT name FROM owners WHERE address = ?',
+        (OWNER_ADDRESS,)).fetchone()
+    return row['name']
+
+
+@pytest.fixture
+def database(tmp_path):
+    return IndexDatabase(str(tmp_path / 'index.db'))
+
+
+def test_replayed_block_is_dropped(database):
+    indexer = Indexer(FakeConnection(), database)
+    indexer._handle_events(_events('block-1', 'old'))
+    indexer._handle_events(_events('block-2', 'new'))
+    indexer._handle_events(_events('block-1', 'old'))
+
+    assert _owner_name(database) == 'new'
+    assert database.get_meta('block_id') == 'block-2'
+
+
+def test_subscribes_once(database):
+    connection = FakeConnection()
+    indexer = Indexer(connection, database)
+    indexer._check_subscription()
+    indexer._handle_events(_events('block-1', 'owner'))
+    connection.head = 'block-1'
+    indexer._check_subscription()
+    indexer._check_subscription()
+
+    assert connection.subscriptions == [[]]
+
+
+def test_subscribes_again_when_events_stop(database):
+    connection = FakeConnection()
+    indexer = Indexer(connection, database)
+    indexer._check_subscription()
+    indexer._handle_events(_events('block-1', 'owner'))
+
+    # The head moved but no event came, as after a validator restart
+    connection.head = 'block-2'
+    indexer._check_subscription()
+    assert connection.subscriptions == [[], ['block-1']]
+
+
+def test_subscribes_again_after_validator_lost(database):
+    connection = FakeConnection()
+    indexer = Indexer(connection, database)
+    indexer._check_subscription()
+
+    connection.reachable = False
+    indexer._check_subscription()
+    connection.reachable = True
+    indexer._check_subscription()
+    assert connection.subscriptions == [[], []]
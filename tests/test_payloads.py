@@ -0,0 +1,111 @@
+import json
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from pnrdnet_api.utils import payloads
+from pnrdnet_api.utils import responses as resp
+
+
+def _create(**fields):
+    data = {'private_key': 'key', 'record_id': 'record', 'reader_id': 'r',
+            'ant_id': 'a', 'situation': 's', 'token': [1, 0],
+            'tag_id': 'tag', 'places': 2, 'transitions': 1,
+            'incidenceMatrix': [-1, 1]}
+    data.update(fields)
+    return data
+
+
+def test_auth_token(monkeypatch):
+    monkeypatch.setattr(
+        payloads, 'generate_auth_token',
+        lambda secret_key, public_key: (secret_key, public_key))
+    assert payloads.auth_token(
+        {'secret_key': 'secret', 'public_key': 'public'}) == (
+            'secret', 'public')
+    with pytest.raises(KeyError):
+        payloads.auth_token({'public_key': 'public'})
+
+
+def test_record_args():
+    args = payloads.record_args(
+        _create(token_keyframe_interval=8), 'create_record')
+    assert 'action' not in args
+    assert args['private_key'] == 'key'
+    assert args['tag_id'] == 'tag'
+    assert args['token_keyframe_interval'] == 8
+    assert args['model_hash'] is None
+    assert isinstance(args['timestamp'], int)
+
+
+def test_record_args_ignore_the_action_of_the_body():
+    args = payloads.record_args(
+        _create(action='create_record'), 'update_record')
+    assert 'tag_id' not in args
+
+
+def test_record_args_need_the_net_without_a_model():
+    data = _create()
+    del data['incidenceMatrix']
+    with pytest.raises(KeyError):
+        payloads.record_args(data, 'create_record')
+    assert payloads.record_args(
+        dict(data, model_hash='hash'), 'create_record')['model_hash'] == 'hash'
+
+
+def test_transfer_args():
+    args = payloads.record_args(
+        {'private_key': 'key', 'record_id': 'record',
+         'receiving_owner_pubkey': 'owner'}, 'transfer_record')
+    assert args['receiving_owner'] == 'owner'
+    assert set(args) == {
+        'private_key', 'record_id', 'receiving_owner', 'timestamp'}
+
+
+def test_batch_args_need_operations():
+    with pytest.raises(ValueError):
+        payloads.batch_args({'private_key': 'key', 'operations': []})
+    with pytest.raises(ValueError):
+        payloads.batch_args({'private_key': 'key', 'operations': [
+            {'action': 'create_owner'}]})
+
+
+def test_submitted():
+    response, value = payloads.submitted('record', 'batch', None, 0)
+    assert response is resp.SUCCESS_202
+    assert value['link'] == '/batch/batch'
+    response, value = payloads.submitted('update', None, 'COMMITTED', 1)
+    assert response is resp.SUCCESS_201
+    assert value['data'] == 'Create update transaction COMMITTED'
+
+
+def test_pages():
+    assert payloads.network_page(MultiDict()) is None
+    assert payloads.network_page(
+        MultiDict({'limit': '5', 'start': 'd451'})) == ('d451', 5)
+    with pytest.raises(ValueError):
+        payloads.network_page(MultiDict({'limit': '0'}))
+    with pytest.raises(ValueError):
+        payloads.search_page(MultiDict({'offset': '-1'}))
+    value, pagination = payloads.search_value([1, 2, 3], 2, 4)
+    assert value == {'data': [1, 2]}
+    assert pagination == {'limit': 2, 'offset': 4, 'next': 6}
+
+
+def test_history_window():
+    assert payloads.history_window({'record_id': 'record'}) is None
+    window = payloads.history_window({'last': '3'})
+    assert window.last == 3
+
+
+def test_bulk_lines():
+    assert payloads.bulk_item(b'  \n') is None
+    assert isinstance(payloads.bulk_item(b'not json'), ValueError)
+    private_key, operation, _ = payloads.bulk_item(
+        json.dumps(_create(action='create_record')).encode())
+    assert private_key == 'key'
+    assert operation['action'] == 'create_record'
+    assert json.loads(payloads.bulk_result(
+        1, {'status': 'INVALID_INPUT'}))['status'] == 'invalidInput'
+    assert json.loads(payloads.bulk_result(
+        2, {'status': 'COMMITTED', 'batch_id': 'id'}))['link'] == '/batch/id'
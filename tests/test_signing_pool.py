@@ -0,0 +1,73 @@
+import os
+import signal
+
+import pytest
+
+from sawtooth_signing import create_context
+
+from pnrdnet_api.dispatcher import transaction_creation
+from pnrdnet_api.dispatcher.signing_pool import SigningPool
+from pnrdnet_api.dispatcher.signing_pool import SigningQueue
+
+
+OPERATION = {
+    'action': 'create_owner',
+    'name': 'owner',
+}
+
+
+def _job():
+    return (transaction_creation.make_operation_transaction,
+            create_context('secp256k1').new_random_private_key().as_hex(),
+            {'operation': OPERATION, 'timestamp': 1})
+
+
+@pytest.fixture
+def pool():
+    pool = SigningPool(
+        create_context('secp256k1').new_random_private_key().as_hex(),
+        processes=1)
+    yield pool
+    pool.close()
+
+
+def _kill_workers(pool):
+    for process in list(pool._executor._processes.values()):
+        os.kill(process.pid, signal.SIGKILL)
+        process.join()
+
+
+def test_sign(pool):
+    make_transaction, private_key, kwargs = _job()
+    batch = pool.sign(make_transaction, private_key, **kwargs)
+    assert len(batch.transactions) == 1
+
+
+def test_queue_keeps_order_and_errors(pool):
+    queue = SigningQueue(pool, chunk_size=2)
+    error = ValueError('invalid line')
+    queue.add(_job())
+    queue.add(error)
+    queue.add(_job())
+    queue.flush()
+    signed = []
+    while queue:
+        signed.extend(queue.pop().result())
+    assert [batch is not None for batch, _ in signed] == [True, False, True]
+    assert signed[1][1] is error
+
+
+def test_pool_restarts_after_worker_death(pool):
+    _kill_workers(pool)
+    # The executor notices the death in the background
+    for _ in range(50):
+        try:
+            make_transaction, private_key, kwargs = _job()
+            batch = pool.sign(make_transaction, private_key, **kwargs)
+            break
+        except Exception:  # pylint: disable=broad-except
+            continue
+    assert len(batch.transactions) == 1
+
+    make_transaction, private_key, kwargs = _job()
+    assert pool.sign(make_transaction, private_key, **kwargs)
@@ -0,0 +1,157 @@
+import pytest
+
+from sawtooth_sdk.processor.exceptions import InvalidTransaction
+
+from pnrdnet_addressing import addresser
+from pnrdnet_api import decoding
+from pnrdnet_protobuf import record_pb2
+
+from processor.state import HISTORY_PAGE_SIZE
+
+from tests.helpers import create_record
+from tests.helpers import Ledger
+from tests.helpers import update_record
+
+
+LOOP = [-1, 1,
+        1, -1]
+
+
+def _marking(index):
+    return [index % 3, 2 - index % 3]
+
+
+@pytest.fixture
+def ledger():
+    return Ledger()
+
+
+@pytest.fixture
+def signer(ledger):
+    signer = ledger.new_signer()
+    ledger.run(signer, 'create_owner', name='owner')
+    return signer
+
+
+def _page_address(page):
+    return addresser.get_history_page_address('record', page)
+
+
+def test_history_pages(ledger, signer):
+    ledger.run(signer, **create_record(_marking(0), incidence=LOOP))
+    updates = HISTORY_PAGE_SIZE + 5
+    for index in range(1, updates + 1):
+        context = ledger.run(signer, **update_record(
+            _marking(index), situation=str(index), incidence=LOOP))
+        # Only the page appended to is written with the record
+        page = index // HISTORY_PAGE_SIZE
+        assert sorted(context.writes) == sorted([
+            addresser.get_record_address('record'), _page_address(page)])
+
+    record = ledger.get_record('record')
+    assert record.history_count == updates + 1
+    assert not record.history
+    assert _page_address(2) not in ledger.state
+
+    history = ledger.get_history('record')
+    assert [entry.situation for entry in history] == \
+        ['created'] + [str(index) for index in range(1, updates + 1)]
+
+
+def test_batch_crosses_page_boundary(ledger, signer):
+    ledger.run(signer, **create_record(_marking(0), incidence=LOOP))
+    ledger.run_batch(signer, [
+        update_record(_marking(index), situation=str(index), incidence=LOOP)
+        for index in range(1, HISTORY_PAGE_SIZE + 2)])
+
+    history = ledger.get_history('record')
+    assert len(history) == HISTORY_PAGE_SIZE + 2
+    assert history[HISTORY_PAGE_SIZE].situation == str(HISTORY_PAGE_SIZE)
+    assert _page_address(1) in ledger.state
+
+
+def _store_legacy_record(ledger, signer, entries, validate_firing=False):
+    """Writes a record from before paging, with its history inline"""
+    record = record_pb2.Record(
+        record_id='record',
+        tag_id='tag-record',
+        owners=[record_pb2.Record.Owner(
+            owner_id=signer.get_public_key().as_hex(), timestamp=1)],
+        validate_firing=validate_firing)
+    for index in range(entries):
+        record.history.add(
+            situation=str(index), places=2, transitions=2,
+            incidenceMatrix=LOOP, token=_marking(index), timestamp=index)
+    ledger.state[addresser.get_record_address('record')] = \
+        record_pb2.RecordContainer(entries=[record]).SerializeToString()
+
+
+def test_legacy_record_migrated_on_update(ledger, signer):
+    entries = HISTORY_PAGE_SIZE + 3
+    _store_legacy_record(ledger, signer, entries)
+
+    ledger.run(signer, **update_record(
+        _marking(entries), situation='migrated', incidence=LOOP))
+
+    record = ledger.get_record('record')
+    assert not record.history
+    assert record.history_page_size == HISTORY_PAGE_SIZE
+    assert record.history_count == entries + 1
+    history = ledger.get_history('record')
+    assert [entry.situation for entry in history] == \
+        [str(index) for index in range(entries)] + ['migrated']
+    assert [entry.token[:] for entry in history[:entries]] == \
+        [_marking(index) for index in range(entries)]
+
+
+def test_legacy_record_firing_validation(ledger, signer):
+    _store_legacy_record(ledger, signer, 2, validate_firing=True)
+
+    ledger.run(signer, **update_record([0, 2], incidence=LOOP))
+    assert ledger.get_record('record').history_count == 3
+
+
+def test_legacy_family_version_keeps_inline_history(ledger, signer):
+    _store_legacy_record(ledger, signer, 2)
+
+    context = ledger.run(signer, legacy=True, **update_record(
+        _marking(2), incidence=LOOP))
+
+    assert context.writes == [addresser.get_record_address('record')]
+    record = ledger.get_record('record')
+    assert not record.history_page_size
+    assert [entry.situation for entry in record.history] == \
+        ['0', '1', 'updated']
+
+
+def test_legacy_family_version_rejects_paged_record(ledger, signer):
+    ledger.run(signer, **create_record(_marking(0), incidence=LOOP))
+
+    with pytest.raises(InvalidTransaction):
+        ledger.run(signer, legacy=True, **update_record(
+            _marking(1), incidence=LOOP))
+
+
+def test_delta_tokens(ledger, signer):
+    markings = [[index, 5 - index, 0, index % 2] for index in range(6)]
+    ledger.run(signer, **create_record(
+        markings[0], incidence=[0] * 8, places=4,
+        token_keyframe_interval=4))
+    for marking in markings[1:]:
+        ledger.run(signer, **update_record(
+            marking, incidence=[0] * 8, places=4))
+
+    history = ledger.get_history('record')
+    assert [entry.token_is_delta for entry in history] == \
+        [False, True, True, True, False, True]
+    assert history[4].token[:] == markings[4]
+    assert not history[5].token
+    assert list(history[5].token_delta_idx) == [0, 1, 3]
+    assert ledger.get_record('record').last_token[:] == markings[-1]
+
+    decoded = decoding.decode_history(history, 0, len(history))
+    assert [entry['token'] for entry in decoded] == markings
+    assert not any(entry['token_is_delta'] for entry in decoded)
+    # A slice rebuilds its first marking from the keyframe before it
+    assert [entry['token'] for entry in
+            decoding.decode_history(history, 2, 4)] == markings[2:4]
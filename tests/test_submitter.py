@@ -0,0 +1,150 @@
+import concurrent.futures
+import threading
+
+import pytest
+
+from sawtooth_sdk.protobuf import batch_pb2
+
+from pnrdnet_api.dispatcher.Dispatcher import Dispatcher
+from pnrdnet_api.dispatcher.submitter import BatchSubmitter
+from pnrdnet_api.utils.errors import ApiBadRequest
+
+
+def _batch(name):
+    return batch_pb2.Batch(header_signature=name)
+
+
+def _batch_ids(batch_list_bytes):
+    batch_list = batch_pb2.BatchList()
+    batch_list.ParseFromString(batch_list_bytes)
+    return [batch.header_signature for batch in batch_list.batches]
+
+
+def test_batches_share_a_batch_list():
+    sent = []
+    submitter = BatchSubmitter(
+        lambda data: sent.append(_batch_ids(data)) or 'OK', window=1,
+        max_batches=2)
+    futures = [submitter.submit(_batch(name)) for name in 'ab']
+    assert [future.result(5) for future in futures] == ['OK', 'OK']
+    submitter.close()
+    assert sent == [['a', 'b']]
+
+
+def test_close_sends_queued_and_fails_later_batches():
+    released = threading.Event()
+    sent = []
+
+    def send(data):
+        released.wait(5)
+        sent.append(_batch_ids(data))
+        return 'OK'
+
+    submitter = BatchSubmitter(send, window=0.01)
+    first = submitter.submit(_batch('a'))
+    closing = threading.Thread(target=submitter.close)
+    closing.start()
+    released.set()
+    closing.join(5)
+    assert first.result(1) == 'OK'
+    with pytest.raises(RuntimeError):
+        submitter.submit(_batch('b')).result(1)
+    assert sent == [['a']]
+
+
+def test_stopped_thread_fails_queued_batches():
+    sending = threading.Event()
+    released = threading.Event()
+
+    def send(data):
+        sending.set()
+        released.wait(5)
+        return 'OK'
+
+    submitter = BatchSubmitter(send, window=0.01)
+    first = submitter.submit(_batch('a'))
+    sending.wait(5)
+    # Breaks the thread on the next batch it takes
+    submitter._max_batches = None
+    second = submitter.submit(_batch('b'))
+    third = submitter.submit(_batch('c'))
+    released.set()
+    assert first.result(5) == 'OK'
+    for future in (second, third):
+        with pytest.raises(RuntimeError):
+            future.result(5)
+    with pytest.raises(RuntimeError):
+        submitter.submit(_batch('d')).result(1)
+
+
+def test_dispatcher_submit_times_out():
+    released = threading.Event()
+    dispatcher = Dispatcher.__new__(Dispatcher)
+    dispatcher._submitter = BatchSubmitter(
+        lambda data: released.wait(5) and 'OK', window=0.01)
+    dispatcher._submit_timeout = 0.1
+    with pytest.raises(ApiBadRequest, match='Timed out'):
+        dispatcher._submit_batch(_batch('a'), 'create_record')
+    released.set()
+    dispatcher._submitter.close()
+
+
+def test_cancelled_batches_are_not_sent():
+    sending = threading.Event()
+    released = threading.Event()
+    sent = []
+
+    def send(data):
+        sending.set()
+        released.wait(5)
+        sent.append(_batch_ids(data))
+        return 'OK'
+
+    submitter = BatchSubmitter(send, window=0.01)
+    first = submitter.submit(_batch('a'))
+    sending.wait(5)
+    second = submitter.submit(_batch('b'))
+    assert second.cancel()
+    released.set()
+    assert first.result(5) == 'OK'
+    submitter.close()
+    assert sent == [['a']]
+
+
+def _failing_sender(error):
+    sent = []
+
+    def send(data):
+        batch_ids = _batch_ids(data)
+        sent.append(batch_ids)
+        if 'bad' in batch_ids:
+            raise error
+        return 'OK'
+
+    return send, sent
+
+
+def test_rejected_batch_list_is_sent_one_by_one():
+    send, sent = _failing_sender(ValueError('rejected'))
+    submitter = BatchSubmitter(
+        send, window=1, max_batches=2,
+        is_rejection=lambda err: isinstance(err, ValueError))
+    good, bad = [submitter.submit(_batch(name)) for name in ('good', 'bad')]
+    assert good.result(5) == 'OK'
+    with pytest.raises(ValueError):
+        bad.result(5)
+    submitter.close()
+    assert sent == [['good', 'bad'], ['good'], ['bad']]
+
+
+def test_failed_batch_list_is_not_sent_again():
+    send, sent = _failing_sender(ConnectionError('reset'))
+    submitter = BatchSubmitter(
+        send, window=1, max_batches=2,
+        is_rejection=lambda err: isinstance(err, ValueError))
+    futures = [submitter.submit(_batch(name)) for name in ('good', 'bad')]
+    for future in futures:
+        with pytest.raises(ConnectionError):
+            future.result(5)
+    submitter.close()
+    assert sent == [['good', 'bad']]